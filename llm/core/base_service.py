@@ -25,10 +25,22 @@ except ImportError:
     PYDANTIC_AVAILABLE = False
     print("Warning: Pydantic not available. AI response parsing will be limited.")
 
+try:
+    import orjson
+    # orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，现有的异常处理无需改动
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 
 from .client import llm_factory
 
 
+# 开头的代码块标记，只在字符串起始处匹配（结尾用 endswith 判断，
+# 整串 re.sub 会在每个位置重试 \s*```\s*\Z，长响应上慢两个数量级）
+_JSON_FENCE_OPEN_RE = re.compile(r'```(?:json)?')
+
+
 def cache_llm_response(cache_key_func, ttl=3600):
     """缓存LLM响应的装饰器"""
     def decorator(func):
@@ -144,9 +156,9 @@ class LLMBaseService:
             
             # 对于没有解析器的原始输出，手动加载
             if isinstance(response, str):
-                return json.loads(self._clean_json_content(response))
+                return json_loads(self._clean_json_content(response))
             elif isinstance(response, dict) and 'text' in response:
-                return json.loads(self._clean_json_content(response['text']))
+                return json_loads(self._clean_json_content(response['text']))
             return response
 
         except Exception as e:
@@ -160,16 +172,15 @@ class LLMBaseService:
         """清理 AI 返回的内容，移除 markdown 格式"""
         content = content.strip()
         
-        # 移除 markdown 代码块
-        if content.startswith('```json'):
-            content = content[7:]
-        elif content.startswith('```'):
-            content = content[3:]
+        # 移除 markdown 代码块：先确定边界，只切片一次，避免长响应被多次复制
+        opening = _JSON_FENCE_OPEN_RE.match(content)
+        start = opening.end() if opening else 0
+        end = len(content)
         
-        if content.endswith('```'):
-            content = content[:-3]
+        if end - start >= 3 and content.endswith('```'):
+            end -= 3
         
-        return content.strip()
+        return content[start:end].strip()
     
     def simple_chat(self, prompt: str) -> str:
         """简单的聊天接口，不依赖LangChain"""
@@ -198,7 +209,7 @@ class LLMBaseService:
             # 使用 LangChain 执行
             result = chain.run(**kwargs)
             cleaned_result = self._clean_json_content(result)
-            return json.loads(cleaned_result)
+            return json_loads(cleaned_result)
         except Exception as e:
             # 回退到原始 OpenAI 客户端
             print(f"LangChain execution failed: {e}, falling back to OpenAI client")
@@ -227,7 +238,7 @@ class LLMBaseService:
         content = response.choices[0].message.content
         cleaned_content = self._clean_json_content(content)
         try:
-            return json.loads(cleaned_content)
+            return json_loads(cleaned_content)
         except json.JSONDecodeError:
             # 如果不是JSON，返回简单的响应结构
             return {"reply": content}
@@ -266,7 +277,7 @@ class LLMBaseService:
                     lambda: chain.run(**kwargs)
                 )
             cleaned_result = self._clean_json_content(result)
-            return json.loads(cleaned_result)
+            return json_loads(cleaned_result)
         except Exception as e:
             # 回退到原始 OpenAI 客户端
             print(f"LangChain execution failed: {e}, falling back to OpenAI client")
@@ -284,7 +295,7 @@ class LLMBaseService:
         content = await self.simple_chat_async(formatted_prompt)
         cleaned_content = self._clean_json_content(content)
         try:
-            return json.loads(cleaned_content)
+            return json_loads(cleaned_content)
         except json.JSONDecodeError:
             # 如果不是JSON，返回简单的响应结构
             return {"reply": content}
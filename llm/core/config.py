@@ -26,6 +26,8 @@ class LLMConfig:
     # 缓存配置
     ENABLE_CACHE = config('LLM_ENABLE_CACHE', default=True, cast=bool)
     CACHE_TTL = config('LLM_CACHE_TTL', default=3600, cast=int)  # 1小时
+    # 按语义相似度复用同一学习者的回复，默认关闭
+    ENABLE_SEMANTIC_RESPONSE_CACHE = config('LLM_ENABLE_SEMANTIC_RESPONSE_CACHE', default=False, cast=bool)
     
     # 记忆管理配置
     MAX_MEMORY_SIZE = config('LLM_MAX_MEMORY_SIZE', default=50, cast=int)
@@ -50,7 +50,7 @@ class CognitiveLoadLevel(Enum):
     OVERLOAD = "overload"
 
 
-@dataclass
+@dataclass(slots=True)
 class LearningContext:
     """Comprehensive learning context data structure"""
     user_id: str
@@ -3,6 +3,7 @@ Advisor Service - 教育规划顾问服务 (Refactored Coordinator)
 """
 import json
 import asyncio
+import logging
 from typing import List, Dict, Any, Optional
 
 from ..core.base_service import LLMBaseService
@@ -13,6 +14,7 @@ from .conversation_manager import ConversationManager, get_chat_cache_key
 from .personalization_engine import PersonalizationEngine
 from .error_handler import handle_ai_service_errors, handle_async_ai_service_errors
 
+logger = logging.getLogger(__name__)
 
 
 
@@ -171,13 +173,7 @@ class AdvisorService(LLMBaseService):
             message, current_plan, session_id, feedback_path
         )
     
-    # === BATCH PROCESSING METHODS ===
-    
-    async def batch_create_plans_async(self, topics: List[str]) -> List[Dict[str, Any]]:
-        """批量异步创建学习计划 (委托给 LearningPlanCreator)"""
-        return await self._plan_creator.batch_create_plans_async(topics)
-
-        # === SESSION MANAGEMENT METHODS (Delegated) ===
+    # === SESSION MANAGEMENT METHODS (Delegated) ===
     
     def get_plan_from_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """从会话中获取当前计划 (委托给 ConversationManager)"""
@@ -289,6 +285,6 @@ def _initialize_service():
         try:
             advisor_service = get_advisor_service()
         except Exception as e:
-            print(f"Warning: Failed to initialize advisor service: {e}")
+            logger.warning("Failed to initialize advisor service: %s", e, exc_info=True)
             advisor_service = None
     return advisor_service
@@ -3,10 +3,23 @@ Contextual Prompt Engineering System
 Advanced prompt generation with dynamic context integration
 """
 import json
+import logging
 import re
-from typing import Dict, List, Any, Optional, Tuple
+import sys
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple, Sequence
 from datetime import datetime
 
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 from .advanced_context_engine import (
     LearningContext, 
     LearningModalityType, 
@@ -15,82 +28,247 @@ from .advanced_context_engine import (
 )
 from .dynamic_context_engine import DynamicContextEngine
 
+logger = logging.getLogger(__name__)
+
+
+# Guidance header lines with no content (stripped length under 50, ending in ':')
+_EMPTY_HEADER_RE = re.compile(r'\s*(?=\S)[^\n]{0,48}:\s*')
+# Runs of blank lines collapsed by _clean_prompt
+_MULTINEWLINE_RE = re.compile(r'\n\s*\n\s*\n')
+
+# Threshold ladders for the _format_* helpers; a value strictly above the i-th
+# threshold maps past the i-th label, hence bisect_left
+_CONFIDENCE_THRESHOLDS = (0.2, 0.4, 0.6, 0.8)
+_CONFIDENCE_LABELS = ("very low confidence", "low confidence", "somewhat confident",
+                      "confident", "very confident")
+_PERFORMANCE_THRESHOLDS = (0.2, 0.4, 0.6, 0.8)
+_PERFORMANCE_LABELS = ("struggling performance", "below average performance",
+                       "moderate performance", "good performance", "excellent performance")
+_MOTIVATION_THRESHOLDS = (0.3, 0.5, 0.7)
+_MOTIVATION_LABELS = ("low motivation", "somewhat motivated", "motivated", "highly motivated")
+_ENGAGEMENT_THRESHOLDS = (0.3, 0.5, 0.7)
+_ENGAGEMENT_LABELS = ("disengaged", "moderately engaged", "engaged", "highly engaged")
+
+def _bucketize_numpy(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Count the thresholds each value strictly exceeds (bisect_left per value)"""
+    return (values[:, None] > thresholds[None, :]).sum(axis=1)
+
+
+if NUMBA_AVAILABLE:
+    # Explicit signature compiles eagerly at import (reused from the on-disk
+    # cache afterwards) so the first batch request pays no JIT warmup
+    @njit("int64[:](float64[:], float64[:])", cache=True)
+    def _bucketize(values, thresholds):
+        """Count the thresholds each value strictly exceeds (bisect_left per value)"""
+        buckets = np.empty(values.shape[0], dtype=np.int64)
+        for i in range(values.shape[0]):
+            bucket = 0
+            for threshold in thresholds:
+                if values[i] > threshold:
+                    bucket += 1
+            buckets[i] = bucket
+        return buckets
+else:
+    _bucketize = _bucketize_numpy
+
+
+if NUMBA_AVAILABLE:
+    @njit("void(float64[:], int64[:], float64[:], float64)", cache=True)
+    def _apply_effectiveness_feedback(effectiveness, slots, scores, alpha):
+        """Fold feedback scores into per-template moving averages, in arrival order"""
+        for k in range(slots.shape[0]):
+            slot = slots[k]
+            effectiveness[slot] = (1.0 - alpha) * effectiveness[slot] + alpha * scores[k]
+
+
+def _batch_labels(values: Sequence[float], thresholds: Tuple[float, ...],
+                  labels: Tuple[str, ...]) -> List[str]:
+    """Map many scores to their threshold-ladder labels in one vectorized pass"""
+    buckets = _bucketize(
+        np.asarray(values, dtype=np.float64), np.asarray(thresholds, dtype=np.float64)
+    )
+    return [labels[bucket] for bucket in buckets.tolist()]
+
+
+def _join_or(items: List[str], default: str) -> str:
+    """Comma-join items, falling back to default without joining an empty list"""
+    if not items:
+        return default
+    return ", ".join(items) or default
+
+
+# All fields _build_context_data can produce
+_CONTEXT_FIELDS = frozenset({
+    'user_name', 'current_topic', 'user_query', 'learning_style', 'confidence_level',
+    'current_performance', 'learning_pace', 'session_progress', 'emotional_state',
+    'motivation_level', 'engagement_score', 'topics_covered', 'concepts_mastered',
+    'concepts_struggling', 'session_duration', 'frustration_indicators', 'student_strengths',
+    'struggle_areas', 'cognitive_load', 'processing_speed', 'working_memory'
+})
+
+# Enum groups tested by the guidance generators
+_NEGATIVE_EMOTIONS = frozenset({EmotionalState.FRUSTRATED, EmotionalState.ANXIOUS})
+_HIGH_COGNITIVE_LOADS = frozenset({CognitiveLoadLevel.HIGH, CognitiveLoadLevel.OVERLOAD})
+_COMPLEXITY_GUIDANCE = {
+    CognitiveLoadLevel.OVERLOAD: "CRITICAL: Use simplest possible language and concepts only.",
+    CognitiveLoadLevel.HIGH: "Reduce complexity significantly - focus on core essentials only.",
+    CognitiveLoadLevel.MODERATE: "Balanced complexity with clear explanations."
+}
+
+# Maximum number of rendered prompts cached per generator
+PROMPT_CACHE_SIZE = 1024
+
+# Weight of each new feedback score in a template's effectiveness
+EFFECTIVENESS_EMA_ALPHA = 0.1
+
+class TemplateCatalog:
+    """Feedback statistics for a set of templates, stored as parallel arrays"""
+    
+    __slots__ = ('names', 'name_to_idx', 'effectiveness', 'usage')
+    
+    def __init__(self):
+        self.names: List[str] = []
+        self.name_to_idx: Dict[str, int] = {}
+        self.effectiveness = np.zeros(0, dtype=np.float64)
+        self.usage = np.zeros(0, dtype=np.int64)
+    
+    def add(self, name: str, usage_count: int = 0, effectiveness_score: float = 0.5) -> int:
+        """Append a statistics slot and return its index"""
+        slot = len(self.names)
+        self.names.append(name)
+        self.name_to_idx[name] = slot
+        self.effectiveness = np.append(self.effectiveness, effectiveness_score)
+        self.usage = np.append(self.usage, usage_count)
+        return slot
+    
+    def adopt(self, template: 'ContextualPromptTemplate'):
+        """Move a template's statistics into this catalog"""
+        slot = self.add(template.template_name, template.usage_count, template.effectiveness_score)
+        template._catalog = self
+        template._slot = slot
+
 
 class ContextualPromptTemplate:
     """Template system for context-aware prompts"""
     
+    __slots__ = ('template_name', 'base_template', 'context_variables', 'priority_level',
+                 'required_vars', 'segments', '_catalog', '_slot')
+    
     def __init__(self, template_name: str, base_template: str, 
                  context_variables: List[str], priority_level: int = 5):
         self.template_name = template_name
         self.base_template = base_template
         self.context_variables = context_variables
         self.priority_level = priority_level
-        self.usage_count = 0
-        self.effectiveness_score = 0.5  # Will be updated based on user feedback
+        # Usage and effectiveness (updated from user feedback) live in a catalog;
+        # a standalone template gets a catalog of its own
+        self._catalog = TemplateCatalog()
+        self._slot = self._catalog.add(template_name)
+        self.required_vars = frozenset(context_variables)
+        self.segments = self._compile_segments(base_template, context_variables)
+    
+    @property
+    def usage_count(self) -> int:
+        return int(self._catalog.usage[self._slot])
+    
+    @usage_count.setter
+    def usage_count(self, value: int):
+        self._catalog.usage[self._slot] = value
+    
+    @property
+    def effectiveness_score(self) -> float:
+        return float(self._catalog.effectiveness[self._slot])
+    
+    @effectiveness_score.setter
+    def effectiveness_score(self, value: float):
+        self._catalog.effectiveness[self._slot] = value
+    
+    @staticmethod
+    def _compile_segments(base_template: str,
+                          context_variables: List[str]) -> Tuple[Tuple[str, Optional[str]], ...]:
+        """Split template into (literal, variable) pairs so rendering walks it once"""
+        if not context_variables:
+            return ((base_template, None),)
+        
+        # Only exact {variable} placeholders of declared variables are substituted
+        placeholder_pattern = re.compile(
+            r"\{(" + "|".join(re.escape(variable) for variable in context_variables) + r")\}"
+        )
+        pieces = placeholder_pattern.split(base_template)
+        literals = pieces[0::2]
+        variables = pieces[1::2] + [None]
+        return tuple(zip(literals, variables))
+    
+    def _render_into(self, parts: List[str], context_data: Dict[str, Any]) -> str:
+        """Walk the compiled segments into the given parts buffer and join it"""
+        # Bind the loop's attribute lookups to locals once per render
+        append = parts.append
+        lookup = context_data.get
+        for literal, variable in self.segments:
+            append(literal)
+            if variable is not None:
+                append(str(lookup(variable, "")))
+        return "".join(parts)
     
     def render(self, context_data: Dict[str, Any]) -> str:
         """Render template with context data"""
         try:
-            # Replace context variables in template
-            rendered_template = self.base_template
-            
-            for variable in self.context_variables:
-                placeholder = f"{{{variable}}}"
-                value = context_data.get(variable, "")
-                rendered_template = rendered_template.replace(placeholder, str(value))
-            
+            final_prompt = self._render_into([], context_data)
             self.usage_count += 1
-            return rendered_template
+            return final_prompt
             
-        except Exception as e:
-            print(f"Error rendering template {self.template_name}: {e}")
+        except Exception:
+            logger.exception("Error rendering template %s", self.template_name)
             return self.base_template
+    
+    def render_many(self, contexts_data: Sequence[Dict[str, Any]]) -> List[str]:
+        """Render several context dicts, reusing one parts buffer between them"""
+        rendered = []
+        parts = []
+        for context_data in contexts_data:
+            try:
+                rendered.append(self._render_into(parts, context_data))
+                self.usage_count += 1
+            except Exception:
+                logger.exception("Error rendering template %s", self.template_name)
+                rendered.append(self.base_template)
+            parts.clear()
+        return rendered
 
 
-class AdaptivePromptGenerator:
-    """Generates adaptive prompts based on learning context"""
+class _LazyContext(dict):
+    """Context data that computes guidance placeholders only when a template reads them"""
     
-    def __init__(self):
-        self.prompt_templates = self._initialize_prompt_templates()
-        self.context_modifiers = self._initialize_context_modifiers()
-        self.emotional_adaptations = self._initialize_emotional_adaptations()
-        self.cognitive_load_adjustments = self._initialize_cognitive_adjustments()
-        
-    def generate_contextual_prompt(self, base_intent: str, learning_context: LearningContext,
-                                 user_query: str, conversation_history: List[Dict]) -> str:
-        """Generate a contextually adapted prompt"""
-        
-        # 1. Select appropriate base template
-        base_template = self._select_base_template(base_intent, learning_context)
-        
-        # 2. Build context enrichment data
-        context_data = self._build_context_data(learning_context, user_query, conversation_history)
-        
-        # 3. Apply emotional adaptations
-        emotional_adaptations = self._get_emotional_adaptations(learning_context.emotional_state)
-        
-        # 4. Apply cognitive load adjustments
-        cognitive_adjustments = self._get_cognitive_adjustments(learning_context.cognitive_load)
-        
-        # 5. Apply learning style modifications
-        modality_mods = self._get_modality_modifications(learning_context.preferred_modality)
-        
-        # 6. Render final prompt
-        final_prompt = self._render_adaptive_prompt(
-            base_template, context_data, emotional_adaptations, 
-            cognitive_adjustments, modality_mods
-        )
-        
-        return final_prompt
+    # One of these is built per render, so skip the per-instance __dict__
+    __slots__ = ('_generators', '_learning_context')
     
-    def _initialize_prompt_templates(self) -> Dict[str, ContextualPromptTemplate]:
-        """Initialize library of contextual prompt templates"""
-        templates = {}
-        
-        # Explanation Templates
-        templates['explanation_basic'] = ContextualPromptTemplate(
-            'explanation_basic',
-            """You are an AI tutor helping {user_name} learn {current_topic}. 
+    def __init__(self, data: Dict[str, Any], generators: Dict[str, Any],
+                 learning_context: LearningContext):
+        super().__init__(data)
+        self._generators = generators
+        self._learning_context = learning_context
+    
+    def __missing__(self, key: str) -> Any:
+        generator = self._generators.get(key)
+        if generator is None:
+            raise KeyError(key)
+        value = self[key] = generator(self._learning_context)
+        return value
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+# Library of contextual prompt templates, built once at import
+_PROMPT_TEMPLATES: Dict[str, ContextualPromptTemplate] = {}
+
+# Explanation Templates
+_PROMPT_TEMPLATES['explanation_basic'] = ContextualPromptTemplate(
+    'explanation_basic',
+    """You are an AI tutor helping {user_name} learn {current_topic}. 
             Based on their {learning_style} learning preference and {confidence_level} confidence level,
             provide a clear explanation of {user_query}.
             
@@ -102,15 +280,15 @@ class AdaptivePromptGenerator:
             {emotional_guidance}
             {cognitive_adjustment}
             {modality_instruction}""",
-            ['user_name', 'current_topic', 'learning_style', 'confidence_level', 'user_query',
-             'current_performance', 'learning_pace', 'session_progress', 'emotional_guidance',
-             'cognitive_adjustment', 'modality_instruction']
-        )
-        
-        # Problem Solving Templates
-        templates['problem_solving'] = ContextualPromptTemplate(
-            'problem_solving',
-            """Help {user_name} solve this {current_topic} problem step by step.
+    ['user_name', 'current_topic', 'learning_style', 'confidence_level', 'user_query',
+     'current_performance', 'learning_pace', 'session_progress', 'emotional_guidance',
+     'cognitive_adjustment', 'modality_instruction']
+)
+
+# Problem Solving Templates
+_PROMPT_TEMPLATES['problem_solving'] = ContextualPromptTemplate(
+    'problem_solving',
+    """Help {user_name} solve this {current_topic} problem step by step.
             
             Student Profile:
             - Strengths: {student_strengths}
@@ -123,15 +301,15 @@ class AdaptivePromptGenerator:
             {emotional_guidance}
             {difficulty_adjustment}
             {step_by_step_guidance}""",
-            ['user_name', 'current_topic', 'student_strengths', 'struggle_areas',
-             'learning_style', 'emotional_state', 'user_query', 'emotional_guidance',
-             'difficulty_adjustment', 'step_by_step_guidance']
-        )
-        
-        # Review and Assessment Templates
-        templates['review_assessment'] = ContextualPromptTemplate(
-            'review_assessment',
-            """Conduct a learning review with {user_name} for {current_topic}.
+    ['user_name', 'current_topic', 'student_strengths', 'struggle_areas',
+     'learning_style', 'emotional_state', 'user_query', 'emotional_guidance',
+     'difficulty_adjustment', 'step_by_step_guidance']
+)
+
+# Review and Assessment Templates
+_PROMPT_TEMPLATES['review_assessment'] = ContextualPromptTemplate(
+    'review_assessment',
+    """Conduct a learning review with {user_name} for {current_topic}.
             
             Session Summary:
             - Topics covered: {topics_covered}
@@ -146,15 +324,15 @@ class AdaptivePromptGenerator:
             
             {emotional_guidance}
             {next_steps_guidance}""",
-            ['user_name', 'current_topic', 'topics_covered', 'concepts_mastered',
-             'concepts_struggling', 'session_duration', 'current_performance',
-             'confidence_level', 'engagement_score', 'emotional_guidance', 'next_steps_guidance']
-        )
-        
-        # Motivational Support Templates
-        templates['motivational_support'] = ContextualPromptTemplate(
-            'motivational_support',
-            """Provide motivational support to {user_name} who is studying {current_topic}.
+    ['user_name', 'current_topic', 'topics_covered', 'concepts_mastered',
+     'concepts_struggling', 'session_duration', 'current_performance',
+     'confidence_level', 'engagement_score', 'emotional_guidance', 'next_steps_guidance']
+)
+
+# Motivational Support Templates
+_PROMPT_TEMPLATES['motivational_support'] = ContextualPromptTemplate(
+    'motivational_support',
+    """Provide motivational support to {user_name} who is studying {current_topic}.
             
             Current Situation:
             - Emotional state: {emotional_state}
@@ -165,15 +343,15 @@ class AdaptivePromptGenerator:
             {emotional_guidance}
             {encouragement_strategy}
             {goal_refocusing}""",
-            ['user_name', 'current_topic', 'emotional_state', 'motivation_level',
-             'frustration_indicators', 'student_strengths', 'emotional_guidance',
-             'encouragement_strategy', 'goal_refocusing']
-        )
-        
-        # Adaptive Difficulty Templates
-        templates['adaptive_explanation'] = ContextualPromptTemplate(
-            'adaptive_explanation',
-            """Explain {current_topic} to {user_name} at the appropriate difficulty level.
+    ['user_name', 'current_topic', 'emotional_state', 'motivation_level',
+     'frustration_indicators', 'student_strengths', 'emotional_guidance',
+     'encouragement_strategy', 'goal_refocusing']
+)
+
+# Adaptive Difficulty Templates
+_PROMPT_TEMPLATES['adaptive_explanation'] = ContextualPromptTemplate(
+    'adaptive_explanation',
+    """Explain {current_topic} to {user_name} at the appropriate difficulty level.
             
             Adaptation Factors:
             - Current cognitive load: {cognitive_load}
@@ -186,37 +364,45 @@ class AdaptivePromptGenerator:
             {cognitive_adjustment}
             {complexity_guidance}
             {scaffolding_instruction}""",
-            ['current_topic', 'user_name', 'cognitive_load', 'processing_speed',
-             'working_memory', 'current_performance', 'user_query', 'cognitive_adjustment',
-             'complexity_guidance', 'scaffolding_instruction']
-        )
-        
-        return templates
-    
-    def _initialize_context_modifiers(self) -> Dict[str, Dict[str, str]]:
-        """Initialize context modification strategies"""
-        return {
-            'performance_based': {
-                'high_performer': "Build on their strong foundation and introduce advanced concepts.",
-                'average_performer': "Provide balanced support with clear examples and practice.",
-                'struggling_performer': "Focus on fundamental concepts with extra scaffolding and encouragement."
-            },
-            'pace_based': {
-                'fast': "Present information efficiently with challenging extensions.",
-                'medium': "Use a balanced pace with adequate examples and practice time.",
-                'slow': "Break down concepts into smaller steps with frequent check-ins."
-            },
-            'session_progress': {
-                'early_session': "Start with a warm-up and build momentum gradually.",
-                'mid_session': "Maintain focus with engaging activities and clear progress markers.",
-                'late_session': "Keep content concise and provide regular summary points."
-            }
-        }
-    
-    def _initialize_emotional_adaptations(self) -> Dict[EmotionalState, str]:
-        """Initialize emotional adaptation strategies"""
-        return {
-            EmotionalState.FRUSTRATED: """
+    ['current_topic', 'user_name', 'cognitive_load', 'processing_speed',
+     'working_memory', 'current_performance', 'user_query', 'cognitive_adjustment',
+     'complexity_guidance', 'scaffolding_instruction']
+)
+
+# Statistics for the library templates, shared by every generator in the process
+_TEMPLATE_CATALOG = TemplateCatalog()
+for _template in _PROMPT_TEMPLATES.values():
+    _TEMPLATE_CATALOG.adopt(_template)
+del _template
+
+
+# Context modification strategies
+_CONTEXT_MODIFIERS: Dict[str, Dict[str, str]] = {
+    'performance_based': {
+        'high_performer': "Build on their strong foundation and introduce advanced concepts.",
+        'average_performer': "Provide balanced support with clear examples and practice.",
+        'struggling_performer': "Focus on fundamental concepts with extra scaffolding and encouragement."
+    },
+    'pace_based': {
+        'fast': "Present information efficiently with challenging extensions.",
+        'medium': "Use a balanced pace with adequate examples and practice time.",
+        'slow': "Break down concepts into smaller steps with frequent check-ins."
+    },
+    'session_progress': {
+        'early_session': "Start with a warm-up and build momentum gradually.",
+        'mid_session': "Maintain focus with engaging activities and clear progress markers.",
+        'late_session': "Keep content concise and provide regular summary points."
+    }
+}
+for _modifiers in _CONTEXT_MODIFIERS.values():
+    for _name, _text in _modifiers.items():
+        _modifiers[_name] = sys.intern(_text)
+del _modifiers, _name, _text
+
+
+# Emotional adaptation strategies
+_EMOTIONAL_ADAPTATIONS: Dict[EmotionalState, str] = {
+    EmotionalState.FRUSTRATED: """
             EMOTIONAL GUIDANCE: The student is showing signs of frustration.
             - Acknowledge their effort and provide reassurance
             - Break down the problem into smaller, manageable steps  
@@ -224,8 +410,8 @@ class AdaptivePromptGenerator:
             - Emphasize progress made so far
             - Suggest a brief mental break if needed
             """,
-            
-            EmotionalState.CONFUSED: """
+    
+    EmotionalState.CONFUSED: """
             EMOTIONAL GUIDANCE: The student appears confused.
             - Use simpler language and shorter sentences
             - Provide concrete examples before abstract concepts
@@ -233,24 +419,24 @@ class AdaptivePromptGenerator:
             - Offer multiple explanations using different approaches
             - Be patient and encouraging
             """,
-            
-            EmotionalState.CONFIDENT: """
+    
+    EmotionalState.CONFIDENT: """
             EMOTIONAL GUIDANCE: The student is displaying confidence.
             - Challenge them with slightly more advanced concepts
             - Encourage them to explain their understanding
             - Introduce extension activities or applications
             - Praise their competence while maintaining appropriate challenge
             """,
-            
-            EmotionalState.MOTIVATED: """
+    
+    EmotionalState.MOTIVATED: """
             EMOTIONAL GUIDANCE: The student is highly motivated.
             - Capitalize on their enthusiasm with engaging content
             - Provide opportunities for deeper exploration
             - Connect to their personal interests and goals
             - Encourage active participation and questions
             """,
-            
-            EmotionalState.BORED: """
+    
+    EmotionalState.BORED: """
             EMOTIONAL GUIDANCE: The student seems disengaged.
             - Introduce variety in teaching methods
             - Connect content to real-world applications
@@ -258,8 +444,8 @@ class AdaptivePromptGenerator:
             - Adjust difficulty level to maintain challenge
             - Incorporate their personal interests
             """,
-            
-            EmotionalState.ANXIOUS: """
+    
+    EmotionalState.ANXIOUS: """
             EMOTIONAL GUIDANCE: The student appears anxious about learning.
             - Provide constant reassurance and positive feedback
             - Use low-stakes questioning and gentle corrections
@@ -267,28 +453,28 @@ class AdaptivePromptGenerator:
             - Focus on effort and process rather than outcomes
             - Break tasks into very small, achievable steps
             """
-        }
-    
-    def _initialize_cognitive_adjustments(self) -> Dict[CognitiveLoadLevel, str]:
-        """Initialize cognitive load adjustment strategies"""
-        return {
-            CognitiveLoadLevel.LOW: """
+}
+
+
+# Cognitive load adjustment strategies
+_COGNITIVE_ADJUSTMENTS: Dict[CognitiveLoadLevel, str] = {
+    CognitiveLoadLevel.LOW: """
             COGNITIVE ADJUSTMENT: Student has low cognitive load - can handle complexity.
             - Present comprehensive information with multiple perspectives
             - Include advanced connections and implications
             - Encourage critical thinking and analysis
             - Introduce challenging problem-solving scenarios
             """,
-            
-            CognitiveLoadLevel.MODERATE: """
+    
+    CognitiveLoadLevel.MODERATE: """
             COGNITIVE ADJUSTMENT: Student has moderate cognitive load - balanced approach.
             - Present information in organized, logical sequences
             - Use clear examples to illustrate each point
             - Provide adequate processing time between concepts
             - Include some challenge while maintaining support
             """,
-            
-            CognitiveLoadLevel.HIGH: """
+    
+    CognitiveLoadLevel.HIGH: """
             COGNITIVE ADJUSTMENT: Student has high cognitive load - simplify approach.
             - Break information into small, digestible chunks
             - Use simple, clear language and shorter sentences
@@ -296,8 +482,8 @@ class AdaptivePromptGenerator:
             - Reduce extraneous information and focus on essentials
             - Offer one concept at a time before moving forward
             """,
-            
-            CognitiveLoadLevel.OVERLOAD: """
+    
+    CognitiveLoadLevel.OVERLOAD: """
             COGNITIVE ADJUSTMENT: Student is experiencing cognitive overload - emergency simplification.
             - STOP introducing new information immediately
             - Focus only on the most essential core concept
@@ -306,135 +492,229 @@ class AdaptivePromptGenerator:
             - Suggest a brief break to reset cognitive capacity
             - Check understanding before any progression
             """
-        }
-    
-    def _select_base_template(self, intent: str, context: LearningContext) -> ContextualPromptTemplate:
-        """Select the most appropriate base template"""
-        
-        # Map common intents to templates
-        intent_mapping = {
-            'explain': 'explanation_basic',
-            'solve': 'problem_solving', 
-            'review': 'review_assessment',
-            'motivate': 'motivational_support',
-            'adapt': 'adaptive_explanation'
-        }
-        
-        # Check if student needs motivational support
-        if context.emotional_state in [EmotionalState.FRUSTRATED, EmotionalState.ANXIOUS] or \
-           context.motivation_level < 0.3:
-            return self.prompt_templates['motivational_support']
-        
-        # Check if cognitive load requires special handling
-        if context.cognitive_load in [CognitiveLoadLevel.HIGH, CognitiveLoadLevel.OVERLOAD]:
-            return self.prompt_templates['adaptive_explanation']
-        
-        # Use intent-based selection
-        template_key = intent_mapping.get(intent, 'explanation_basic')
-        return self.prompt_templates.get(template_key, self.prompt_templates['explanation_basic'])
-    
-    def _build_context_data(self, context: LearningContext, user_query: str, 
-                          history: List[Dict]) -> Dict[str, Any]:
-        """Build comprehensive context data for template rendering"""
-        
-        return {
-            'user_name': "Student",  # Could be personalized from user profile
-            'current_topic': context.current_topic,
-            'user_query': user_query,
-            'learning_style': context.preferred_modality.value,
-            'confidence_level': self._format_confidence_level(context.confidence_level),
-            'current_performance': self._format_performance_level(context.current_performance),
-            'learning_pace': context.learning_pace,
-            'session_progress': f"{context.interaction_count} interactions, {context.session_duration:.1f} minutes",
-            'emotional_state': context.emotional_state.value,
-            'motivation_level': self._format_motivation_level(context.motivation_level),
-            'engagement_score': self._format_engagement_score(context.engagement_score),
-            'topics_covered': ", ".join(context.topics_covered),
-            'concepts_mastered': ", ".join(context.concepts_mastered) or "None yet",
-            'concepts_struggling': ", ".join(context.concepts_struggling) or "None identified",
-            'session_duration': int(context.session_duration),
-            'frustration_indicators': ", ".join(context.frustration_indicators) or "None",
-            'student_strengths': self._infer_strengths(context),
-            'struggle_areas': ", ".join(context.concepts_struggling) or "None currently identified",
-            'cognitive_load': context.cognitive_load.value,
-            'processing_speed': context.processing_speed,
-            'working_memory': str(context.working_memory_capacity)
-        }
-    
-    def _get_emotional_adaptations(self, emotional_state: EmotionalState) -> str:
-        """Get emotional adaptation guidance"""
-        return self.emotional_adaptations.get(emotional_state, "")
-    
-    def _get_cognitive_adjustments(self, cognitive_load: CognitiveLoadLevel) -> str:
-        """Get cognitive load adjustment guidance"""
-        return self.cognitive_load_adjustments.get(cognitive_load, "")
-    
-    def _get_modality_modifications(self, preferred_modality: LearningModalityType) -> str:
-        """Get learning modality-specific modifications"""
-        modality_instructions = {
-            LearningModalityType.VISUAL: """
+}
+
+
+# Learning modality-specific instructions
+_MODALITY_INSTRUCTIONS: Dict[LearningModalityType, str] = {
+    LearningModalityType.VISUAL: """
             MODALITY INSTRUCTION: Student prefers visual learning.
             - Use descriptive language that helps them visualize concepts
             - Suggest diagrams, charts, or mental imagery when relevant
             - Organize information spatially and hierarchically
             - Use examples that can be easily visualized
             """,
-            
-            LearningModalityType.AUDITORY: """
+    
+    LearningModalityType.AUDITORY: """
             MODALITY INSTRUCTION: Student prefers auditory learning.
             - Use clear, verbal explanations with good flow
             - Encourage them to talk through problems out loud
             - Use analogies and stories to explain concepts
             - Suggest reading content aloud for better retention
             """,
-            
-            LearningModalityType.KINESTHETIC: """
+    
+    LearningModalityType.KINESTHETIC: """
             MODALITY INSTRUCTION: Student prefers hands-on learning.
             - Encourage active engagement and practice
             - Suggest physical manipulation of concepts when possible
             - Use step-by-step processes they can follow along
             - Incorporate movement or tactile elements where relevant
             """,
-            
-            LearningModalityType.READING_WRITING: """
+    
+    LearningModalityType.READING_WRITING: """
             MODALITY INSTRUCTION: Student prefers reading/writing approach.
             - Provide clear, well-structured written explanations
             - Encourage note-taking and written summaries
             - Use lists, outlines, and organized text formats
             - Suggest written practice exercises
             """,
-            
-            LearningModalityType.MULTIMODAL: """
+    
+    LearningModalityType.MULTIMODAL: """
             MODALITY INSTRUCTION: Student benefits from multiple modalities.
             - Combine visual, auditory, and kinesthetic elements
             - Offer multiple ways to engage with the content
             - Vary your teaching approach within the explanation
             - Allow them to choose their preferred interaction style
             """
+}
+
+
+def _build_enum_table(enum_cls, guidance: Dict[Any, str]) -> Tuple[Dict[Any, int], Tuple[str, ...]]:
+    """Lay out per-member guidance as a tuple addressed by the member's position"""
+    index = {member: position for position, member in enumerate(enum_cls)}
+    # Interned so equal guidance compares by identity in downstream caches
+    table = tuple(sys.intern(guidance.get(member, "")) for member in enum_cls)
+    return index, table
+
+
+_EMOTIONAL_INDEX, _EMOTIONAL_TABLE = _build_enum_table(EmotionalState, _EMOTIONAL_ADAPTATIONS)
+_COGNITIVE_INDEX, _COGNITIVE_TABLE = _build_enum_table(CognitiveLoadLevel, _COGNITIVE_ADJUSTMENTS)
+_MODALITY_INDEX, _MODALITY_TABLE = _build_enum_table(LearningModalityType, _MODALITY_INSTRUCTIONS)
+
+
+# Map common intents to templates
+_INTENT_TEMPLATES = {
+    'explain': 'explanation_basic',
+    'solve': 'problem_solving',
+    'review': 'review_assessment',
+    'motivate': 'motivational_support',
+    'adapt': 'adaptive_explanation'
+}
+
+
+def _select_template_key(intent: str, context: LearningContext) -> str:
+    """Pick the template key; emotional and cognitive overrides win over the intent"""
+    if context.emotional_state in _NEGATIVE_EMOTIONS or context.motivation_level < 0.3:
+        return 'motivational_support'
+    if context.cognitive_load in _HIGH_COGNITIVE_LOADS:
+        return 'adaptive_explanation'
+    return _INTENT_TEMPLATES.get(intent, 'explanation_basic')
+
+
+class AdaptivePromptGenerator:
+    """Generates adaptive prompts based on learning context"""
+    
+    def __init__(self):
+        self.prompt_templates = _PROMPT_TEMPLATES
+        self.template_catalog = _TEMPLATE_CATALOG
+        self.context_modifiers = _CONTEXT_MODIFIERS
+        self.emotional_adaptations = _EMOTIONAL_ADAPTATIONS
+        self.cognitive_load_adjustments = _COGNITIVE_ADJUSTMENTS
+        # Rendered prompts keyed by the template and the values of its placeholders
+        self._prompt_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._prompt_cache_lock = threading.Lock()
+        # Guidance placeholders computed on demand while rendering
+        self._guidance_generators = {
+            'difficulty_adjustment': self._generate_difficulty_guidance,
+            'step_by_step_guidance': self._generate_step_guidance,
+            'scaffolding_instruction': self._generate_scaffolding_guidance,
+            'complexity_guidance': self._generate_complexity_guidance,
+            'encouragement_strategy': self._generate_encouragement_strategy,
+            'goal_refocusing': self._generate_goal_refocusing,
+            'next_steps_guidance': self._generate_next_steps
         }
         
-        return modality_instructions.get(preferred_modality, "")
-    
-    def _render_adaptive_prompt(self, template: ContextualPromptTemplate, 
-                               context_data: Dict[str, Any],
-                               emotional_adaptations: str,
-                               cognitive_adjustments: str,
-                               modality_mods: str) -> str:
-        """Render the final adaptive prompt"""
+    def generate_contextual_prompt(self, base_intent: str, learning_context: LearningContext,
+                                 user_query: str) -> str:
+        """Generate a contextually adapted prompt"""
         
-        # Add adaptation instructions to context data
-        context_data['emotional_guidance'] = emotional_adaptations
-        context_data['cognitive_adjustment'] = cognitive_adjustments
-        context_data['modality_instruction'] = modality_mods
+        # 1. Select appropriate base template
+        base_template = self._select_base_template(base_intent, learning_context)
+        
+        # 2. Build context enrichment data
+        context_data = self._build_context_data(learning_context, user_query, base_template)
+        
+        # 3. Apply emotional adaptations
+        emotional_adaptations = self._get_emotional_adaptations(learning_context.emotional_state)
+        
+        # 4. Apply cognitive load adjustments
+        cognitive_adjustments = self._get_cognitive_adjustments(learning_context.cognitive_load)
+        
+        # 5. Apply learning style modifications
+        modality_mods = self._get_modality_modifications(learning_context.preferred_modality)
+        
+        context_data = self._with_guidance(context_data, emotional_adaptations,
+                                           cognitive_adjustments, modality_mods, learning_context)
+        
+        # 6. Reuse the prompt rendered from the same placeholder values. Only the values the
+        # template reads enter the key, so e.g. session progress splits entries only for the
+        # template that shows it
+        cache_key = (base_template.template_name,) + tuple(
+            context_data.get(variable, "") for _, variable in base_template.segments if variable is not None
+        )
+        with self._prompt_cache_lock:
+            final_prompt = self._prompt_cache.get(cache_key)
+            if final_prompt is not None:
+                self._prompt_cache.move_to_end(cache_key)
+        if final_prompt is not None:
+            base_template.usage_count += 1
+            return final_prompt
+        
+        # 7. Render final prompt
+        final_prompt = self._render_adaptive_prompt(base_template, context_data)
+        
+        with self._prompt_cache_lock:
+            self._prompt_cache[cache_key] = final_prompt
+            if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+                self._prompt_cache.popitem(last=False)
         
-        # Add additional contextual guidance
-        context_data['difficulty_adjustment'] = self._generate_difficulty_guidance(context_data)
-        context_data['step_by_step_guidance'] = self._generate_step_guidance(context_data)
-        context_data['scaffolding_instruction'] = self._generate_scaffolding_guidance(context_data)
-        context_data['complexity_guidance'] = self._generate_complexity_guidance(context_data)
-        context_data['encouragement_strategy'] = self._generate_encouragement_strategy(context_data)
-        context_data['goal_refocusing'] = self._generate_goal_refocusing(context_data)
-        context_data['next_steps_guidance'] = self._generate_next_steps(context_data)
+        return final_prompt
+    
+    def _select_base_template(self, intent: str, context: LearningContext) -> ContextualPromptTemplate:
+        """Select the most appropriate base template"""
+        return self.prompt_templates.get(_select_template_key(intent, context),
+                                         self.prompt_templates['explanation_basic'])
+    
+    def _build_context_data(self, context: LearningContext, user_query: str,
+                          template: Optional[ContextualPromptTemplate] = None) -> Dict[str, Any]:
+        """Build context data for template rendering, limited to the fields the template needs"""
+        
+        fields = template.required_vars if template is not None else _CONTEXT_FIELDS
+        data = {}
+        
+        if 'user_name' in fields:
+            data['user_name'] = "Student"  # Could be personalized from user profile
+        if 'current_topic' in fields:
+            data['current_topic'] = context.current_topic
+        if 'user_query' in fields:
+            data['user_query'] = user_query
+        if 'learning_style' in fields:
+            data['learning_style'] = context.preferred_modality.value
+        if 'confidence_level' in fields:
+            data['confidence_level'] = self._format_confidence_level(context.confidence_level)
+        if 'current_performance' in fields:
+            data['current_performance'] = self._format_performance_level(context.current_performance)
+        if 'learning_pace' in fields:
+            data['learning_pace'] = context.learning_pace
+        if 'session_progress' in fields:
+            data['session_progress'] = f"{context.interaction_count} interactions, {context.session_duration:.1f} minutes"
+        if 'emotional_state' in fields:
+            data['emotional_state'] = context.emotional_state.value
+        if 'motivation_level' in fields:
+            data['motivation_level'] = self._format_motivation_level(context.motivation_level)
+        if 'engagement_score' in fields:
+            data['engagement_score'] = self._format_engagement_score(context.engagement_score)
+        if 'topics_covered' in fields:
+            data['topics_covered'] = _join_or(context.topics_covered, "")
+        if 'concepts_mastered' in fields:
+            data['concepts_mastered'] = _join_or(context.concepts_mastered, "None yet")
+        if 'concepts_struggling' in fields:
+            data['concepts_struggling'] = _join_or(context.concepts_struggling, "None identified")
+        if 'session_duration' in fields:
+            data['session_duration'] = int(context.session_duration)
+        if 'frustration_indicators' in fields:
+            data['frustration_indicators'] = _join_or(context.frustration_indicators, "None")
+        if 'student_strengths' in fields:
+            data['student_strengths'] = self._infer_strengths(context)
+        if 'struggle_areas' in fields:
+            data['struggle_areas'] = _join_or(context.concepts_struggling, "None currently identified")
+        if 'cognitive_load' in fields:
+            data['cognitive_load'] = context.cognitive_load.value
+        if 'processing_speed' in fields:
+            data['processing_speed'] = context.processing_speed
+        if 'working_memory' in fields:
+            data['working_memory'] = str(context.working_memory_capacity)
+        
+        return data
+    
+    def _get_emotional_adaptations(self, emotional_state: EmotionalState) -> str:
+        """Get emotional adaptation guidance"""
+        position = _EMOTIONAL_INDEX.get(emotional_state)
+        return _EMOTIONAL_TABLE[position] if position is not None else ""
+    
+    def _get_cognitive_adjustments(self, cognitive_load: CognitiveLoadLevel) -> str:
+        """Get cognitive load adjustment guidance"""
+        position = _COGNITIVE_INDEX.get(cognitive_load)
+        return _COGNITIVE_TABLE[position] if position is not None else ""
+    
+    def _get_modality_modifications(self, preferred_modality: LearningModalityType) -> str:
+        """Get learning modality-specific modifications"""
+        position = _MODALITY_INDEX.get(preferred_modality)
+        return _MODALITY_TABLE[position] if position is not None else ""
+    
+    def _render_adaptive_prompt(self, template: ContextualPromptTemplate, 
+                               context_data: Dict[str, Any]) -> str:
+        """Render the final adaptive prompt from context data carrying the adaptation guidance"""
         
         # Render the template
         final_prompt = template.render(context_data)
@@ -444,142 +724,149 @@ class AdaptivePromptGenerator:
         
         return final_prompt
     
+    def _with_guidance(self, context_data: Dict[str, Any], emotional_adaptations: str,
+                       cognitive_adjustments: str, modality_mods: str,
+                       learning_context: LearningContext) -> Dict[str, Any]:
+        """Attach adaptation instructions and lazily generated guidance to context data"""
+        # Additional contextual guidance is generated only for placeholders the template uses
+        context_data = _LazyContext(context_data, self._guidance_generators, learning_context)
+        
+        # Add adaptation instructions to context data
+        context_data['emotional_guidance'] = emotional_adaptations
+        context_data['cognitive_adjustment'] = cognitive_adjustments
+        context_data['modality_instruction'] = modality_mods
+        return context_data
+    
+    def render_many(self, learning_contexts: Sequence[LearningContext], intents: Sequence[str],
+                    user_queries: Sequence[str]) -> List[str]:
+        """Render prompts for many contexts at once, e.g. for offline precomputation.
+        
+        Contexts are grouped by selected template so each group walks the same
+        compiled segments back to back. The prompt cache is bypassed.
+        """
+        if not len(learning_contexts) == len(intents) == len(user_queries):
+            raise ValueError("learning_contexts, intents and user_queries must have the same length")
+        
+        groups: Dict[str, List[int]] = {}
+        for position, (intent, context) in enumerate(zip(intents, learning_contexts)):
+            groups.setdefault(_select_template_key(intent, context), []).append(position)
+        
+        prompts = [""] * len(learning_contexts)
+        default_template = self.prompt_templates['explanation_basic']
+        for template_key, positions in groups.items():
+            template = self.prompt_templates.get(template_key, default_template)
+            contexts_data = []
+            for position in positions:
+                context = learning_contexts[position]
+                contexts_data.append(self._with_guidance(
+                    self._build_context_data(context, user_queries[position], template),
+                    self._get_emotional_adaptations(context.emotional_state),
+                    self._get_cognitive_adjustments(context.cognitive_load),
+                    self._get_modality_modifications(context.preferred_modality),
+                    context
+                ))
+            for position, rendered in zip(positions, template.render_many(contexts_data)):
+                prompts[position] = self._clean_prompt(rendered)
+        
+        return prompts
+    
     def _format_confidence_level(self, confidence: float) -> str:
         """Format confidence level for human reading"""
-        if confidence > 0.8:
-            return "very confident"
-        elif confidence > 0.6:
-            return "confident"
-        elif confidence > 0.4:
-            return "somewhat confident"
-        elif confidence > 0.2:
-            return "low confidence"
-        else:
-            return "very low confidence"
+        return _CONFIDENCE_LABELS[bisect_left(_CONFIDENCE_THRESHOLDS, confidence)]
     
     def _format_performance_level(self, performance: float) -> str:
         """Format performance level for human reading"""
-        if performance > 0.8:
-            return "excellent performance"
-        elif performance > 0.6:
-            return "good performance"
-        elif performance > 0.4:
-            return "moderate performance"
-        elif performance > 0.2:
-            return "below average performance"
-        else:
-            return "struggling performance"
+        return _PERFORMANCE_LABELS[bisect_left(_PERFORMANCE_THRESHOLDS, performance)]
     
     def _format_motivation_level(self, motivation: float) -> str:
         """Format motivation level for human reading"""
-        if motivation > 0.7:
-            return "highly motivated"
-        elif motivation > 0.5:
-            return "motivated"
-        elif motivation > 0.3:
-            return "somewhat motivated"
-        else:
-            return "low motivation"
+        return _MOTIVATION_LABELS[bisect_left(_MOTIVATION_THRESHOLDS, motivation)]
     
     def _format_engagement_score(self, engagement: float) -> str:
         """Format engagement score for human reading"""
-        if engagement > 0.7:
-            return "highly engaged"
-        elif engagement > 0.5:
-            return "engaged"
-        elif engagement > 0.3:
-            return "moderately engaged"
-        else:
-            return "disengaged"
+        return _ENGAGEMENT_LABELS[bisect_left(_ENGAGEMENT_THRESHOLDS, engagement)]
+    
+    def batch_format_confidence(self, confidences: Sequence[float]) -> List[str]:
+        """Format many confidence levels at once, e.g. for offline prompt precomputation"""
+        return _batch_labels(confidences, _CONFIDENCE_THRESHOLDS, _CONFIDENCE_LABELS)
+    
+    def batch_format_performance(self, performances: Sequence[float]) -> List[str]:
+        """Format many performance levels at once"""
+        return _batch_labels(performances, _PERFORMANCE_THRESHOLDS, _PERFORMANCE_LABELS)
+    
+    def batch_format_motivation(self, motivations: Sequence[float]) -> List[str]:
+        """Format many motivation levels at once"""
+        return _batch_labels(motivations, _MOTIVATION_THRESHOLDS, _MOTIVATION_LABELS)
+    
+    def batch_format_engagement(self, engagements: Sequence[float]) -> List[str]:
+        """Format many engagement scores at once"""
+        return _batch_labels(engagements, _ENGAGEMENT_THRESHOLDS, _ENGAGEMENT_LABELS)
     
     def _infer_strengths(self, context: LearningContext) -> str:
         """Infer student strengths from context"""
-        strengths = []
-        
-        if context.current_performance > 0.7:
-            strengths.append("strong performance")
-        if context.engagement_score > 0.6:
-            strengths.append("good engagement")
-        if context.confidence_level > 0.6:
-            strengths.append("self-confidence")
-        if context.session_duration > context.optimal_session_length * 0.8:
-            strengths.append("sustained attention")
-        if len(context.concepts_mastered) > len(context.concepts_struggling):
-            strengths.append("concept mastery")
-        
-        return ", ".join(strengths) if strengths else "developing fundamental skills"
-    
-    def _generate_difficulty_guidance(self, context_data: Dict[str, Any]) -> str:
+        strengths = ", ".join(strength for strength, present in (
+            ("strong performance", context.current_performance > 0.7),
+            ("good engagement", context.engagement_score > 0.6),
+            ("self-confidence", context.confidence_level > 0.6),
+            ("sustained attention", context.session_duration > context.optimal_session_length * 0.8),
+            ("concept mastery", len(context.concepts_mastered) > len(context.concepts_struggling))
+        ) if present)
+        return strengths or "developing fundamental skills"
+    
+    def _generate_difficulty_guidance(self, context: LearningContext) -> str:
         """Generate difficulty adjustment guidance"""
-        performance = context_data.get('current_performance', '')
-        
-        if 'excellent' in performance or 'good' in performance:
+        if context.current_performance > 0.6:
             return "Feel free to introduce challenging concepts and extensions."
-        elif 'moderate' in performance:
+        elif context.current_performance > 0.4:
             return "Maintain current difficulty with good scaffolding."
         else:
             return "Simplify concepts and provide additional support and examples."
     
-    def _generate_step_guidance(self, context_data: Dict[str, Any]) -> str:
+    def _generate_step_guidance(self, context: LearningContext) -> str:
         """Generate step-by-step guidance"""
-        cognitive_load = context_data.get('cognitive_load', '')
-        
-        if cognitive_load in ['high', 'overload']:
+        if context.cognitive_load in _HIGH_COGNITIVE_LOADS:
             return "Break down into very small, clear steps. Wait for understanding before proceeding."
         else:
             return "Provide logical step-by-step progression with clear reasoning."
     
-    def _generate_scaffolding_guidance(self, context_data: Dict[str, Any]) -> str:
+    def _generate_scaffolding_guidance(self, context: LearningContext) -> str:
         """Generate scaffolding instruction"""
-        confidence = context_data.get('confidence_level', '')
-        
-        if 'low' in confidence:
+        if not context.confidence_level > 0.4:
             return "Provide extensive scaffolding with examples, hints, and guided practice."
-        elif 'somewhat' in confidence:
+        elif not context.confidence_level > 0.6:
             return "Offer moderate scaffolding with opportunities for independent thinking."
         else:
             return "Minimal scaffolding needed - encourage independent problem-solving."
     
-    def _generate_complexity_guidance(self, context_data: Dict[str, Any]) -> str:
+    def _generate_complexity_guidance(self, context: LearningContext) -> str:
         """Generate complexity guidance based on cognitive load"""
-        cognitive_load = context_data.get('cognitive_load', '')
-        
-        if cognitive_load == 'overload':
-            return "CRITICAL: Use simplest possible language and concepts only."
-        elif cognitive_load == 'high':
-            return "Reduce complexity significantly - focus on core essentials only."
-        elif cognitive_load == 'moderate':
-            return "Balanced complexity with clear explanations."
-        else:
-            return "Can handle full complexity with rich connections."
+        return _COMPLEXITY_GUIDANCE.get(
+            context.cognitive_load, "Can handle full complexity with rich connections."
+        )
     
-    def _generate_encouragement_strategy(self, context_data: Dict[str, Any]) -> str:
+    def _generate_encouragement_strategy(self, context: LearningContext) -> str:
         """Generate encouragement strategy"""
-        emotional_state = context_data.get('emotional_state', '')
-        motivation = context_data.get('motivation_level', '')
-        
-        if emotional_state in ['frustrated', 'anxious'] or 'low' in motivation:
+        if context.emotional_state in _NEGATIVE_EMOTIONS or not context.motivation_level > 0.3:
             return "Provide frequent positive reinforcement and acknowledge effort over outcome."
-        elif emotional_state == 'confident':
+        elif context.emotional_state is EmotionalState.CONFIDENT:
             return "Acknowledge competence while maintaining appropriate challenge."
         else:
             return "Provide balanced encouragement and constructive feedback."
     
-    def _generate_goal_refocusing(self, context_data: Dict[str, Any]) -> str:
+    def _generate_goal_refocusing(self, context: LearningContext) -> str:
         """Generate goal refocusing guidance"""
-        concepts_struggling = context_data.get('concepts_struggling', '')
+        concepts_struggling = ", ".join(context.concepts_struggling)
         
         if concepts_struggling and concepts_struggling != "None identified":
             return f"Refocus on mastering: {concepts_struggling}. Break into smaller, achievable goals."
         else:
             return "Maintain focus on current learning objectives with clear progress markers."
     
-    def _generate_next_steps(self, context_data: Dict[str, Any]) -> str:
+    def _generate_next_steps(self, context: LearningContext) -> str:
         """Generate next steps guidance"""
-        performance = context_data.get('current_performance', '')
-        concepts_mastered = context_data.get('concepts_mastered', '')
+        concepts_mastered = ", ".join(context.concepts_mastered)
         
-        if 'excellent' in performance or 'good' in performance:
+        if context.current_performance > 0.6:
             return "Ready for next level concepts or practical applications."
         elif concepts_mastered and concepts_mastered != "None yet":
             return "Build on mastered concepts while reinforcing current learning."
@@ -588,20 +875,12 @@ class AdaptivePromptGenerator:
     
     def _clean_prompt(self, prompt: str) -> str:
         """Clean up the prompt by removing empty sections and formatting"""
-        # Remove empty guidance sections
-        lines = prompt.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # Skip lines that are just guidance headers with no content
-            if line.strip() and not (line.strip().endswith(':') and len(line.strip()) < 50):
-                cleaned_lines.append(line)
-        
-        # Remove excessive whitespace
-        cleaned_prompt = '\n'.join(cleaned_lines)
-        cleaned_prompt = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned_prompt)
-        
-        return cleaned_prompt.strip()
+        # Drop blank lines and guidance headers with no content, then collapse whitespace
+        cleaned_prompt = '\n'.join(
+            line for line in prompt.split('\n')
+            if line.strip() and not _EMPTY_HEADER_RE.fullmatch(line)
+        )
+        return _MULTINEWLINE_RE.sub('\n\n', cleaned_prompt).strip()
 
 
 class ContextualPromptEngine:
@@ -622,14 +901,10 @@ class ContextualPromptEngine:
             user_id, session_id, user_message, response_time, additional_data
         )
         
-        # Get conversation history
-        from .memory_service import memory_service
-        conversation_history = memory_service.get_conversation_history(user_id, session_id)
-        history_messages = conversation_history.get('messages', [])
-        
-        # Generate contextual prompt
+        # Generate contextual prompt; no template renders conversation history,
+        # so it is not fetched from the memory service
         personalized_prompt = self.prompt_generator.generate_contextual_prompt(
-            intent, learning_context, user_message, history_messages
+            intent, learning_context, user_message
         )
         
         return personalized_prompt
@@ -638,10 +913,32 @@ class ContextualPromptEngine:
         """Update template effectiveness based on user feedback"""
         template = self.prompt_generator.prompt_templates.get(template_name)
         if template:
-            # Update effectiveness using weighted average
-            current_score = template.effectiveness_score
-            usage_count = template.usage_count
-            
-            # Weighted average with more recent feedback having higher weight
-            new_score = (current_score * (usage_count - 1) + effectiveness_score) / usage_count
-            template.effectiveness_score = new_score
\ No newline at end of file
+            # Exponential moving average, so recent feedback keeps a fixed weight
+            template.effectiveness_score = (
+                (1.0 - EFFECTIVENESS_EMA_ALPHA) * template.effectiveness_score
+                + EFFECTIVENESS_EMA_ALPHA * effectiveness_score
+            )
+    
+    def update_template_effectiveness_batch(self, template_names: Sequence[str],
+                                            effectiveness_scores: Sequence[float]):
+        """Apply many feedback scores at once, e.g. when importing feedback in bulk"""
+        if len(template_names) != len(effectiveness_scores):
+            raise ValueError("template_names and effectiveness_scores must have the same length")
+        
+        # Small batches (and hosts without numba) are cheaper through the scalar update
+        if not NUMBA_AVAILABLE or len(template_names) < 2:
+            for template_name, effectiveness_score in zip(template_names, effectiveness_scores):
+                self.update_template_effectiveness(template_name, effectiveness_score)
+            return
+        
+        catalog = self.prompt_generator.template_catalog
+        slot_of = catalog.name_to_idx
+        known = [(slot_of[name], score) for name, score in zip(template_names, effectiveness_scores)
+                 if name in slot_of]
+        if not known:
+            return
+        
+        # The kernel updates the catalog's arrays in place
+        slots = np.array([slot for slot, _ in known], dtype=np.int64)
+        scores = np.array([score for _, score in known], dtype=np.float64)
+        _apply_effectiveness_feedback(catalog.effectiveness, slots, scores, EFFECTIVENESS_EMA_ALPHA)
\ No newline at end of file
@@ -1,9 +1,17 @@
 """
 Conversation Manager - Specialized service for handling chat interactions
 """
+import copy
 import json
+import logging
+import re
 import asyncio
-from typing import List, Dict, Any, Optional
+import concurrent.futures
+import hashlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Union
 from functools import wraps
 
 try:
@@ -12,14 +20,268 @@ try:
 except ImportError:
     LANGCHAIN_AVAILABLE = False
 
-from ..core.base_service import LLMBaseService
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import numpy as np
+    # Only probe here: importing sentence_transformers pulls in torch, so embed() imports it on first use
+    SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+from ..core.base_service import LLMBaseService, json_loads
+from ..core.client import llm_factory
 from ..core.prompts import CHAT_AGENT_PROMPT
 from .memory_service import memory_service
 
+logger = logging.getLogger(__name__)
+
+# Memory writes (including the summary memory's LLM call) run on a small pool. Each session's
+# writes are chained on the previous one's future, so they stay in order without serializing
+# every session behind one worker
+MEMORY_WRITE_WORKERS = 4
+_memory_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MEMORY_WRITE_WORKERS, thread_name_prefix="chat-memory"
+)
+_memory_lock = threading.Lock()
+# session_id -> future of the newest queued write for that session
+_memory_tails: Dict[str, concurrent.futures.Future] = {}
+
+
+def _record_turn(session_id: str, message: str, reply: str):
+    """Persist one chat turn; runs on the memory executor"""
+    try:
+        memory_service.update_conversation(session_id, message, reply)
+    except Exception:
+        logger.exception("Failed to record chat turn for session %s", session_id)
+
+
+def _run_memory_write(session_id: str, future: concurrent.futures.Future, func, args: tuple):
+    try:
+        func(*args)
+    finally:
+        with _memory_lock:
+            if _memory_tails.get(session_id) is future:
+                del _memory_tails[session_id]
+        future.set_result(None)
+
+
+def _submit_memory_write(session_id: str, func, *args) -> concurrent.futures.Future:
+    """Queue a memory write that starts once the session's previous write has finished"""
+    future = concurrent.futures.Future()
+    
+    def start(_previous=None):
+        _memory_executor.submit(_run_memory_write, session_id, future, func, args)
+    
+    with _memory_lock:
+        previous = _memory_tails.get(session_id)
+        _memory_tails[session_id] = future
+    if previous is None:
+        start()
+    else:
+        previous.add_done_callback(start)
+    return future
+
+
+def _pending_memory_write(session_id: str) -> Optional[concurrent.futures.Future]:
+    """Future of the session's newest queued write, or None when its writes have all landed"""
+    with _memory_lock:
+        return _memory_tails.get(session_id)
+
+
+async def _conversation_context_async(session_id: str) -> str:
+    """The session's conversation context, read after its queued writes have landed"""
+    pending = _pending_memory_write(session_id)
+    if pending is not None:
+        await asyncio.wrap_future(pending)
+    return await memory_service.get_conversation_context_async(session_id)
+
+
+# json.dumps builds a new JSONEncoder on every call with non-default options
+_PLAN_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+def _dumps_plan(current_plan: Dict[str, Any]) -> str:
+    """Serialize the current plan for the chat prompt, keeping non-ASCII text as-is"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(current_plan, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return _PLAN_ENCODER.encode(current_plan)
+
+
+PLAN_JSON_CACHE_SIZE = 256
+
+# session_id -> (decoded snapshot, serialized plan) of the last plan sent for that session
+_plan_json_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_plan_json_lock = threading.Lock()
+
+
+def _serialize_plan(current_plan: Dict[str, Any], session_id: Optional[str]) -> str:
+    """Return the serialized plan, reusing the session's last encoding while the plan is unchanged"""
+    if not session_id:
+        return _dumps_plan(current_plan)
+    
+    with _plan_json_lock:
+        cached = _plan_json_cache.get(session_id)
+        if cached is not None:
+            _plan_json_cache.move_to_end(session_id)
+    # Comparing against the decoded snapshot is a C-level walk that builds no new string;
+    # numerically equal scalars (1, 1.0, True) share an encoding, which is fine for prompt text
+    if cached is not None and cached[0] == current_plan:
+        return cached[1]
+    
+    plan_json = _dumps_plan(current_plan)
+    snapshot = json_loads(plan_json)
+    with _plan_json_lock:
+        _plan_json_cache[session_id] = (snapshot, plan_json)
+        _plan_json_cache.move_to_end(session_id)
+        if len(_plan_json_cache) > PLAN_JSON_CACHE_SIZE:
+            _plan_json_cache.popitem(last=False)
+    return plan_json
+
+
+SENTENCE_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+
+class SentenceEmbedder:
+    """Shared sentence-transformers model for the engines' embedding-based retrieval and caches"""
+    
+    def __init__(self):
+        self.enabled = SENTENCE_TRANSFORMERS_AVAILABLE
+        self._model = None
+        self._lock = threading.Lock()
+    
+    def embed(self, text: str) -> Optional['np.ndarray']:
+        """Encode text as a unit vector; disables embedding if the model cannot load"""
+        if not self.enabled:
+            return None
+        try:
+            if self._model is None:
+                with self._lock:
+                    if self._model is None:
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(SENTENCE_EMBEDDING_MODEL)
+            return self._model.encode(text, normalize_embeddings=True)
+        except Exception as e:
+            logger.warning("Disabling sentence embeddings: %s", e)
+            self.enabled = False
+            return None
+
+
+sentence_embedder = SentenceEmbedder()
+
+
+_REPLY_FIELD_RE = re.compile(r'"reply"\s*:\s*"')
+
+
+class _ReplyStream:
+    """Incrementally extract the "reply" string value from a streamed JSON object"""
+    
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.finished = False
+    
+    def feed(self, text: str) -> str:
+        """Add streamed text and return any newly decoded reply characters"""
+        self.buffer += text
+        if self.finished:
+            return ""
+        if not self.started:
+            match = _REPLY_FIELD_RE.search(self.buffer)
+            if match is None:
+                return ""
+            self.started = True
+            self.pos = match.end()
+        
+        buffer = self.buffer
+        out = []
+        pos = self.pos
+        while pos < len(buffer):
+            quote = buffer.find('"', pos)
+            backslash = buffer.find('\\', pos)
+            if backslash != -1 and (quote == -1 or backslash < quote):
+                out.append(buffer[pos:backslash])
+                escape_end = self._escape_end(buffer, backslash)
+                if escape_end is None:
+                    # Incomplete escape; wait for more text
+                    pos = backslash
+                    break
+                out.append(json.loads('"' + buffer[backslash:escape_end] + '"'))
+                pos = escape_end
+            elif quote != -1:
+                out.append(buffer[pos:quote])
+                pos = quote + 1
+                self.finished = True
+                break
+            else:
+                out.append(buffer[pos:])
+                pos = len(buffer)
+        self.pos = pos
+        return "".join(out)
+    
+    @staticmethod
+    def _escape_end(buffer: str, start: int) -> Optional[int]:
+        """End index of the escape sequence at start, or None if it is still incomplete"""
+        if start + 1 >= len(buffer):
+            return None
+        if buffer[start + 1] != 'u':
+            return start + 2
+        end = start + 6
+        if end > len(buffer):
+            return None
+        # A high surrogate must be decoded together with the low surrogate that follows
+        if 0xD800 <= int(buffer[start + 2:end], 16) <= 0xDBFF:
+            if end + 6 > len(buffer):
+                return None
+            if buffer[end:end + 2] == '\\u':
+                return end + 6
+        return end
+
+
+def _enhance_message(context: str, message: str) -> str:
+    """Prefix the user message with the conversation context, if any"""
+    if not context:
+        return message
+    # An f-string compiles to one BUILD_STRING, so the result is allocated once
+    return f"Conversation context: {context}\n\nCurrent message: {message}"
+
+
+def _replace_targets(md_text: str, md_update: Union[Dict[str, Any], List[Dict[str, Any]]]) -> str:
+    """Replace every target paragraph in a single pass over the markdown text"""
+    updates = [md_update] if isinstance(md_update, dict) else md_update
+    replacements = {}
+    for update in updates:
+        target = update.get('target', '')
+        # An empty target would match between every character
+        if target:
+            replacements[target] = update.get('new_content', '')
+    
+    if not replacements:
+        return md_text
+    if len(replacements) == 1:
+        target, new_content = next(iter(replacements.items()))
+        return md_text.replace(target, new_content)
+    
+    # Longest targets first so an overlapping shorter target cannot pre-empt them
+    pattern = re.compile("|".join(
+        re.escape(target) for target in sorted(replacements, key=len, reverse=True)
+    ))
+    return pattern.sub(lambda match: replacements[match.group()], md_text)
+
 
 def get_chat_cache_key(*args, **kwargs):
     """Generate chat cache key"""
-    import hashlib
     # Skip self parameter if present
     message = kwargs.get('message')
     session_id = kwargs.get('session_id', 'default')
@@ -34,13 +296,43 @@ def get_chat_cache_key(*args, **kwargs):
             session_id = args[2] if len(args) > 2 else 'default'
     
     message = str(message) if message else 'unknown'
-    key_data = f"{message}:{session_id}"
-    return f"chat_cache:{hashlib.md5(key_data.encode()).hexdigest()}"
+    key_data = f"{message}:{session_id}".encode()
+    # Keys only need to be unique, so prefer the non-cryptographic xxh3 when available
+    if XXHASH_AVAILABLE:
+        return f"chat_cache:{xxhash.xxh3_128_hexdigest(key_data)}"
+    return f"chat_cache:{hashlib.md5(key_data).hexdigest()}"
+
+
+class _InflightTurn:
+    """An async chat turn that identical concurrent requests can join"""
+    
+    __slots__ = ('task', 'followers', 'snapshot')
+    
+    def __init__(self, task: 'asyncio.Task'):
+        self.task = task
+        self.followers = 0
+        self.snapshot = None
 
 
 class ConversationManager(LLMBaseService):
     """Specialized service for handling chat interactions and conversations"""
     
+    _chat_chain = None
+    
+    def __init__(self):
+        super().__init__()
+        self._inflight_turns: Dict[tuple, '_InflightTurn'] = {}
+    
+    def _get_chat_chain(self) -> 'LLMChain':
+        """Build the chat chain once and rebuild it only if the LLM is swapped"""
+        chain = self._chat_chain
+        if chain is None or chain.llm is not self.langchain_llm:
+            chain = self._chat_chain = LLMChain(
+                llm=self.langchain_llm,
+                prompt=CHAT_AGENT_PROMPT
+            )
+        return chain
+    
     def chat_with_agent(
         self, 
         message: str, 
@@ -63,69 +355,52 @@ class ConversationManager(LLMBaseService):
         # Get conversation context (if session_id exists)
         context = ""
         if session_id and memory_service:
+            # Read this session's own earlier turns, not a snapshot taken while they are still queued
+            pending = _pending_memory_write(session_id)
+            if pending is not None:
+                pending.result()
             context = memory_service.get_conversation_context(session_id)
         
         # Create enhanced prompt (with historical context)
-        if context:
-            enhanced_message = f"Conversation context: {context}\n\nCurrent message: {message}"
-        else:
-            enhanced_message = message
+        enhanced_message = _enhance_message(context, message)
+        
+        plan_json = _serialize_plan(current_plan, session_id)
         
         if not self.langchain_llm or not LANGCHAIN_AVAILABLE:
             # Use simple OpenAI client
             prompt = CHAT_AGENT_PROMPT.format(
-                current_plan=json.dumps(current_plan, ensure_ascii=False),
+                current_plan=plan_json,
                 message=enhanced_message
             )
             response = self.simple_chat(prompt)
-            try:
-                cleaned_response = self._clean_json_content(response)
-                result = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                result = {"reply": response, "updates": []}
+            result = self._parse_reply(response)
         else:
             # Use LangChain
-            chain = LLMChain(
-                llm=self.langchain_llm,
-                prompt=CHAT_AGENT_PROMPT
-            )
+            chain = self._get_chat_chain()
             result = self._execute_chain_with_fallback(
                 chain,
-                current_plan=json.dumps(current_plan, ensure_ascii=False),
+                current_plan=plan_json,
                 message=enhanced_message
             )
         
         # Handle markdown file updates
-        md_updated = False
-        md_error = None
-        
-        # Check if markdown file needs updating
         md_update = result.get('md_update')
         if md_update and feedback_path:
-            try:
-                with open(feedback_path, 'r', encoding='utf-8') as f:
-                    md_text = f.read()
-                
-                # Replace target paragraph
-                target = md_update.get('target', '')
-                new_content = md_update.get('new_content', '')
-                updated_text = md_text.replace(target, new_content)
-                
-                with open(feedback_path, 'w', encoding='utf-8') as f:
-                    f.write(updated_text)
-                
-                md_updated = True
-            except Exception as e:
-                md_error = str(e)
+            md_updated, md_error = self._apply_md_update(feedback_path, md_update)
+        else:
+            md_updated, md_error = False, None
         
         # Add markdown update status
         result['md_updated'] = md_updated
         if md_error:
             result['md_error'] = md_error
         
-        # Update conversation memory and plan state
+        # Update conversation memory in the background; plan state is saved before returning,
+        # since callers read it back through get_plan_from_session right after the turn
         if session_id and memory_service:
-            memory_service.update_conversation(
+            _submit_memory_write(
+                session_id,
+                _record_turn,
                 session_id,
                 message,
                 result.get('reply', 'No reply provided')
@@ -156,44 +431,172 @@ class ConversationManager(LLMBaseService):
         Returns:
             Response containing reply and plan updates
         """
-        # Asynchronously get conversation context
-        context = ""
-        if session_id and memory_service:
-            context = await memory_service.get_conversation_context_async(session_id)
+        if not session_id:
+            return await self._chat_turn_async(message, current_plan, session_id, feedback_path)
         
-        # Create enhanced prompt (with historical context)
-        if context:
-            enhanced_message = f"Conversation context: {context}\n\nCurrent message: {message}"
-        else:
-            enhanced_message = message
+        # Encoded once here and reused for the in-flight key, the prompt and any fallback retry
+        plan_json = _serialize_plan(current_plan, session_id)
+        
+        # An identical turn already in flight (e.g. a double submit) shares one LLM call
+        loop = asyncio.get_running_loop()
+        key = (loop, session_id, message, plan_json, feedback_path)
+        inflight = self._inflight_turns.get(key)
+        if inflight is not None:
+            inflight.followers += 1
+            result = await asyncio.shield(inflight.task)
+            return copy.deepcopy(inflight.snapshot if inflight.snapshot is not None else result)
+        
+        inflight = self._inflight_turns[key] = _InflightTurn(
+            loop.create_task(self._chat_turn_async(message, current_plan, session_id, feedback_path, plan_json))
+        )
+        # Registered before anyone awaits the task, so the snapshot exists before callers resume
+        inflight.task.add_done_callback(lambda task: self._settle_inflight(key, inflight))
+        return await asyncio.shield(inflight.task)
+    
+    def _settle_inflight(self, key: tuple, inflight: '_InflightTurn'):
+        """Retire a finished turn, snapshotting its result for any callers that joined it"""
+        self._inflight_turns.pop(key, None)
+        task = inflight.task
+        if not task.cancelled() and task.exception() is None and inflight.followers:
+            inflight.snapshot = copy.deepcopy(task.result())
+    
+    async def _chat_turn_async(
+        self,
+        message: str,
+        current_plan: Dict[str, Any],
+        session_id: Optional[str],
+        feedback_path: Optional[str],
+        plan_json: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Run one chat turn end to end"""
+        plan_json, enhanced_message = await self._prepare_turn_async(
+            message, current_plan, session_id, plan_json
+        )
         
         if not self.langchain_llm or not LANGCHAIN_AVAILABLE:
             # Use async simple OpenAI client
             prompt = CHAT_AGENT_PROMPT.format(
-                current_plan=json.dumps(current_plan, ensure_ascii=False),
+                current_plan=plan_json,
                 message=enhanced_message
             )
             response = await self.simple_chat_async(prompt)
-            try:
-                cleaned_response = self._clean_json_content(response)
-                result = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                result = {"reply": response, "updates": []}
+            result = self._parse_reply(response)
         else:
             # Use async LangChain
-            chain = LLMChain(
-                llm=self.langchain_llm,
-                prompt=CHAT_AGENT_PROMPT
-            )
+            chain = self._get_chat_chain()
             result = await self._execute_chain_with_fallback_async(
                 chain,
-                current_plan=json.dumps(current_plan, ensure_ascii=False),
+                current_plan=plan_json,
                 message=enhanced_message
             )
         
-        # Async update memory
+        return await self._finish_turn_async(result, message, session_id, feedback_path)
+    
+    async def chat_with_agent_stream(
+        self,
+        message: str,
+        current_plan: Dict[str, Any],
+        session_id: str = None,
+        feedback_path: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Chat with the educational planning agent, streaming the reply as it is generated
+        
+        Yields {"type": "delta", "content": str} events carrying reply text, then a
+        final {"type": "result", "result": dict} event with the same payload that
+        chat_with_agent_async returns. Falls back to the buffered path when the
+        streaming client is unavailable.
+        """
+        if not llm_factory.is_available():
+            result = await self.chat_with_agent_async(message, current_plan, session_id, feedback_path)
+            yield {"type": "delta", "content": result.get("reply", "")}
+            yield {"type": "result", "result": result}
+            return
+        
+        plan_json, enhanced_message = await self._prepare_turn_async(message, current_plan, session_id)
+        
+        self._ensure_initialized()
+        prompt = CHAT_AGENT_PROMPT.format(
+            current_plan=plan_json,
+            message=enhanced_message
+        )
+        stream = await llm_factory.get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        )
+        
+        # Reply text goes out as it arrives; updates/md_update are parsed from the full body
+        reply_stream = _ReplyStream()
+        chunks = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            chunks.append(text)
+            delta = reply_stream.feed(text)
+            if delta:
+                yield {"type": "delta", "content": delta}
+        
+        result = self._parse_reply("".join(chunks))
+        if not reply_stream.started:
+            # Not the expected JSON shape; send the whole reply at once
+            yield {"type": "delta", "content": result.get("reply", "")}
+        
+        result = await self._finish_turn_async(result, message, session_id, feedback_path)
+        yield {"type": "result", "result": result}
+    
+    async def _prepare_turn_async(
+        self,
+        message: str,
+        current_plan: Dict[str, Any],
+        session_id: Optional[str],
+        plan_json: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """Gather everything the LLM call needs: (plan_json, enhanced_message)"""
+        # Start the context fetch in an executor thread, then serialize the plan on the loop while it runs
+        context_task = None
+        if session_id and memory_service:
+            context_task = asyncio.ensure_future(_conversation_context_async(session_id))
+        
+        if plan_json is None:
+            plan_json = _serialize_plan(current_plan, session_id)
+        
+        context = await context_task if context_task is not None else ""
+        
+        # Create enhanced prompt (with historical context)
+        return plan_json, _enhance_message(context, message)
+    
+    async def _finish_turn_async(
+        self,
+        result: Dict[str, Any],
+        message: str,
+        session_id: Optional[str],
+        feedback_path: Optional[str]
+    ) -> Dict[str, Any]:
+        """Apply markdown updates and record memory for a finished turn"""
+        # Handle markdown file updates off the event loop
+        md_update = result.get('md_update')
+        if md_update and feedback_path:
+            loop = asyncio.get_running_loop()
+            md_updated, md_error = await loop.run_in_executor(
+                None, self._apply_md_update, feedback_path, md_update
+            )
+        else:
+            md_updated, md_error = False, None
+        
+        # Add markdown update status
+        result['md_updated'] = md_updated
+        if md_error:
+            result['md_error'] = md_error
+        
+        # Update memory in the background; the reply does not wait for the write
         if session_id and memory_service:
-            await memory_service.update_conversation_async(
+            _submit_memory_write(
+                session_id,
+                _record_turn,
                 session_id,
                 message,
                 result.get("reply", "No response")
@@ -201,6 +604,37 @@ class ConversationManager(LLMBaseService):
         
         return result
     
+    def _parse_reply(self, response: str) -> Dict[str, Any]:
+        """Parse the agent's JSON reply, treating non-JSON output as plain reply text"""
+        try:
+            return json_loads(self._clean_json_content(response))
+        except json.JSONDecodeError:
+            return {"reply": response, "updates": []}
+    
+    async def drain(self):
+        """Wait for memory writes queued so far, e.g. before shutdown"""
+        with _memory_lock:
+            pending = list(_memory_tails.values())
+        # Each session's tail finishes after all of that session's earlier writes
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in pending))
+    
+    def _apply_md_update(self, feedback_path: str,
+                         md_update: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Tuple[bool, Optional[str]]:
+        """Apply one or more {target, new_content} edits to the feedback file, returning (updated, error)"""
+        try:
+            with open(feedback_path, 'r', encoding='utf-8') as f:
+                md_text = f.read()
+            
+            # Replace target paragraphs
+            updated_text = _replace_targets(md_text, md_update)
+            
+            with open(feedback_path, 'w', encoding='utf-8') as f:
+                f.write(updated_text)
+            
+            return True, None
+        except Exception as e:
+            return False, str(e)
+    
     def get_plan_from_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get current plan from session"""
         if memory_service:
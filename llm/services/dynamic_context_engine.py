@@ -4,12 +4,35 @@ Integrates all context analysis components for personalized learning
 """
 import json
 import time
+import logging
+import base64
 import asyncio
+from collections import Counter
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+import numpy as np
 from django.core.cache import cache
 from django.utils import timezone
 from django.conf import settings
+from asgiref.sync import sync_to_async
+
+try:
+    from django_redis import get_redis_connection
+    DJANGO_REDIS_AVAILABLE = True
+except ImportError:
+    DJANGO_REDIS_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # Import context components
 from .advanced_context_engine import (
@@ -25,11 +48,149 @@ from .advanced_context_engine import (
 # Import existing services
 from .memory_service import memory_service
 from .student_analyzer import student_analyzer
-from .conversation_manager import ConversationManager
-from ..core.base_service import LLMBaseService
+from .conversation_manager import ConversationManager, sentence_embedder
+from ..core.base_service import LLMBaseService, json_loads
 from apps.authentication.models import User
 from apps.learning_plans.models import StudySession
 
+logger = logging.getLogger(__name__)
+
+
+CONTEXT_HISTORY_LIMIT = 100
+CONTEXT_HISTORY_TTL = 604800  # 7 days
+LATEST_CONTEXT_TTL = 86400  # 24 hours
+CONTEXT_TRENDS_TTL = 60  # trends are memoized briefly and dropped whenever a context is stored
+TREND_RECENT_WINDOW = 5
+EMOTION_STABILITY_WINDOW = 10
+
+# Numeric fields with running sums and category fields with value counts in the trend stats
+_STATS_SUM_FIELDS = ('current_performance', 'engagement_score', 'current_difficulty', 'session_duration')
+_STATS_CATEGORY_FIELDS = ('emotional_state', 'preferred_modality', 'session_time')
+_STATS_RECENT_WINDOWS = (
+    ('current_performance', TREND_RECENT_WINDOW),
+    ('engagement_score', TREND_RECENT_WINDOW),
+    ('current_difficulty', TREND_RECENT_WINDOW),
+    ('emotional_state', EMOTION_STABILITY_WINDOW),
+)
+
+# Scores in [0, 1] are stored to 3 decimals: enough resolution for trends and prompts,
+# and ~15 fewer bytes each than a full float repr in every stored row
+_UNIT_INTERVAL_FIELDS = (
+    'current_difficulty', 'current_performance', 'motivation_level', 'confidence_level',
+    'engagement_score', 'mastery_rate', 'retention_score', 'metacognitive_awareness',
+)
+UNIT_INTERVAL_PRECISION = 3
+
+# Per-field Redis lists written next to each history row, so trend reads skip decoding whole contexts
+_TREND_NUMERIC_COLUMNS = ('current_performance', 'engagement_score', 'current_difficulty', 'session_duration')
+_TREND_TEXT_COLUMNS = ('emotional_state', 'preferred_modality', 'session_time')
+_TREND_COLUMNS = ('ts',) + _TREND_NUMERIC_COLUMNS + _TREND_TEXT_COLUMNS
+
+# Older Redis history rows differing from the next newer context in fewer fields are stored as deltas
+CONTEXT_DELTA_MAX_FIELDS = 10
+
+
+def _dumps_payload(payload: Any) -> bytes:
+    """Serialize a context payload for raw Redis storage"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload).encode('utf-8')
+
+
+def _trend_window_means_numpy(performances: np.ndarray, engagement_scores: np.ndarray,
+                              difficulties: np.ndarray, window: int) -> Tuple[float, ...]:
+    """Recent-window and earlier means of each trend series, then the difficulty range"""
+    means = []
+    for values in (performances, engagement_scores, difficulties):
+        recent_avg = float(values[-window:].mean())
+        means.append(recent_avg)
+        means.append(float(values[:-window].mean()) if len(values) > window else recent_avg)
+    return (*means, float(difficulties.min()), float(difficulties.max()))
+
+
+if NUMBA_AVAILABLE:
+    # Eager signature: compiled at import (then loaded from the on-disk cache), no first-call JIT
+    @njit("UniTuple(float64, 8)(float64[:], float64[:], float64[:], int64)", cache=True)
+    def _trend_window_means(performances, engagement_scores, difficulties, window):
+        """Recent-window and earlier means of each trend series, then the difficulty range, in one pass"""
+        n = performances.shape[0]
+        split = max(n - window, 0)
+        recent_perf = recent_eng = recent_diff = 0.0
+        earlier_perf = earlier_eng = earlier_diff = 0.0
+        low = high = difficulties[0]
+        for i in range(n):
+            if i < split:
+                earlier_perf += performances[i]
+                earlier_eng += engagement_scores[i]
+                earlier_diff += difficulties[i]
+            else:
+                recent_perf += performances[i]
+                recent_eng += engagement_scores[i]
+                recent_diff += difficulties[i]
+            low = min(low, difficulties[i])
+            high = max(high, difficulties[i])
+        
+        recent_count = n - split
+        recent_perf /= recent_count
+        recent_eng /= recent_count
+        recent_diff /= recent_count
+        if split > 0:
+            earlier_perf /= split
+            earlier_eng /= split
+            earlier_diff /= split
+        else:
+            earlier_perf, earlier_eng, earlier_diff = recent_perf, recent_eng, recent_diff
+        return (recent_perf, earlier_perf, recent_eng, earlier_eng,
+                recent_diff, earlier_diff, low, high)
+else:
+    _trend_window_means = _trend_window_means_numpy
+
+
+def _entry_ts(entry: Dict[str, Any]) -> float:
+    """Unix timestamp of a history entry; rows stored before 'ts' existed only have the ISO string"""
+    ts = entry.get('ts')
+    return ts if ts is not None else datetime.fromisoformat(entry['timestamp']).timestamp()
+
+
+def _encode_vector(vector: 'np.ndarray') -> str:
+    """Pack an embedding as base64 float32 so it survives the JSON cache serializer"""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def _decode_vector(encoded: str) -> 'np.ndarray':
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+_EMOTIONAL_KEYWORDS = {
+    'confused': ['confused', 'don\'t understand', 'unclear'],
+    'frustrated': ['frustrated', 'difficult', 'hard'],
+    'motivated': ['excited', 'ready', 'motivated']
+}
+
+
+class _QueryMatcher:
+    """Substring tests against one query, memoized across the history entries being scored"""
+    
+    __slots__ = ('query_lower', 'emotions', 'scores', '_hits')
+    
+    def __init__(self, query: str):
+        self.query_lower = query.lower()
+        # Emotional states the query hints at, resolved once instead of per entry
+        self.emotions = frozenset(
+            emotion for emotion, keywords in _EMOTIONAL_KEYWORDS.items()
+            if any(kw in self.query_lower for kw in keywords)
+        )
+        # Consecutive contexts mostly repeat the same topic and concept lists; score each combination once
+        self.scores: Dict[tuple, float] = {}
+        self._hits: Dict[str, bool] = {}
+    
+    def contains(self, term: str) -> bool:
+        """Whether the term occurs in the query, case-insensitively"""
+        hit = self._hits.get(term)
+        if hit is None:
+            hit = self._hits[term] = term.lower() in self.query_lower
+        return hit
+
 
 class PersistentContextManager:
     """Manages long-term context storage and retrieval with semantic indexing"""
@@ -38,7 +199,403 @@ class PersistentContextManager:
         self.context_cache_prefix = "learning_context:"
         self.context_history_prefix = "context_history:"
         self.semantic_index_prefix = "context_semantic:"
-        
+        self.context_stats_prefix = "context_trend_stats:"
+        self.context_trends_prefix = "context_trends:"
+        self._redis = None
+        self._redis_checked = False
+    
+    def _get_redis(self):
+        """Raw Redis client when the default cache is django-redis, otherwise None"""
+        if not self._redis_checked:
+            self._redis_checked = True
+            backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+            if DJANGO_REDIS_AVAILABLE and backend.startswith('django_redis'):
+                self._redis = get_redis_connection("default")
+        return self._redis
+    
+    def _append_history(self, history_key: str, latest_key: str, stats_key: str, entry: Dict[str, Any]):
+        """Store the entry's context as the latest one, append the entry to the bounded history
+        and roll the trend stats forward with it"""
+        redis = self._get_redis()
+        if redis is None:
+            cache.set(latest_key, entry['context'], timeout=LATEST_CONTEXT_TTL)
+            history = cache.get(history_key, [])
+            history.append(entry)
+            evicted = []
+            
+            # Keep only last 100 interactions
+            if len(history) > CONTEXT_HISTORY_LIMIT:
+                evicted = history[:-CONTEXT_HISTORY_LIMIT]
+                history = history[-CONTEXT_HISTORY_LIMIT:]
+            
+            cache.set(history_key, history, timeout=CONTEXT_HISTORY_TTL)
+            self._update_trend_stats(stats_key, entry, evicted, _entry_ts(history[0]), len(history))
+            return
+        
+        # Newest first in a native list: O(1) push, trimmed server-side, one transaction.
+        # The head row is always a full entry; when the new context shares most fields with it,
+        # the old head is rewritten as a delta, so trimming the old end never drops a base row.
+        # The tail read before the push holds the new oldest entry, then the ones the push evicts
+        raw_key = self._history_rows_key(history_key)
+        raw_stats_key = cache.make_key(stats_key)
+        context = entry['context']
+        column_keys = [cache.make_key(f"{history_key}:{column}") for column in _TREND_COLUMNS]
+        
+        def queue(pipe):
+            head = pipe.lindex(raw_key, 0)
+            tail = pipe.lrange(raw_key, CONTEXT_HISTORY_LIMIT - 2, -1)
+            evicted = []
+            oldest_ts = None
+            if len(tail) >= 2:
+                column_tails = {column: pipe.lrange(column_key, CONTEXT_HISTORY_LIMIT - 2, -1)
+                                for column, column_key in zip(_TREND_COLUMNS, column_keys)}
+                for position in range(len(tail) - 1, 0, -1):
+                    old_entry = json_loads(tail[position])
+                    if 'delta' in old_entry:
+                        # Delta rows postdate the trend columns, which hold every field the stats evict
+                        old_entry['context'] = self._column_context(column_tails, position)
+                    evicted.append(old_entry)
+                oldest_ts = _entry_ts(json_loads(tail[0]))
+            stats_update = self._trend_stats_update(pipe, raw_stats_key, entry, evicted, oldest_ts)
+            
+            pipe.multi()
+            if head is not None:
+                delta_row = self._delta_row(json_loads(head), context)
+                if delta_row is not None:
+                    pipe.lset(raw_key, 0, _dumps_payload(delta_row))
+            pipe.set(cache.make_key(latest_key), _dumps_payload(context), ex=LATEST_CONTEXT_TTL)
+            pipe.lpush(raw_key, _dumps_payload(entry))
+            pipe.ltrim(raw_key, 0, CONTEXT_HISTORY_LIMIT - 1)
+            pipe.expire(raw_key, CONTEXT_HISTORY_TTL)
+            for column_key, (_, value) in zip(column_keys, self._column_values(entry['ts'], context)):
+                pipe.lpush(column_key, value)
+                pipe.ltrim(column_key, 0, CONTEXT_HISTORY_LIMIT - 1)
+                pipe.expire(column_key, CONTEXT_HISTORY_TTL)
+            if stats_update is not None:
+                increments, float_increments, deletes, fields = stats_update
+                for field, amount in increments.items():
+                    pipe.hincrby(raw_stats_key, field, amount)
+                for field, amount in float_increments.items():
+                    pipe.hincrbyfloat(raw_stats_key, field, amount)
+                if deletes:
+                    pipe.hdel(raw_stats_key, *deletes)
+                pipe.hset(raw_stats_key, mapping=fields)
+                pipe.expire(raw_stats_key, CONTEXT_HISTORY_TTL)
+        
+        # WATCH the history and the stats: a concurrent store retries instead of interleaving
+        # with the head rewrite or losing a stats update
+        redis.transaction(queue, raw_key, raw_stats_key)
+    
+    def _history_rows_key(self, history_key: str) -> str:
+        """Raw Redis key of the native history list. Releases before it cached the whole history
+        as one pickled value under the plain key, which list commands reject with WRONGTYPE
+        until it expires, so the list lives next to it"""
+        return cache.make_key(f"{history_key}:rows")
+    
+    def _trend_stats_update(self, pipe, raw_stats_key: str, entry: Dict[str, Any],
+                            evicted: List[Dict[str, Any]], oldest_ts: Optional[float]):
+        """Hash updates for one append as (increments, float increments, deleted fields, set fields),
+        or None when there is no stats hash; reads go through the pipe before MULTI"""
+        counted = Counter()
+        float_increments = Counter()
+        for sign, item in [(1, entry)] + [(-1, old_entry) for old_entry in evicted]:
+            item_context = item['context']
+            counted[f"difficulty:{float(item_context['current_difficulty'])!r}"] += sign
+            for field in _STATS_CATEGORY_FIELDS:
+                counted[f"{field}:{item_context[field]}"] += sign
+            for field in _STATS_SUM_FIELDS:
+                float_increments[f"sum:{field}"] += sign * item_context[field]
+            float_increments['session_duration_sq'] += sign * item_context['session_duration'] ** 2
+        
+        # Values that drop to zero are deleted so the hash only holds values still in the history
+        lowered = [field for field, amount in counted.items() if amount < 0]
+        count, newest, *current = pipe.hmget(raw_stats_key, ['count', 'newest'] + lowered)
+        if count is None:
+            return None
+        
+        deletes = [field for field, value in zip(lowered, current) if int(value or 0) + counted[field] <= 0]
+        increments = {field: amount for field, amount in counted.items() if amount and field not in deletes}
+        increments['count'] = 1 - len(evicted)
+        fields = {'newest': repr(entry['ts'])}
+        if newest is not None and entry['ts'] < float(newest):
+            # The date-window shortcut assumes history is in timestamp order
+            fields['ordered'] = 0
+        if evicted:
+            fields['oldest'] = repr(oldest_ts)
+        return increments, float_increments, deletes, fields
+    
+    def _delta_row(self, previous: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The previous head row reduced to the context fields that differ from the new context,
+        or None when it should stay a full row"""
+        previous_context = previous.get('context')
+        if previous_context is None or previous_context.keys() != context.keys():
+            return None
+        
+        delta = {field: value for field, value in previous_context.items() if context[field] != value}
+        if len(delta) >= CONTEXT_DELTA_MAX_FIELDS:
+            return None
+        row = {key: value for key, value in previous.items() if key != 'context'}
+        row['delta'] = delta
+        return row
+    
+    def _column_context(self, column_tails: Dict[str, List[bytes]], position: int) -> Dict[str, Any]:
+        """The trend fields of one history row, read back from the column lists"""
+        context = {column: float(column_tails[column][position]) for column in _TREND_NUMERIC_COLUMNS}
+        for column in _TREND_TEXT_COLUMNS:
+            context[column] = column_tails[column][position].decode('utf-8')
+        return context
+    
+    def _load_history(self, history_key: str, limit: int = CONTEXT_HISTORY_LIMIT) -> List[Dict[str, Any]]:
+        """Load up to the newest `limit` history entries, oldest first"""
+        redis = self._get_redis()
+        if redis is None:
+            return cache.get(history_key, [])[-limit:]
+        
+        # Replay newest to oldest: the head is a full row, delta rows override the next newer context
+        history = []
+        context = None
+        for raw in redis.lrange(self._history_rows_key(history_key), 0, limit - 1):
+            entry = json_loads(raw)
+            delta = entry.pop('delta', None)
+            if delta is None:
+                context = entry['context']
+            else:
+                context = {**context, **delta}
+                entry['context'] = context
+            history.append(entry)
+        history.reverse()
+        return history
+    
+    def _column_values(self, ts: float, context: Dict[str, Any]):
+        """(column, Redis value) pairs for the trend columns of one history entry"""
+        yield 'ts', repr(ts)
+        for column in _TREND_NUMERIC_COLUMNS:
+            yield column, repr(float(context[column]))
+        for column in _TREND_TEXT_COLUMNS:
+            yield column, context[column]
+    
+    def _load_trend_columns(self, history_key: str) -> Dict[str, Any]:
+        """The history fields trends need, oldest first: numeric ones as arrays, the rest as lists"""
+        redis = self._get_redis()
+        if redis is not None:
+            pipe = redis.pipeline()
+            pipe.llen(self._history_rows_key(history_key))
+            for column in _TREND_COLUMNS:
+                pipe.lrange(cache.make_key(f"{history_key}:{column}"), 0, CONTEXT_HISTORY_LIMIT - 1)
+            length, *raw_columns = pipe.execute()
+            
+            # Rows stored before the columns existed leave them short; read full rows until they catch up
+            if all(len(values) == length for values in raw_columns):
+                loaded = {}
+                for column, values in zip(_TREND_COLUMNS, raw_columns):
+                    values.reverse()
+                    if column == 'ts' or column in _TREND_NUMERIC_COLUMNS:
+                        loaded[column] = np.array(values, dtype=np.float64)
+                    else:
+                        loaded[column] = [value.decode('utf-8') for value in values]
+                return loaded
+        
+        history = self._load_history(history_key)
+        loaded = {'ts': np.fromiter((_entry_ts(entry) for entry in history), dtype=np.float64, count=len(history))}
+        for column in _TREND_NUMERIC_COLUMNS:
+            loaded[column] = np.fromiter((entry['context'][column] for entry in history),
+                                         dtype=np.float64, count=len(history))
+        for column in _TREND_TEXT_COLUMNS:
+            loaded[column] = [entry['context'][column] for entry in history]
+        return loaded
+    
+    def _build_trend_stats(self, columns: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold the history columns (oldest first) into the running aggregates behind get_context_trends"""
+        stats = {
+            'count': 0,
+            'ordered': True,
+            'oldest': None,  # Unix timestamps
+            'newest': None,
+            'sums': {field: 0.0 for field in _STATS_SUM_FIELDS},
+            'session_duration_sq': 0.0,
+            'recent': {field: [] for field, _ in _STATS_RECENT_WINDOWS},
+            'difficulty_values': {},
+            'counts': {field: {} for field in _STATS_CATEGORY_FIELDS},
+        }
+        numeric = {column: columns[column].tolist() for column in _TREND_NUMERIC_COLUMNS}
+        for i, ts in enumerate(columns['ts'].tolist()):
+            context = {column: values[i] for column, values in numeric.items()}
+            for column in _TREND_TEXT_COLUMNS:
+                context[column] = columns[column][i]
+            self._add_to_trend_stats(stats, {'ts': ts, 'context': context})
+        return stats
+    
+    def _add_to_trend_stats(self, stats: Dict[str, Any], entry: Dict[str, Any]):
+        """Account for a newly appended history entry"""
+        context = entry['context']
+        ts = entry['ts']
+        
+        if stats['oldest'] is None:
+            stats['oldest'] = ts
+        elif ts < stats['newest']:
+            # The date-window shortcut assumes history is in timestamp order
+            stats['ordered'] = False
+        stats['newest'] = ts
+        stats['count'] += 1
+        
+        sums = stats['sums']
+        for field in _STATS_SUM_FIELDS:
+            sums[field] += context[field]
+        stats['session_duration_sq'] += context['session_duration'] ** 2
+        
+        recent = stats['recent']
+        for field, window in _STATS_RECENT_WINDOWS:
+            values = recent[field]
+            values.append(context[field])
+            if len(values) > window:
+                del values[0]
+        
+        difficulty = repr(float(context['current_difficulty']))
+        stats['difficulty_values'][difficulty] = stats['difficulty_values'].get(difficulty, 0) + 1
+        
+        for field in _STATS_CATEGORY_FIELDS:
+            counts = stats['counts'][field]
+            counts[context[field]] = counts.get(context[field], 0) + 1
+    
+    def _evict_from_trend_stats(self, stats: Dict[str, Any], entry: Dict[str, Any]):
+        """Account for the oldest history entry being trimmed"""
+        context = entry['context']
+        stats['count'] -= 1
+        
+        sums = stats['sums']
+        for field in _STATS_SUM_FIELDS:
+            sums[field] -= context[field]
+        stats['session_duration_sq'] -= context['session_duration'] ** 2
+        
+        # Stats out of step with the history have no entry to decrement; the count check catches them
+        difficulty = repr(float(context['current_difficulty']))
+        for counts, value in [(stats['difficulty_values'], difficulty)] + \
+                             [(stats['counts'][field], context[field]) for field in _STATS_CATEGORY_FIELDS]:
+            remaining = counts.get(value, 0) - 1
+            if remaining > 0:
+                counts[value] = remaining
+            else:
+                counts.pop(value, None)
+    
+    def _update_trend_stats(self, stats_key: str, entry: Dict[str, Any], evicted: List[Dict[str, Any]],
+                            oldest_ts: float, history_length: int):
+        """Apply one append to the cached stats; missing stats are rebuilt on the next read"""
+        stats = cache.get(stats_key)
+        if stats is None:
+            return
+        
+        self._add_to_trend_stats(stats, entry)
+        for old_entry in evicted:
+            self._evict_from_trend_stats(stats, old_entry)
+        if evicted:
+            stats['oldest'] = oldest_ts
+        
+        # A concurrent store can interleave with this read-modify-write; drop stats that no longer
+        # match the history rather than keep serving them
+        if stats['count'] != history_length:
+            cache.delete(stats_key)
+            return
+        cache.set(stats_key, stats, timeout=CONTEXT_HISTORY_TTL)
+    
+    def _stats_to_hash(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten the aggregates (without the recent windows) into Redis hash fields"""
+        fields = {
+            'count': stats['count'],
+            'ordered': int(stats['ordered']),
+            'oldest': repr(stats['oldest']),
+            'newest': repr(stats['newest']),
+            'session_duration_sq': repr(stats['session_duration_sq']),
+        }
+        for field, total in stats['sums'].items():
+            fields[f"sum:{field}"] = repr(total)
+        for difficulty, count in stats['difficulty_values'].items():
+            fields[f"difficulty:{difficulty}"] = count
+        for field, counts in stats['counts'].items():
+            for value, count in counts.items():
+                fields[f"{field}:{value}"] = count
+        return fields
+    
+    def _stats_from_hash(self, raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+        """Inverse of _stats_to_hash"""
+        stats = {
+            'sums': {},
+            'difficulty_values': {},
+            'counts': {field: {} for field in _STATS_CATEGORY_FIELDS},
+        }
+        for key, value in raw.items():
+            name, _, item = key.decode('utf-8').partition(':')
+            if not item:
+                if name == 'count':
+                    stats['count'] = int(value)
+                elif name == 'ordered':
+                    stats['ordered'] = int(value) != 0
+                else:
+                    stats[name] = float(value)
+            elif name == 'sum':
+                stats['sums'][item] = float(value)
+            elif name == 'difficulty':
+                stats['difficulty_values'][item] = int(value)
+            else:
+                stats['counts'][name][item] = int(value)
+        return stats
+    
+    def _load_trend_stats(self, history_key: str, stats_key: str) -> Optional[Dict[str, Any]]:
+        """The running aggregates with their recent windows, or None when missing or out of step with the history"""
+        redis = self._get_redis()
+        if redis is None:
+            return cache.get(stats_key)
+        
+        # One round trip: the hash, the lengths it must agree with, and the heads of the recent-window columns
+        pipe = redis.pipeline()
+        pipe.hgetall(cache.make_key(stats_key))
+        pipe.llen(self._history_rows_key(history_key))
+        pipe.llen(cache.make_key(f"{history_key}:ts"))
+        for field, window in _STATS_RECENT_WINDOWS:
+            pipe.lrange(cache.make_key(f"{history_key}:{field}"), 0, window - 1)
+        raw, length, column_length, *windows = pipe.execute()
+        if not raw or int(raw.get(b'count', -1)) != length or column_length != length:
+            return None
+        
+        stats = self._stats_from_hash(raw)
+        stats['recent'] = {}
+        for (field, _), values in zip(_STATS_RECENT_WINDOWS, windows):
+            values.reverse()
+            if field in _TREND_TEXT_COLUMNS:
+                stats['recent'][field] = [value.decode('utf-8') for value in values]
+            else:
+                stats['recent'][field] = [float(value) for value in values]
+        return stats
+    
+    def _rebuild_trend_stats(self, history_key: str, stats_key: str
+                             ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Recompute the stats from the history and store them; returns them (None for an empty
+        history) with the columns they were built from"""
+        redis = self._get_redis()
+        if redis is None:
+            columns = self._load_trend_columns(history_key)
+            if not len(columns['ts']):
+                return None, columns
+            stats = self._build_trend_stats(columns)
+            cache.set(stats_key, stats, timeout=CONTEXT_HISTORY_TTL)
+            return stats, columns
+        
+        raw_stats_key = cache.make_key(stats_key)
+        rebuilt = {}
+        
+        def replace(pipe):
+            # WATCHed: a store landing between the read and the write retries the rebuild
+            columns = self._load_trend_columns(history_key)
+            stats = self._build_trend_stats(columns) if len(columns['ts']) else None
+            rebuilt.update(stats=stats, columns=columns)
+            pipe.multi()
+            pipe.delete(raw_stats_key)
+            if stats is not None:
+                pipe.hset(raw_stats_key, mapping=self._stats_to_hash(stats))
+                pipe.expire(raw_stats_key, CONTEXT_HISTORY_TTL)
+        
+        redis.transaction(replace, self._history_rows_key(history_key), raw_stats_key)
+        return rebuilt['stats'], rebuilt['columns']
+    
     def store_learning_context(self, user_id: str, context: LearningContext) -> bool:
         """Store learning context with semantic indexing"""
         try:
@@ -48,47 +605,52 @@ class PersistentContextManager:
             # Convert context to dictionary for storage
             context_dict = self._context_to_dict(context)
             
-            # Store latest context (24 hour TTL)
-            cache.set(context_key, context_dict, timeout=86400)
-            
-            # Add to history (7 day TTL)
-            history = cache.get(history_key, [])
-            history.append({
+            # Store latest context (24 hour TTL), add to history (7 day TTL)
+            # and roll the trend aggregates forward
+            entry = {
                 'timestamp': context.timestamp.isoformat(),
+                'ts': context.timestamp.timestamp(),
                 'context': context_dict
-            })
-            
-            # Keep only last 100 interactions
-            if len(history) > 100:
-                history = history[-100:]
-            
-            cache.set(history_key, history, timeout=604800)  # 7 days
+            }
+            self._append_history(history_key, context_key, f"{self.context_stats_prefix}{user_id}", entry)
+            cache.delete(f"{self.context_trends_prefix}{user_id}")
             
             # Generate semantic embeddings for future retrieval
             self._index_context_semantically(user_id, context_dict)
             
             return True
             
-        except Exception as e:
-            print(f"Error storing learning context: {e}")
+        except Exception:
+            logger.exception("Error storing learning context")
             return False
     
+    async def store_learning_context_async(self, user_id: str, context: LearningContext) -> bool:
+        """Run store_learning_context in the thread pool: the cache writes and the context embedding
+        (plus the model load on first use) would otherwise block the event loop"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.store_learning_context, user_id, context)
+    
     def retrieve_relevant_context(self, user_id: str, current_query: str, 
-                                limit: int = 10) -> List[Dict[str, Any]]:
-        """Retrieve most relevant historical context"""
+                                limit: int = 10, mmr_lambda: float = 0.7) -> List[Dict[str, Any]]:
+        """Retrieve most relevant historical context, diversified with MMR when embeddings exist"""
         try:
             history_key = f"{self.context_history_prefix}{user_id}"
-            history = cache.get(history_key, [])
+            history = self._load_history(history_key, 50)  # Look at recent history
             
             if not history:
                 return []
             
-            # Simple relevance scoring (can be enhanced with vector similarity)
+            # Dense similarity when embeddings exist, lexical matching as the fallback
+            semantic = self._semantic_similarities(user_id, current_query, history)
+            matcher = _QueryMatcher(current_query)
             relevant_contexts = []
+            relevant_indices = []
             
-            for entry in history[-50:]:  # Look at recent history
+            for i, entry in enumerate(history):
                 context = entry['context']
-                relevance_score = self._calculate_context_relevance(context, current_query)
+                relevance_score = self._calculate_context_relevance(context, matcher)
+                if semantic is not None:
+                    relevance_score = max(relevance_score, float(semantic[0][i]))
                 
                 if relevance_score > 0.3:  # Threshold for relevance
                     relevant_contexts.append({
@@ -96,54 +658,106 @@ class PersistentContextManager:
                         'timestamp': entry['timestamp'],
                         'relevance_score': relevance_score
                     })
+                    relevant_indices.append(i)
             
             # Sort by relevance and recency
-            relevant_contexts.sort(key=lambda x: (x['relevance_score'], x['timestamp']), reverse=True)
+            order = sorted(range(len(relevant_contexts)),
+                           key=lambda j: (relevant_contexts[j]['relevance_score'],
+                                          relevant_contexts[j]['timestamp']),
+                           reverse=True)
+            
+            if semantic is None or len(order) <= limit:
+                return [relevant_contexts[j] for j in order[:limit]]
             
-            return relevant_contexts[:limit]
+            # Near-duplicate contexts waste prompt budget; re-rank the top 3x limit for diversity
+            order = order[:3 * limit]
+            candidates = [relevant_contexts[j] for j in order]
+            vectors = semantic[1][[relevant_indices[j] for j in order]]
+            return self._rerank_mmr(candidates, vectors, limit, mmr_lambda)
             
-        except Exception as e:
-            print(f"Error retrieving relevant context: {e}")
+        except Exception:
+            logger.exception("Error retrieving relevant context")
             return []
     
     def get_context_trends(self, user_id: str, days: int = 7) -> Dict[str, Any]:
-        """Analyze context trends over time"""
+        """Analyze context trends over time, memoized per user until the next stored context"""
         try:
-            history_key = f"{self.context_history_prefix}{user_id}"
-            history = cache.get(history_key, [])
+            # One memo entry per user holds every window asked for, so a single delete invalidates all
+            trends_key = f"{self.context_trends_prefix}{user_id}"
+            memo = cache.get(trends_key) or {}
+            window = str(days)
+            if window in memo:
+                return memo[window]
             
-            if not history:
-                return {}
-            
-            # Filter by date range
-            cutoff_date = datetime.now() - timedelta(days=days)
-            recent_history = [
-                entry for entry in history 
-                if datetime.fromisoformat(entry['timestamp']) > cutoff_date
-            ]
+            memo[window] = self._compute_context_trends(user_id, days)
+            cache.set(trends_key, memo, timeout=CONTEXT_TRENDS_TTL)
+            return memo[window]
             
-            if not recent_history:
+        except Exception:
+            logger.exception("Error calculating context trends")
+            return {}
+    
+    def _compute_context_trends(self, user_id: str, days: int) -> Dict[str, Any]:
+        """Analyze context trends over the last `days` of history"""
+        history_key = f"{self.context_history_prefix}{user_id}"
+        stats_key = f"{self.context_stats_prefix}{user_id}"
+        columns = None
+        
+        # Missing stats (TTL expiry) or stats out of step with the history are rebuilt from it
+        stats = self._load_trend_stats(history_key, stats_key)
+        if stats is None:
+            stats, columns = self._rebuild_trend_stats(history_key, stats_key)
+            if stats is None:
                 return {}
-            
-            # Calculate trends
-            trends = {
-                'performance_trend': self._calculate_performance_trend(recent_history),
-                'emotional_trend': self._calculate_emotional_trend(recent_history),
-                'engagement_trend': self._calculate_engagement_trend(recent_history),
-                'difficulty_progression': self._calculate_difficulty_progression(recent_history),
-                'modality_preferences': self._calculate_modality_trends(recent_history),
-                'study_patterns': self._analyze_study_patterns(recent_history)
-            }
-            
-            return trends
-            
-        except Exception as e:
-            print(f"Error calculating context trends: {e}")
+        
+        # Whole history inside the window: answer from the running aggregates
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        if stats['ordered'] and stats['oldest'] > cutoff:
+            return self._trends_from_stats(stats, history_key, columns)
+        
+        if columns is None:
+            columns = self._load_trend_columns(history_key)
+        
+        # Filter by date range
+        recent = np.flatnonzero(columns['ts'] > cutoff)
+        
+        if not len(recent):
             return {}
+        
+        # Calculate trends; the numeric series are reduced together in one kernel pass
+        if len(recent) < 2:
+            performance_trend, engagement_trend, difficulty_progression = self._numeric_trends(len(recent))
+        else:
+            (perf_recent, perf_earlier, eng_recent, eng_earlier,
+             diff_recent, diff_earlier, diff_low, diff_high) = _trend_window_means(
+                columns['current_performance'][recent], columns['engagement_score'][recent],
+                columns['current_difficulty'][recent], TREND_RECENT_WINDOW
+            )
+            performance_trend, engagement_trend, difficulty_progression = self._numeric_trends(
+                len(recent), (perf_recent, perf_earlier), (eng_recent, eng_earlier),
+                (diff_recent, diff_earlier), (diff_low, diff_high)
+            )
+        
+        trends = {
+            'performance_trend': performance_trend,
+            'emotional_trend': self._calculate_emotional_trend([columns['emotional_state'][i] for i in recent]),
+            'engagement_trend': engagement_trend,
+            'difficulty_progression': difficulty_progression,
+            'modality_preferences': self._calculate_modality_trends([columns['preferred_modality'][i] for i in recent]),
+            'study_patterns': self._analyze_study_patterns([columns['session_time'][i] for i in recent],
+                                                           columns['session_duration'][recent])
+        }
+        
+        return trends
+    
+    async def get_context_trends_async(self, user_id: str, days: int = 7) -> Dict[str, Any]:
+        """Run get_context_trends in the thread pool so cache I/O does not block the event loop"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get_context_trends, user_id, days)
     
     def _context_to_dict(self, context: LearningContext) -> Dict[str, Any]:
         """Convert LearningContext to dictionary for storage"""
-        return {
+        context_dict = {
             'user_id': context.user_id,
             'session_id': context.session_id,
             'timestamp': context.timestamp.isoformat(),
@@ -182,6 +796,9 @@ class PersistentContextManager:
             'processing_speed': context.processing_speed,
             'metacognitive_awareness': context.metacognitive_awareness
         }
+        for field in _UNIT_INTERVAL_FIELDS:
+            context_dict[field] = round(float(context_dict[field]), UNIT_INTERVAL_PRECISION)
+        return context_dict
     
     def _dict_to_context(self, context_dict: Dict[str, Any]) -> LearningContext:
         """Convert dictionary back to LearningContext"""
@@ -226,8 +843,7 @@ class PersistentContextManager:
         )
     
     def _index_context_semantically(self, user_id: str, context_dict: Dict[str, Any]):
-        """Create semantic index for context (simplified version)"""
-        # This would ideally use vector embeddings
+        """Embed the context once and add it to the per-user vector index"""
         semantic_key = f"{self.semantic_index_prefix}{user_id}"
         
         # Create searchable text from context
@@ -235,164 +851,274 @@ class PersistentContextManager:
                          f"{' '.join(context_dict['concepts_mastered'])} " + \
                          f"{' '.join(context_dict['concepts_struggling'])}"
         
-        # Store in semantic index
-        semantic_index = cache.get(semantic_key, {})
-        timestamp = context_dict['timestamp']
-        semantic_index[timestamp] = searchable_text
-        
-        cache.set(semantic_key, semantic_index, timeout=604800)  # 7 days
+        vector = sentence_embedder.embed(searchable_text)
+        if vector is None:
+            return
+        
+        redis = self._get_redis()
+        if redis is None:
+            # Store in semantic index, bounded like the history it mirrors
+            semantic_index = cache.get(semantic_key, {})
+            semantic_index[context_dict['timestamp']] = _encode_vector(vector)
+            while len(semantic_index) > CONTEXT_HISTORY_LIMIT:
+                del semantic_index[next(iter(semantic_index))]
+            
+            cache.set(semantic_key, semantic_index, timeout=CONTEXT_HISTORY_TTL)
+            return
+        
+        # One packed "timestamp|float32 bytes" item per entry, newest first and trimmed like the
+        # history: a store pushes one vector instead of rewriting the whole index
+        raw_key = cache.make_key(f"{semantic_key}:vectors")
+        pipe = redis.pipeline()
+        pipe.lpush(raw_key, context_dict['timestamp'].encode('ascii') + b'|' +
+                   np.asarray(vector, dtype=np.float32).tobytes())
+        pipe.ltrim(raw_key, 0, CONTEXT_HISTORY_LIMIT - 1)
+        pipe.expire(raw_key, CONTEXT_HISTORY_TTL)
+        pipe.execute()
     
-    def _calculate_context_relevance(self, context: Dict[str, Any], query: str) -> float:
+    def _load_semantic_index(self, user_id: str) -> Dict[str, 'np.ndarray']:
+        """Stored context vectors by entry timestamp"""
+        semantic_key = f"{self.semantic_index_prefix}{user_id}"
+        redis = self._get_redis()
+        if redis is None:
+            return {timestamp: _decode_vector(encoded)
+                    for timestamp, encoded in (cache.get(semantic_key) or {}).items()}
+        
+        semantic_index = {}
+        for item in redis.lrange(cache.make_key(f"{semantic_key}:vectors"), 0, CONTEXT_HISTORY_LIMIT - 1):
+            timestamp, _, packed = item.partition(b'|')
+            # Newest first: a re-stored timestamp keeps its latest vector
+            semantic_index.setdefault(timestamp.decode('ascii'), np.frombuffer(packed, dtype=np.float32))
+        return semantic_index
+    
+    def _semantic_similarities(self, user_id: str, query: str, history: List[Dict[str, Any]]
+                               ) -> Optional[Tuple['np.ndarray', 'np.ndarray']]:
+        """Query similarities and stored vectors for each history entry, or None without embeddings"""
+        semantic_index = self._load_semantic_index(user_id)
+        if not semantic_index:
+            return None
+        
+        query_vector = sentence_embedder.embed(query)
+        if query_vector is None:
+            return None
+        
+        # Entries indexed before embeddings were available keep a zero vector
+        vectors = np.zeros((len(history), query_vector.shape[0]), dtype=np.float32)
+        for i, entry in enumerate(history):
+            vector = semantic_index.get(entry['timestamp'])
+            if vector is not None:
+                vectors[i] = vector
+        
+        # Normalized embeddings: dot product is cosine similarity
+        return vectors @ query_vector, vectors
+    
+    def _rerank_mmr(self, candidates: List[Dict[str, Any]], vectors: 'np.ndarray',
+                    limit: int, mmr_lambda: float) -> List[Dict[str, Any]]:
+        """Greedy Maximal Marginal Relevance over candidates sorted by relevance"""
+        relevance = np.array([c['relevance_score'] for c in candidates], dtype=np.float32)
+        pairwise = vectors @ vectors.T
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        selected = []
+        
+        while len(selected) < limit:
+            scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            scores[~available] = -np.inf
+            best = int(scores.argmax())
+            selected.append(candidates[best])
+            available[best] = False
+            np.maximum(redundancy, pairwise[best], out=redundancy)
+        
+        return selected
+    
+    def _calculate_context_relevance(self, context: Dict[str, Any], matcher: '_QueryMatcher') -> float:
         """Calculate relevance score between stored context and current query"""
+        signature = (context['current_topic'], tuple(context.get('concepts_mastered', [])),
+                     tuple(context.get('concepts_struggling', [])), context.get('emotional_state', ''))
+        score = matcher.scores.get(signature)
+        if score is None:
+            score = matcher.scores[signature] = self._score_context_terms(*signature, matcher)
+        return score
+    
+    def _score_context_terms(self, topic: str, concepts_mastered: tuple, concepts_struggling: tuple,
+                             emotional_state: str, matcher: '_QueryMatcher') -> float:
+        """Average the relevance factors for one topic/concept/emotion combination"""
         relevance_factors = []
         
-        query_lower = query.lower()
-        
         # Topic relevance
-        if context['current_topic'].lower() in query_lower:
+        if matcher.contains(topic):
             relevance_factors.append(0.4)
         
         # Concept relevance
-        for concept in context.get('concepts_mastered', []):
-            if concept.lower() in query_lower:
+        for concept in concepts_mastered:
+            if matcher.contains(concept):
                 relevance_factors.append(0.3)
         
-        for concept in context.get('concepts_struggling', []):
-            if concept.lower() in query_lower:
+        for concept in concepts_struggling:
+            if matcher.contains(concept):
                 relevance_factors.append(0.5)  # Higher weight for struggle areas
         
         # Emotional state relevance (if query indicates similar state)
-        emotional_keywords = {
-            'confused': ['confused', 'don\'t understand', 'unclear'],
-            'frustrated': ['frustrated', 'difficult', 'hard'],
-            'motivated': ['excited', 'ready', 'motivated']
-        }
-        
-        current_emotional = context.get('emotional_state', '')
-        for emotion, keywords in emotional_keywords.items():
-            if emotion == current_emotional and any(kw in query_lower for kw in keywords):
-                relevance_factors.append(0.2)
+        if emotional_state in matcher.emotions:
+            relevance_factors.append(0.2)
         
         # Return average relevance or 0 if no factors found
         return sum(relevance_factors) / len(relevance_factors) if relevance_factors else 0.0
     
-    def _calculate_performance_trend(self, history: List[Dict]) -> str:
-        """Calculate performance trend over time"""
-        if len(history) < 2:
-            return 'insufficient_data'
-        
-        performances = [entry['context']['current_performance'] for entry in history]
-        recent_avg = sum(performances[-5:]) / min(5, len(performances))
-        earlier_avg = sum(performances[:-5]) / max(1, len(performances) - 5) if len(performances) > 5 else recent_avg
+    def _trends_from_stats(self, stats: Dict[str, Any], history_key: str,
+                           columns: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Same report as the per-entry helpers, derived from the running aggregates"""
+        count = stats['count']
+        sums = stats['sums']
+        recent = stats['recent']
+        loaded = {'columns': columns}
+        
+        def window_averages(field):
+            window = recent[field]
+            recent_avg = sum(window) / len(window)
+            if count > len(window):
+                return recent_avg, (sums[field] - sum(window)) / (count - len(window))
+            return recent_avg, recent_avg
+        
+        def distribution(field):
+            counts = stats['counts'][field]
+            if not counts:
+                return {}, 'unknown'
+            top = max(counts.values())
+            leaders = [value for value, value_count in counts.items() if value_count == top]
+            if len(leaders) > 1:
+                # Ties go to the value seen first, as in a Counter over the history; only then read the column
+                if loaded['columns'] is None:
+                    loaded['columns'] = self._load_trend_columns(history_key)
+                return counts, min(leaders, key=loaded['columns'][field].index)
+            return counts, leaders[0]
+        
+        if count < 2:
+            performance_trend, engagement_trend, difficulty_progression = self._numeric_trends(count)
+        else:
+            difficulties = [float(value) for value in stats['difficulty_values']]
+            performance_trend, engagement_trend, difficulty_progression = self._numeric_trends(
+                count, window_averages('current_performance'), window_averages('engagement_score'),
+                window_averages('current_difficulty'), (min(difficulties), max(difficulties))
+            )
+        
+        emotion_counts, dominant_emotion = distribution('emotional_state')
+        recent_emotions = recent['emotional_state']
+        modality_counts, most_used = distribution('preferred_modality')
+        time_counts, preferred_time = distribution('session_time')
+        
+        # Sample variance from the running sums
+        avg_duration = sums['session_duration'] / count
+        if count < 2:
+            consistency = 'insufficient_data'
+        else:
+            variance = max(stats['session_duration_sq'] - sums['session_duration'] * avg_duration, 0.0) / (count - 1)
+            consistency = self._consistency_label(variance ** 0.5 / avg_duration if avg_duration > 0 else 0)
         
+        return {
+            'performance_trend': performance_trend,
+            'emotional_trend': {
+                'dominant_emotion': dominant_emotion,
+                'emotion_distribution': emotion_counts,
+                'emotional_stability': 1.0 - len(set(recent_emotions)) / len(recent_emotions)
+            },
+            'engagement_trend': engagement_trend,
+            'difficulty_progression': difficulty_progression,
+            'modality_preferences': {
+                'preference_distribution': modality_counts,
+                'most_used': most_used,
+                'diversity_score': len(modality_counts) / count
+            },
+            'study_patterns': {
+                'preferred_study_time': preferred_time,
+                'time_distribution': time_counts,
+                'average_session_duration': avg_duration,
+                'session_consistency': consistency
+            }
+        }
+    
+    def _trend_label(self, recent_avg: float, earlier_avg: float, rising: str, falling: str) -> str:
+        """Classify a recent-vs-earlier average change with a 0.1 dead band"""
         if recent_avg > earlier_avg + 0.1:
-            return 'improving'
+            return rising
         elif recent_avg < earlier_avg - 0.1:
-            return 'declining'
+            return falling
         else:
             return 'stable'
     
-    def _calculate_emotional_trend(self, history: List[Dict]) -> Dict[str, Any]:
+    def _numeric_trends(self, count: int, performance: Tuple[float, float] = None,
+                        engagement: Tuple[float, float] = None, difficulty: Tuple[float, float] = None,
+                        difficulty_range: Tuple[float, float] = None) -> Tuple[str, str, Dict[str, Any]]:
+        """Performance trend, engagement trend and difficulty progression from (recent, earlier) means"""
+        if count < 2:
+            return 'insufficient_data', 'insufficient_data', {'trend': 'insufficient_data'}
+        
+        recent_avg, earlier_avg = difficulty
+        return (
+            self._trend_label(*performance, 'improving', 'declining'),
+            self._trend_label(*engagement, 'increasing', 'decreasing'),
+            {
+                'trend': self._trend_label(recent_avg, earlier_avg, 'increasing', 'decreasing'),
+                'current_average': recent_avg,
+                'difficulty_range': difficulty_range,
+                'progression_rate': recent_avg - earlier_avg
+            }
+        )
+    
+    def _calculate_emotional_trend(self, emotions: List[str]) -> Dict[str, Any]:
         """Calculate emotional state trends"""
-        emotions = [entry['context']['emotional_state'] for entry in history]
-        emotion_counts = {}
-        
-        for emotion in emotions:
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+        emotion_counts = Counter(emotions)
         
-        dominant_emotion = max(emotion_counts, key=emotion_counts.get) if emotion_counts else 'unknown'
+        dominant_emotion = emotion_counts.most_common(1)[0][0] if emotion_counts else 'unknown'
         
         # Calculate emotional stability
-        recent_emotions = emotions[-10:]
+        recent_emotions = emotions[-EMOTION_STABILITY_WINDOW:]
         stability_score = len(set(recent_emotions)) / len(recent_emotions) if recent_emotions else 1.0
         
         return {
             'dominant_emotion': dominant_emotion,
-            'emotion_distribution': emotion_counts,
+            'emotion_distribution': dict(emotion_counts),
             'emotional_stability': 1.0 - stability_score  # Lower diversity = higher stability
         }
     
-    def _calculate_engagement_trend(self, history: List[Dict]) -> str:
-        """Calculate engagement trend over time"""
-        if len(history) < 2:
-            return 'insufficient_data'
-        
-        engagement_scores = [entry['context']['engagement_score'] for entry in history]
-        recent_avg = sum(engagement_scores[-5:]) / min(5, len(engagement_scores))
-        earlier_avg = sum(engagement_scores[:-5]) / max(1, len(engagement_scores) - 5) if len(engagement_scores) > 5 else recent_avg
-        
-        if recent_avg > earlier_avg + 0.1:
-            return 'increasing'
-        elif recent_avg < earlier_avg - 0.1:
-            return 'decreasing'
-        else:
-            return 'stable'
-    
-    def _calculate_difficulty_progression(self, history: List[Dict]) -> Dict[str, Any]:
-        """Calculate how difficulty level has progressed"""
-        difficulties = [entry['context']['current_difficulty'] for entry in history]
-        
-        if len(difficulties) < 2:
-            return {'trend': 'insufficient_data'}
-        
-        # Calculate trend
-        recent_avg = sum(difficulties[-5:]) / min(5, len(difficulties))
-        earlier_avg = sum(difficulties[:-5]) / max(1, len(difficulties) - 5) if len(difficulties) > 5 else recent_avg
-        
-        trend = 'increasing' if recent_avg > earlier_avg + 0.1 else \
-                'decreasing' if recent_avg < earlier_avg - 0.1 else 'stable'
-        
-        return {
-            'trend': trend,
-            'current_average': recent_avg,
-            'difficulty_range': (min(difficulties), max(difficulties)),
-            'progression_rate': recent_avg - earlier_avg
-        }
-    
-    def _calculate_modality_trends(self, history: List[Dict]) -> Dict[str, Any]:
+    def _calculate_modality_trends(self, modalities: List[str]) -> Dict[str, Any]:
         """Calculate learning modality preference trends"""
-        modalities = [entry['context']['preferred_modality'] for entry in history]
-        modality_counts = {}
-        
-        for modality in modalities:
-            modality_counts[modality] = modality_counts.get(modality, 0) + 1
+        modality_counts = Counter(modalities)
         
         return {
-            'preference_distribution': modality_counts,
-            'most_used': max(modality_counts, key=modality_counts.get) if modality_counts else 'unknown',
-            'diversity_score': len(set(modalities)) / len(modalities) if modalities else 0
+            'preference_distribution': dict(modality_counts),
+            'most_used': modality_counts.most_common(1)[0][0] if modality_counts else 'unknown',
+            'diversity_score': len(modality_counts) / len(modalities) if modalities else 0
         }
     
-    def _analyze_study_patterns(self, history: List[Dict]) -> Dict[str, Any]:
+    def _analyze_study_patterns(self, session_times: List[str], session_durations: np.ndarray) -> Dict[str, Any]:
         """Analyze study session patterns"""
-        session_times = [entry['context']['session_time'] for entry in history]
-        session_durations = [entry['context']['session_duration'] for entry in history]
-        
         # Time of day preferences
-        time_counts = {}
-        for time_slot in session_times:
-            time_counts[time_slot] = time_counts.get(time_slot, 0) + 1
+        time_counts = Counter(session_times)
         
-        preferred_time = max(time_counts, key=time_counts.get) if time_counts else 'unknown'
+        preferred_time = time_counts.most_common(1)[0][0] if time_counts else 'unknown'
         
         # Session duration patterns
-        avg_duration = sum(session_durations) / len(session_durations) if session_durations else 0
+        avg_duration = float(session_durations.mean()) if len(session_durations) else 0
         
         return {
             'preferred_study_time': preferred_time,
-            'time_distribution': time_counts,
+            'time_distribution': dict(time_counts),
             'average_session_duration': avg_duration,
             'session_consistency': self._calculate_consistency(session_durations)
         }
     
-    def _calculate_consistency(self, values: List[float]) -> str:
+    def _calculate_consistency(self, values: np.ndarray) -> str:
         """Calculate consistency of values"""
         if len(values) < 2:
             return 'insufficient_data'
         
-        import statistics
-        cv = statistics.stdev(values) / statistics.mean(values) if statistics.mean(values) > 0 else 0
-        
+        # Coefficient of variation from the sample standard deviation
+        mean = values.mean()
+        return self._consistency_label(values.std(ddof=1) / mean if mean > 0 else 0)
+    
+    def _consistency_label(self, cv: float) -> str:
+        """Bucket a coefficient of variation"""
         if cv < 0.2:
             return 'very_consistent'
         elif cv < 0.4:
@@ -419,9 +1145,6 @@ class DynamicContextEngine(LLMBaseService):
                                           additional_data: Dict[str, Any] = None) -> LearningContext:
         """Perform comprehensive context analysis"""
         
-        # Get base student profile
-        student_profile = student_analyzer.get_student_profile(user_id)
-        
         # Get conversation history
         conversation_history = memory_service.get_conversation_history(user_id, session_id)
         interaction_history = conversation_history.get('messages', [])
@@ -440,8 +1163,13 @@ class DynamicContextEngine(LLMBaseService):
             recent_messages, performance_data, interaction_history
         )
         
-        # Get historical context trends
-        context_trends = self.persistent_manager.get_context_trends(user_id, days=7)
+        # Student profile (DB) and historical trends (cache) only depend on the user; fetch both
+        # concurrently. Started only now: the tasks cannot run during the synchronous analysis
+        # above anyway, and a failure there would leave them orphaned
+        student_profile, context_trends = await asyncio.gather(
+            sync_to_async(student_analyzer.get_student_profile)(user_id),
+            self.persistent_manager.get_context_trends_async(user_id, days=7)
+        )
         
         # Build comprehensive learning context
         learning_context = await self._build_learning_context(
@@ -450,7 +1178,7 @@ class DynamicContextEngine(LLMBaseService):
         )
         
         # Store context for future reference
-        self.persistent_manager.store_learning_context(user_id, learning_context)
+        await self.persistent_manager.store_learning_context_async(user_id, learning_context)
         
         return learning_context
     
@@ -463,23 +1191,32 @@ class DynamicContextEngine(LLMBaseService):
                                     additional_data: Optional[Dict[str, Any]]) -> LearningContext:
         """Build comprehensive LearningContext object"""
         
+        # Profile sections read by several fields below, looked up once
+        learning_pattern = student_profile.get('learning_pattern', {})
+        recent_performance = student_profile.get('recent_performance', {})
+        learning_stats = student_profile.get('learning_stats', {})
+        extra = additional_data or {}
+        now = datetime.now()
+        
         # Extract current session data
-        session_start_time = datetime.now() - timedelta(minutes=len(interaction_history) * 2)  # Estimate
-        session_duration = (datetime.now() - session_start_time).total_seconds() / 60
+        session_start_time = now - timedelta(minutes=len(interaction_history) * 2)  # Estimate
+        session_duration = (now - session_start_time).total_seconds() / 60
         
-        # Extract topics and concepts from interaction history
-        topics_covered = list(set([
-            interaction.get('topic', immediate_context['topic_focus'])
+        # Extract topics and concepts from interaction history (first-seen order, no repeats)
+        topic_focus = immediate_context['topic_focus']
+        topics = dict.fromkeys(
+            interaction.get('topic', topic_focus)
             for interaction in interaction_history[-10:]
-        ]))
-        topics_covered.append(immediate_context['topic_focus'])
+        )
+        topics[topic_focus] = None
+        topics_covered = list(topics)
         
         # Determine cognitive load
         cognitive_load = self._assess_cognitive_load(immediate_context, emotional_context, student_profile)
         
         # Get device and environmental context
-        device_type = additional_data.get('device_type', 'desktop') if additional_data else 'desktop'
-        current_hour = datetime.now().hour
+        device_type = extra.get('device_type', 'desktop')
+        current_hour = now.hour
         session_time = 'morning' if 6 <= current_hour < 12 else \
                       'afternoon' if 12 <= current_hour < 18 else 'evening'
         
@@ -487,31 +1224,31 @@ class DynamicContextEngine(LLMBaseService):
         learning_context = LearningContext(
             user_id=user_id,
             session_id=session_id,
-            timestamp=datetime.now(),
+            timestamp=now,
             
             # Immediate Context
             current_topic=immediate_context['topic_focus'],
             current_difficulty=immediate_context['complexity_level'],
             current_performance=self._estimate_current_performance(immediate_context, emotional_context),
-            response_time=additional_data.get('response_time', 5.0) if additional_data else 5.0,
+            response_time=extra.get('response_time', 5.0),
             interaction_count=len(interaction_history) + 1,
             
             # Session Context
             session_duration=session_duration,
             topics_covered=topics_covered,
-            concepts_mastered=student_profile.get('recent_performance', {}).get('concepts_mastered', []),
-            concepts_struggling=student_profile.get('recent_performance', {}).get('concepts_struggling', []),
+            concepts_mastered=recent_performance.get('concepts_mastered', []),
+            concepts_struggling=recent_performance.get('concepts_struggling', []),
             questions_asked=len([m for m in interaction_history if '?' in m.get('input', '')]),
-            mistakes_made=additional_data.get('mistakes_made', 0) if additional_data else 0,
+            mistakes_made=extra.get('mistakes_made', 0),
             
             # Behavioral Context
             preferred_modality=LearningModalityType(
                 student_profile.get('profile', {}).get('settings', {}).get('preferred_style', 'visual')
             ),
-            learning_pace=student_profile.get('learning_pattern', {}).get('preferred_pace', 'medium'),
-            attention_span=student_profile.get('learning_pattern', {}).get('attention_span', 20),
-            optimal_session_length=student_profile.get('learning_pattern', {}).get('optimal_session_length', 45),
-            peak_performance_time=student_profile.get('learning_pattern', {}).get('peak_performance_time', 'morning'),
+            learning_pace=learning_pattern.get('preferred_pace', 'medium'),
+            attention_span=learning_pattern.get('attention_span', 20),
+            optimal_session_length=learning_pattern.get('optimal_session_length', 45),
+            peak_performance_time=learning_pattern.get('peak_performance_time', 'morning'),
             
             # Emotional Context
             emotional_state=EmotionalState(emotional_context['primary_emotion'].value),
@@ -521,22 +1258,22 @@ class DynamicContextEngine(LLMBaseService):
             engagement_score=emotional_context['engagement_score'],
             
             # Historical Context
-            total_study_time=student_profile.get('learning_stats', {}).get('total_study_hours', 0),
-            mastery_rate=student_profile.get('learning_stats', {}).get('mastery_rate', 0.5),
-            retention_score=student_profile.get('learning_stats', {}).get('retention_rate', 0.7),
+            total_study_time=learning_stats.get('total_study_hours', 0),
+            mastery_rate=learning_stats.get('mastery_rate', 0.5),
+            retention_score=learning_stats.get('retention_rate', 0.7),
             improvement_trend=context_trends.get('performance_trend', 'stable'),
-            learning_streaks=student_profile.get('learning_pattern', {}).get('streaks', {}),
+            learning_streaks=learning_pattern.get('streaks', {}),
             
             # Environmental Context
             device_type=device_type,
             session_time=session_time,
             estimated_distractions=self._estimate_distractions(device_type, session_time),
-            study_location=additional_data.get('study_location', 'unknown') if additional_data else 'unknown',
+            study_location=extra.get('study_location', 'unknown'),
             
             # Cognitive Context
             cognitive_load=cognitive_load,
-            working_memory_capacity=student_profile.get('learning_pattern', {}).get('working_memory', 5),
-            processing_speed=student_profile.get('learning_pattern', {}).get('processing_speed', 'medium'),
+            working_memory_capacity=learning_pattern.get('working_memory', 5),
+            processing_speed=learning_pattern.get('processing_speed', 'medium'),
             metacognitive_awareness=self._assess_metacognitive_awareness(student_profile, interaction_history)
         )
         
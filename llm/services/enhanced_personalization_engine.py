@@ -3,28 +3,113 @@ Enhanced Personalization Engine with Advanced Context Integration
 Real-time learning effectiveness feedback loops and adaptive optimization
 """
 import json
+import time
+import atexit
+import logging
 import asyncio
+import threading
+import weakref
+from collections import OrderedDict, deque
 import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from django.core.cache import cache
 from django.utils import timezone
+from django.conf import settings
+from asgiref.sync import sync_to_async
+
+try:
+    from django_redis import get_redis_connection
+    DJANGO_REDIS_AVAILABLE = True
+except ImportError:
+    DJANGO_REDIS_AVAILABLE = False
 
 # Import new context components
 from .advanced_context_engine import (
     LearningContext, LearningModalityType, EmotionalState, CognitiveLoadLevel
 )
-from .dynamic_context_engine import DynamicContextEngine, PersistentContextManager
-from .contextual_prompt_engine import ContextualPromptEngine
+from .dynamic_context_engine import DynamicContextEngine, PersistentContextManager, _dumps_payload
+from .contextual_prompt_engine import ContextualPromptEngine, _select_template_key
+from .conversation_manager import sentence_embedder
 
 # Import existing services
 from .memory_service import memory_service
 from .student_analyzer import student_analyzer
-from ..core.base_service import LLMBaseService
+from ..core.base_service import LLMBaseService, json_loads
+from ..core.client import llm_factory
+from ..core.config import LLMConfig
 from apps.authentication.models import User
 from apps.learning_plans.models import StudySession
 from apps.learning_plans.student_notes_models import StudentLearningPattern
 
+logger = logging.getLogger(__name__)
+
+# Effectiveness records are buffered in-process and written to the cache in one batch this many seconds later
+EFFECTIVENESS_FLUSH_DELAY = 5.0
+
+# Session score columns are cached as integers 0..SCORE_LEVELS: a few JSON bytes per score instead
+# of a full float repr, and a step (~0.004) far below the 0.1 trend and recommendation thresholds
+SCORE_LEVELS = 255
+
+# Feedback signals by input key: (key, category, item type, item field, analyzer method or None, weight)
+_FEEDBACK_SIGNALS = (
+    # Explicit feedback (ratings, comments)
+    ('user_rating', 'explicit_feedback', 'rating', 'value', None, 1.0),
+    ('user_comment', 'explicit_feedback', 'comment', 'sentiment', '_analyze_comment_sentiment', 0.8),
+    # Behavioral feedback
+    ('response_time', 'behavioral_feedback', 'response_time', 'value', '_analyze_response_time', 0.6),
+    ('navigation_pattern', 'behavioral_feedback', 'navigation', 'pattern', None, 0.5),
+    # Performance feedback
+    ('quiz_score', 'performance_feedback', 'assessment', 'score', None, 0.9),
+    ('concept_mastery', 'performance_feedback', 'mastery', 'level', None, 0.8),
+    # Engagement feedback
+    ('session_duration', 'engagement_feedback', 'duration', 'value', '_analyze_session_duration', 0.6),
+    ('interaction_frequency', 'engagement_feedback', 'frequency', 'value', None, 0.5),
+)
+
+# Profile settings read by feedback processing are reused per user for this many seconds (LRU-bounded)
+FEEDBACK_PROFILE_TTL = 30.0
+FEEDBACK_PROFILE_CACHE_SIZE = 1024
+
+# Learning model update failures logged per user each minute; a failing profile service would otherwise flood the log
+LEARNING_MODEL_ERROR_LOGS_PER_MINUTE = 5
+
+# Weights of the per-interaction metrics in the overall effectiveness score, in a fixed order
+_EFFECTIVENESS_WEIGHTS = (
+    ('response_quality', 0.2),
+    ('engagement_indicator', 0.15),
+    ('comprehension_score', 0.25),
+    ('emotional_response', 0.15),
+    ('learning_progress', 0.15),
+    ('time_efficiency', 0.1),
+)
+
+# Raw LLM responses are reused for user messages this similar (cosine) within the same context bucket
+SEMANTIC_RESPONSE_THRESHOLD = 0.92
+SEMANTIC_RESPONSE_BUCKETS = 256
+SEMANTIC_RESPONSE_ENTRIES_PER_BUCKET = 64
+
+# Recommendation per metric, given when its score falls below the threshold; same metric order as the weights
+_RECOMMENDATION_RULES = (
+    ('response_quality', 0.5, "Encourage more detailed responses and use of subject terminology"),
+    ('engagement_indicator', 0.4, "Try more interactive content or check if topic interests the student"),
+    ('comprehension_score', 0.5, "Provide additional examples and check understanding more frequently"),
+    ('emotional_response', 0.4, "Focus on building confidence and reducing learning anxiety"),
+    ('learning_progress', 0.3, "Break down concepts into smaller steps and provide more scaffolding"),
+    ('time_efficiency', 0.4, "Adjust pacing and provide more focused content"),
+)
+
+
+# Trackers that may hold buffered records; flushed at interpreter exit so a worker restart
+# or deploy does not drop the last EFFECTIVENESS_FLUSH_DELAY seconds of records
+_trackers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_trackers():
+    for tracker in list(_trackers):
+        tracker.flush()
+
 
 class LearningEffectivenessTracker:
     """Tracks and analyzes learning effectiveness in real-time"""
@@ -32,6 +117,20 @@ class LearningEffectivenessTracker:
     def __init__(self):
         self.effectiveness_cache_prefix = "learning_effectiveness:"
         self.feedback_cache_prefix = "effectiveness_feedback:"
+        # Write-behind buffers keyed by cache key, dropped on every flush
+        self._lock = threading.Lock()
+        self._session_buffers: Dict[str, deque] = {}
+        self._historical_buffers: Dict[str, deque] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        # Records the running flush is writing, by cache key; buffers created meanwhile are
+        # seeded from these rather than from the cache copy about to be replaced
+        self._flushing: Dict[str, list] = {}
+        self._flush_generation = 0
+        # Flushes write one at a time, so an older snapshot never lands after a newer one
+        self._flush_lock = threading.Lock()
+        self._redis = None
+        self._redis_checked = False
+        _trackers.add(self)
         
     def track_interaction_effectiveness(self, user_id: str, session_id: str, 
                                       interaction_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -50,12 +149,12 @@ class LearningEffectivenessTracker:
         # Calculate overall effectiveness score
         overall_score = self._calculate_overall_effectiveness(effectiveness_metrics)
         
-        # Store effectiveness data
+        # Store effectiveness data; only what the session and trend analysis read,
+        # the raw interaction payload would dominate every cached record
         self._store_effectiveness_data(user_id, session_id, {
             'timestamp': datetime.now().isoformat(),
             'metrics': effectiveness_metrics,
-            'overall_score': overall_score,
-            'interaction_data': interaction_data
+            'overall_score': overall_score
         })
         
         return {
@@ -64,28 +163,93 @@ class LearningEffectivenessTracker:
             'recommendations': self._generate_recommendations(effectiveness_metrics)
         }
     
+    def track_interaction_effectiveness_batch(self, records: List[Tuple[str, str, Dict[str, Any]]]
+                                              ) -> List[Dict[str, Any]]:
+        """Track a batch of (user_id, session_id, interaction_data) records; results match
+        track_interaction_effectiveness for each record"""
+        
+        # Scorer outputs as one (N, 6) matrix, columns in _EFFECTIVENESS_WEIGHTS order
+        scorers = (
+            self._assess_response_quality,
+            self._calculate_engagement_indicator,
+            self._assess_comprehension,
+            self._analyze_emotional_response,
+            self._measure_learning_progress,
+            self._calculate_time_efficiency
+        )
+        scores = np.array([[scorer(interaction_data) for scorer in scorers]
+                           for _, _, interaction_data in records], dtype=np.float64).reshape(len(records), len(scorers))
+        
+        # Weighted column sums in the same order as the per-interaction score, so both agree exactly
+        overall_scores = np.zeros(len(records))
+        for column, (_, weight) in enumerate(_EFFECTIVENESS_WEIGHTS):
+            overall_scores += scores[:, column] * weight
+        overall_scores = np.clip(overall_scores, 0.0, 1.0).tolist()
+        
+        thresholds = np.array([threshold for _, threshold, _ in _RECOMMENDATION_RULES])
+        below_threshold = (scores < thresholds).tolist()
+        
+        metric_names = [metric for metric, _ in _EFFECTIVENESS_WEIGHTS]
+        results = []
+        for (user_id, session_id, _), row, overall_score, below in zip(
+                records, scores.tolist(), overall_scores, below_threshold):
+            effectiveness_metrics = dict(zip(metric_names, row))
+            self._store_effectiveness_data(user_id, session_id, {
+                'timestamp': datetime.now().isoformat(),
+                'metrics': effectiveness_metrics,
+                'overall_score': overall_score
+            })
+            results.append({
+                'effectiveness_score': overall_score,
+                'metrics': effectiveness_metrics,
+                'recommendations': [message for (_, _, message), flagged in zip(_RECOMMENDATION_RULES, below)
+                                    if flagged]
+            })
+        
+        return results
+    
     def analyze_session_effectiveness(self, user_id: str, session_id: str) -> Dict[str, Any]:
         """Analyze overall session effectiveness"""
         
         effectiveness_key = f"{self.effectiveness_cache_prefix}{user_id}:{session_id}"
-        session_data = cache.get(effectiveness_key, [])
+        columns = self._load_session_columns(effectiveness_key)
         
-        if not session_data:
+        if columns is None:
             return {'status': 'no_data'}
         
-        # Calculate session-level metrics
-        session_metrics = {
-            'average_effectiveness': np.mean([d['overall_score'] for d in session_data]),
-            'effectiveness_trend': self._calculate_trend([d['overall_score'] for d in session_data]),
-            'peak_performance': max(d['overall_score'] for d in session_data),
-            'consistency_score': 1.0 - np.std([d['overall_score'] for d in session_data]),
-            'improvement_rate': self._calculate_improvement_rate(session_data),
-            'engagement_pattern': self._analyze_engagement_pattern(session_data),
-            'learning_velocity': self._calculate_learning_velocity(session_data)
-        }
+        # Calculate session-level metrics, all from the same contiguous score array
+        scores = columns['overall']
+        if len(scores) == 1:
+            # A session's first interaction: no spread, trend or progression to measure yet
+            score = float(scores[0])
+            engagement = float(columns['engagement'][0])
+            session_metrics = {
+                'average_effectiveness': score,
+                'effectiveness_trend': 'insufficient_data',
+                'peak_performance': score,
+                'consistency_score': 1.0,
+                'improvement_rate': 0.0,
+                'engagement_pattern': {
+                    'average_engagement': engagement,
+                    'engagement_stability': 1.0,
+                    'peak_engagement': engagement,
+                    'engagement_trend': 'insufficient_data'
+                },
+                'learning_velocity': 0.0
+            }
+        else:
+            session_metrics = {
+                'average_effectiveness': scores.mean(),
+                'effectiveness_trend': self._calculate_trend(scores),
+                'peak_performance': scores.max(),
+                'consistency_score': 1.0 - scores.std(ddof=0),
+                'improvement_rate': self._calculate_improvement_rate(scores),
+                'engagement_pattern': self._analyze_engagement_pattern(columns['engagement']),
+                'learning_velocity': self._calculate_learning_velocity(columns['progress'])
+            }
         
         # Generate session insights
-        insights = self._generate_session_insights(session_metrics, session_data)
+        insights = self._generate_session_insights(session_metrics, columns)
         
         return {
             'session_metrics': session_metrics,
@@ -120,86 +284,87 @@ class LearningEffectivenessTracker:
         student_response = interaction_data.get('student_response', '')
         expected_complexity = interaction_data.get('question_complexity', 0.5)
         
-        # Simple heuristic assessment (can be enhanced with NLP)
-        quality_indicators = []
+        # Simple heuristic assessment (can be enhanced with NLP); every indicator adds a
+        # positive amount, so a zero score means none applied and the 0.3 default is used
+        quality_score = 0.0
         
         # Length appropriateness
         response_length = len(student_response.split())
         if expected_complexity > 0.7 and response_length > 20:
-            quality_indicators.append(0.3)
+            quality_score += 0.3
         elif expected_complexity < 0.3 and 5 <= response_length <= 15:
-            quality_indicators.append(0.3)
+            quality_score += 0.3
         elif 10 <= response_length <= 25:
-            quality_indicators.append(0.2)
+            quality_score += 0.2
         
         # Keyword relevance (simplified)
         topic_keywords = interaction_data.get('topic_keywords', [])
-        keyword_matches = sum(1 for keyword in topic_keywords 
-                            if keyword.lower() in student_response.lower())
+        response_lower = student_response.lower()
+        keyword_matches = sum(1 for keyword in topic_keywords if keyword.lower() in response_lower)
         if keyword_matches > 0:
-            quality_indicators.append(min(keyword_matches * 0.1, 0.3))
+            quality_score += min(keyword_matches * 0.1, 0.3)
         
         # Question indicators
         if '?' in student_response and expected_complexity > 0.5:
-            quality_indicators.append(0.2)  # Good critical thinking
+            quality_score += 0.2  # Good critical thinking
         
-        return min(sum(quality_indicators), 1.0) if quality_indicators else 0.3
+        return min(quality_score, 1.0) if quality_score > 0 else 0.3
     
     def _calculate_engagement_indicator(self, interaction_data: Dict[str, Any]) -> float:
         """Calculate engagement indicator from interaction"""
         
-        engagement_factors = []
+        engagement_score = 0.0
         
         # Response time analysis
         response_time = interaction_data.get('response_time', 10)
         optimal_time = interaction_data.get('optimal_response_time', 8)
         
         if 0.5 * optimal_time <= response_time <= 2 * optimal_time:
-            engagement_factors.append(0.3)  # Appropriate thinking time
+            engagement_score += 0.3  # Appropriate thinking time
         elif response_time > 3 * optimal_time:
-            engagement_factors.append(-0.2)  # Possible disengagement
+            engagement_score -= 0.2  # Possible disengagement
         
         # Interaction frequency
         recent_interactions = interaction_data.get('recent_interaction_count', 1)
         if recent_interactions > 3:
-            engagement_factors.append(0.2)
+            engagement_score += 0.2
         
         # Question quality
         if interaction_data.get('asks_questions', False):
-            engagement_factors.append(0.3)
+            engagement_score += 0.3
         
         # Follow-up engagement
         if interaction_data.get('requests_clarification', False):
-            engagement_factors.append(0.2)
+            engagement_score += 0.2
         
-        return max(0.0, min(sum(engagement_factors) + 0.5, 1.0))  # Baseline 0.5
+        return max(0.0, min(engagement_score + 0.5, 1.0))  # Baseline 0.5
     
     def _assess_comprehension(self, interaction_data: Dict[str, Any]) -> float:
         """Assess student comprehension from response"""
         
-        comprehension_indicators = []
+        comprehension_score = 0.0
         
         # Correct concept usage
         if interaction_data.get('uses_correct_terminology', False):
-            comprehension_indicators.append(0.3)
+            comprehension_score += 0.3
         
         # Logical reasoning
         if interaction_data.get('shows_logical_reasoning', False):
-            comprehension_indicators.append(0.3)
+            comprehension_score += 0.3
         
         # Application of concepts
         if interaction_data.get('applies_concepts', False):
-            comprehension_indicators.append(0.2)
+            comprehension_score += 0.2
         
         # Asks relevant questions
         if interaction_data.get('asks_relevant_questions', False):
-            comprehension_indicators.append(0.2)
+            comprehension_score += 0.2
         
         # No major misconceptions
         if not interaction_data.get('shows_misconceptions', False):
-            comprehension_indicators.append(0.1)
+            comprehension_score += 0.1
         
-        return min(sum(comprehension_indicators), 1.0) if comprehension_indicators else 0.3
+        return min(comprehension_score, 1.0) if comprehension_score > 0 else 0.3
     
     def _analyze_emotional_response(self, interaction_data: Dict[str, Any]) -> float:
         """Analyze emotional response to learning interaction"""
@@ -223,27 +388,27 @@ class LearningEffectivenessTracker:
     def _measure_learning_progress(self, interaction_data: Dict[str, Any]) -> float:
         """Measure learning progress in this interaction"""
         
-        progress_indicators = []
+        progress_score = 0.0
         
         # Concept mastery progression
         if interaction_data.get('concept_mastered', False):
-            progress_indicators.append(0.4)
+            progress_score += 0.4
         elif interaction_data.get('concept_improved', False):
-            progress_indicators.append(0.2)
+            progress_score += 0.2
         
         # Skill development
         if interaction_data.get('skill_demonstrated', False):
-            progress_indicators.append(0.2)
+            progress_score += 0.2
         
         # Knowledge connection
         if interaction_data.get('connects_to_prior_knowledge', False):
-            progress_indicators.append(0.2)
+            progress_score += 0.2
         
         # Problem-solving improvement
         if interaction_data.get('problem_solving_improved', False):
-            progress_indicators.append(0.2)
+            progress_score += 0.2
         
-        return min(sum(progress_indicators), 1.0) if progress_indicators else 0.3
+        return min(progress_score, 1.0) if progress_score > 0 else 0.3
     
     def _calculate_time_efficiency(self, interaction_data: Dict[str, Any]) -> float:
         """Calculate time efficiency of learning interaction"""
@@ -264,18 +429,10 @@ class LearningEffectivenessTracker:
     def _calculate_overall_effectiveness(self, metrics: Dict[str, float]) -> float:
         """Calculate overall effectiveness score"""
         
-        # Weighted combination of metrics
-        weights = {
-            'response_quality': 0.2,
-            'engagement_indicator': 0.15,
-            'comprehension_score': 0.25,
-            'emotional_response': 0.15,
-            'learning_progress': 0.15,
-            'time_efficiency': 0.1
-        }
-        
-        weighted_score = sum(metrics[metric] * weights[metric] 
-                           for metric in weights if metric in metrics)
+        # Weighted combination of metrics; a missing metric contributes nothing
+        weighted_score = 0.0
+        for metric, weight in _EFFECTIVENESS_WEIGHTS:
+            weighted_score += metrics.get(metric, 0.0) * weight
         
         return max(0.0, min(weighted_score, 1.0))
     
@@ -283,106 +440,293 @@ class LearningEffectivenessTracker:
         """Store effectiveness data for analysis"""
         
         effectiveness_key = f"{self.effectiveness_cache_prefix}{user_id}:{session_id}"
-        session_data = cache.get(effectiveness_key, [])
-        
-        session_data.append(effectiveness_data)
-        
-        # Keep last 100 interactions per session
-        if len(session_data) > 100:
-            session_data = session_data[-100:]
-        
-        cache.set(effectiveness_key, session_data, timeout=86400)  # 24 hours
-        
-        # Also store in historical data
         historical_key = f"{self.effectiveness_cache_prefix}{user_id}:historical"
-        historical_data = cache.get(historical_key, [])
-        historical_data.append({
+        
+        # Historical records are buffered as (Unix seconds, record) pairs, see _encode_historical
+        ts = int(datetime.fromisoformat(effectiveness_data['timestamp']).timestamp())
+        historical_record = {
             'session_id': session_id,
-            'timestamp': effectiveness_data['timestamp'],
             'overall_score': effectiveness_data['overall_score'],
             'metrics': effectiveness_data['metrics']
-        })
+        }
         
-        # Keep last 1000 historical records
-        if len(historical_data) > 1000:
-            historical_data = historical_data[-1000:]
+        # Append to the buffered lists (last 100 interactions per session, last 1000 historical
+        # records); they reach the cache once per flush instead of on every interaction
+        self._append_buffered((
+            ('_session_buffers', effectiveness_key, 100, None, effectiveness_data),
+            ('_historical_buffers', historical_key, 1000, self._decode_historical, (ts, historical_record)),
+        ))
+    
+    def _append_buffered(self, items: Tuple[Tuple[str, str, int, Any, Any], ...]):
+        """Append (buffers attribute, cache key, limit, decode, item) entries to the write-behind buffers.
+        
+        On django-redis the buffers only hold records not yet pushed to the Redis lists.
+        Elsewhere each flush rewrites whole cached values, so a missing buffer is seeded from
+        the cached value, read without holding the lock so cache I/O never stalls the other
+        tracking threads. A seed read before a flush swapped the buffers may predate that
+        flush's write, so it is read again.
+        """
+        if self._get_redis() is not None:
+            with self._lock:
+                for attribute, key, limit, _, item in items:
+                    buffers = getattr(self, attribute)
+                    buffer = buffers.get(key)
+                    if buffer is None:
+                        buffer = buffers[key] = deque(maxlen=limit)
+                    buffer.append(item)
+                self._schedule_flush()
+            return
+        
+        seeds = {}
+        while True:
+            missing = []
+            with self._lock:
+                generation = self._flush_generation
+                for attribute, key, _, decode, _ in items:
+                    if key in getattr(self, attribute):
+                        continue
+                    if key in self._flushing:
+                        seeds[key] = (generation, self._flushing[key])
+                    elif key not in seeds or seeds[key][0] != generation:
+                        missing.append((key, decode))
+                
+                if not missing:
+                    for attribute, key, limit, _, item in items:
+                        buffers = getattr(self, attribute)
+                        buffer = buffers.get(key)
+                        if buffer is None:
+                            buffer = buffers[key] = deque(seeds[key][1], maxlen=limit)
+                        buffer.append(item)
+                    self._schedule_flush()
+                    return
+            
+            for key, decode in missing:
+                cached = self._cache_get(key)
+                if decode is not None:
+                    cached = decode(cached)
+                seeds[key] = (generation, cached or [])
+    
+    def _schedule_flush(self):
+        """Start the flush timer unless one is pending; called with the lock held"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(EFFECTIVENESS_FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _get_redis(self):
+        """Raw Redis client when the default cache is django-redis, otherwise None"""
+        if not self._redis_checked:
+            self._redis_checked = True
+            backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+            if DJANGO_REDIS_AVAILABLE and backend.startswith('django_redis'):
+                self._redis = get_redis_connection("default")
+        return self._redis
+    
+    def _cache_get(self, key: str) -> Any:
+        """Cached value of an effectiveness key, or None"""
+        redis = self._get_redis()
+        if redis is None:
+            return cache.get(key)
+        
+        raw = redis.get(cache.make_key(key))
+        if raw is None:
+            return None
+        try:
+            return json_loads(raw)
+        except ValueError:
+            # Written through the cache serializer before these keys were stored as raw JSON
+            return cache.get(key)
+    
+    def _cache_set_many(self, entries: List[Tuple[str, Any, int]]):
+        """Write (key, value, timeout) entries; on django-redis as orjson payloads in one round trip,
+        skipping the stdlib JSON serializer and zlib pass of the cache backend"""
+        redis = self._get_redis()
+        if redis is None:
+            for key, value, timeout in entries:
+                cache.set(key, value, timeout=timeout)
+            return
+        
+        pipe = redis.pipeline()
+        for key, value, timeout in entries:
+            pipe.set(cache.make_key(key), _dumps_payload(value), ex=timeout)
+        pipe.execute()
+    
+    def _encode_historical(self, items: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached form of the historical records: timestamps as second offsets from the first one,
+        a few JSON bytes each instead of an ISO string per record"""
+        base_ts = items[0][0] if items else 0
+        return {
+            'base_ts': base_ts,
+            'ts': [ts - base_ts for ts, _ in items],
+            'records': [record for _, record in items]
+        }
+    
+    def _decode_historical(self, cached: Any) -> List[Tuple[int, Dict[str, Any]]]:
+        """(Unix seconds, record) pairs from the cached historical records"""
+        if not cached:
+            return []
+        if isinstance(cached, list):
+            # Written before the timestamps were delta-encoded: records carrying ISO timestamps
+            return [(int(datetime.fromisoformat(record['timestamp']).timestamp()),
+                     {key: value for key, value in record.items() if key != 'timestamp'})
+                    for record in cached]
+        base_ts = cached['base_ts']
+        return [(base_ts + offset, record) for offset, record in zip(cached['ts'], cached['records'])]
+    
+    def flush(self):
+        """Write all buffered effectiveness records to the cache"""
+        with self._flush_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                session_buffers, self._session_buffers = self._session_buffers, {}
+                historical_buffers, self._historical_buffers = self._historical_buffers, {}
+                snapshots = {key: list(buffer) for buffers in (session_buffers, historical_buffers)
+                             for key, buffer in buffers.items()}
+                self._flushing = snapshots
+                self._flush_generation += 1
+            
+            # Written without the tracking lock; buffers created meanwhile seed from the snapshots
+            try:
+                redis = self._get_redis()
+                if redis is not None:
+                    self._push_records(redis, [
+                        (key, snapshots[key], 100, 86400) for key in session_buffers  # 24 hours
+                    ] + [
+                        (key, snapshots[key], 1000, 2592000) for key in historical_buffers  # 30 days
+                    ])
+                    return
+                
+                entries = []
+                for effectiveness_key in session_buffers:
+                    session_data = snapshots[effectiveness_key]
+                    entries.append((effectiveness_key, session_data, 86400))  # 24 hours
+                    # Session scores as parallel lists, so analysis reads arrays instead of walking the records
+                    entries.append((f"{effectiveness_key}:cols", self._session_columns(session_data), 86400))
+                
+                for historical_key in historical_buffers:
+                    entries.append((historical_key, self._encode_historical(snapshots[historical_key]), 2592000))  # 30 days
+                
+                self._cache_set_many(entries)
+            except Exception:
+                logger.exception("Error flushing effectiveness data")
+            finally:
+                with self._lock:
+                    self._flushing = {}
+    
+    def _push_records(self, redis, lists: List[Tuple[str, list, int, int]]):
+        """Append (cache key, records, limit, timeout) batches to capped Redis lists in one round trip.
+        
+        Other processes append to the same lists, so nothing they wrote is replaced. The lists
+        live next to the plain keys, which may still hold values written before they existed.
+        """
+        pipe = redis.pipeline(transaction=False)
+        for key, records, limit, timeout in lists:
+            raw_key = cache.make_key(f"{key}:records")
+            pipe.rpush(raw_key, *[_dumps_payload(record) for record in records])
+            pipe.ltrim(raw_key, -limit, -1)
+            pipe.expire(raw_key, timeout)
+        pipe.execute()
+    
+    def _load_session_records(self, redis, effectiveness_key: str) -> List[Dict[str, Any]]:
+        """The session's records on Redis followed by the ones this process has not pushed yet"""
+        # Holding the flush lock keeps this read out of the window where a flush has taken
+        # records out of the buffer but not pushed them yet
+        with self._flush_lock:
+            with self._lock:
+                pending = list(self._session_buffers.get(effectiveness_key, ()))
+            stored = redis.lrange(cache.make_key(f"{effectiveness_key}:records"), -100, -1)
+        return ([json_loads(raw) for raw in stored] + pending)[-100:]
+    
+    def _session_columns(self, session_data: List[Dict]) -> Dict[str, List]:
+        """Split session records into the parallel, quantized score lists kept next to them"""
+        return {
+            'overall': self._quantize_scores([d['overall_score'] for d in session_data]),
+            'engagement': self._quantize_scores([d['metrics']['engagement_indicator'] for d in session_data]),
+            'progress': self._quantize_scores([d['metrics']['learning_progress'] for d in session_data]),
+            'ts': [d['timestamp'] for d in session_data]
+        }
+    
+    def _quantize_scores(self, scores: List[float]) -> List[int]:
+        """Map scores in [0, 1] to integers 0..SCORE_LEVELS"""
+        levels = np.rint(np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0) * SCORE_LEVELS)
+        return levels.astype(np.uint8).tolist()
+    
+    def _load_session_columns(self, effectiveness_key: str) -> Optional[Dict[str, Any]]:
+        """Session score columns as float arrays in [0, 1] (timestamps stay a list), or None without data"""
+        redis = self._get_redis()
+        if redis is not None:
+            session_data = self._load_session_records(redis, effectiveness_key)
+            columns = self._session_columns(session_data) if session_data else None
+        else:
+            with self._lock:
+                buffer = self._session_buffers.get(effectiveness_key) or self._flushing.get(effectiveness_key)
+                columns = self._session_columns(buffer) if buffer else None
+        if columns is None:
+            columns = self._cache_get(f"{effectiveness_key}:cols")
+        if columns is None:
+            # Sessions recorded before the column entry existed
+            session_data = self._cache_get(effectiveness_key)
+            if not session_data:
+                return None
+            columns = self._session_columns(session_data)
         
-        cache.set(historical_key, historical_data, timeout=2592000)  # 30 days
+        return {
+            'overall': np.asarray(columns['overall'], dtype=np.float64) / SCORE_LEVELS,
+            'engagement': np.asarray(columns['engagement'], dtype=np.float64) / SCORE_LEVELS,
+            'progress': np.asarray(columns['progress'], dtype=np.float64) / SCORE_LEVELS,
+            'ts': columns['ts']
+        }
     
     def _generate_recommendations(self, metrics: Dict[str, float]) -> List[str]:
         """Generate recommendations based on effectiveness metrics"""
-        
-        recommendations = []
-        
-        # Response quality recommendations
-        if metrics['response_quality'] < 0.5:
-            recommendations.append("Encourage more detailed responses and use of subject terminology")
-        
-        # Engagement recommendations
-        if metrics['engagement_indicator'] < 0.4:
-            recommendations.append("Try more interactive content or check if topic interests the student")
-        
-        # Comprehension recommendations
-        if metrics['comprehension_score'] < 0.5:
-            recommendations.append("Provide additional examples and check understanding more frequently")
-        
-        # Emotional response recommendations
-        if metrics['emotional_response'] < 0.4:
-            recommendations.append("Focus on building confidence and reducing learning anxiety")
-        
-        # Learning progress recommendations
-        if metrics['learning_progress'] < 0.3:
-            recommendations.append("Break down concepts into smaller steps and provide more scaffolding")
-        
-        # Time efficiency recommendations
-        if metrics['time_efficiency'] < 0.4:
-            recommendations.append("Adjust pacing and provide more focused content")
-        
-        return recommendations
+        return [message for metric, threshold, message in _RECOMMENDATION_RULES
+                if metrics[metric] < threshold]
     
-    def _calculate_trend(self, values: List[float]) -> str:
-        """Calculate trend from list of values"""
-        if len(values) < 3:
+    def _calculate_trend(self, values: np.ndarray) -> str:
+        """Calculate trend from a series of values"""
+        values = np.asarray(values, dtype=np.float64)
+        n = values.size
+        if n < 3:
             return 'insufficient_data'
         
-        # Simple linear trend
-        x = np.arange(len(values))
-        slope = np.corrcoef(x, values)[0, 1] if np.std(values) > 0 else 0
+        # Correlation of the values with their position: a scale-free trend strength in [-1, 1],
+        # so the +/-0.1 thresholds hold for any score range. The centered positions have a closed-form square sum
+        positions = np.arange(n, dtype=np.float64) - (n - 1) / 2.0
+        centered = values - values.mean()
+        spread = centered @ centered
+        correlation = (positions @ centered) / np.sqrt(n * (n * n - 1) / 12.0 * spread) if spread > 0 else 0.0
         
-        if slope > 0.1:
+        if correlation > 0.1:
             return 'improving'
-        elif slope < -0.1:
+        elif correlation < -0.1:
             return 'declining'
         else:
             return 'stable'
     
-    def _calculate_improvement_rate(self, session_data: List[Dict]) -> float:
+    def _calculate_improvement_rate(self, scores: np.ndarray) -> float:
         """Calculate rate of improvement during session"""
-        if len(session_data) < 2:
+        if len(scores) < 2:
             return 0.0
         
-        scores = [d['overall_score'] for d in session_data]
-        first_half_avg = np.mean(scores[:len(scores)//2])
-        second_half_avg = np.mean(scores[len(scores)//2:])
+        half = len(scores) // 2
+        first_half_avg = scores[:half].mean()
+        second_half_avg = scores[half:].mean()
         
         return second_half_avg - first_half_avg
     
-    def _analyze_engagement_pattern(self, session_data: List[Dict]) -> Dict[str, Any]:
+    def _analyze_engagement_pattern(self, engagement_scores: np.ndarray) -> Dict[str, Any]:
         """Analyze engagement patterns throughout session"""
-        engagement_scores = [d['metrics']['engagement_indicator'] for d in session_data]
-        
         return {
-            'average_engagement': np.mean(engagement_scores),
-            'engagement_stability': 1.0 - np.std(engagement_scores),
-            'peak_engagement': max(engagement_scores),
+            'average_engagement': engagement_scores.mean(),
+            'engagement_stability': 1.0 - engagement_scores.std(ddof=0),
+            'peak_engagement': engagement_scores.max(),
             'engagement_trend': self._calculate_trend(engagement_scores)
         }
     
-    def _calculate_learning_velocity(self, session_data: List[Dict]) -> float:
+    def _calculate_learning_velocity(self, progress_scores: np.ndarray) -> float:
         """Calculate how quickly learning is occurring"""
-        progress_scores = [d['metrics']['learning_progress'] for d in session_data]
-        time_points = [i for i in range(len(progress_scores))]
-        
         if len(progress_scores) < 2:
             return 0.0
         
@@ -401,6 +745,12 @@ class RealTimeFeedbackProcessor:
             'performance_feedback': 0.8,  # Based on assessment results
             'engagement_feedback': 0.6   # Based on engagement metrics
         }
+        self._lock = threading.Lock()
+        # user_id -> (monotonic load time, profile settings), least recently used first
+        self._profile_settings: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Learning model errors logged per user in the current minute
+        self._error_log_minute = None
+        self._error_log_counts: Dict[str, int] = {}
         
     def process_feedback(self, user_id: str, session_id: str, 
                         feedback_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -435,65 +785,12 @@ class RealTimeFeedbackProcessor:
             'engagement_feedback': []
         }
         
-        # Explicit feedback (ratings, comments)
-        if 'user_rating' in feedback_data:
-            categories['explicit_feedback'].append({
-                'type': 'rating',
-                'value': feedback_data['user_rating'],
-                'weight': 1.0
-            })
-        
-        if 'user_comment' in feedback_data:
-            categories['explicit_feedback'].append({
-                'type': 'comment',
-                'sentiment': self._analyze_comment_sentiment(feedback_data['user_comment']),
-                'weight': 0.8
-            })
-        
-        # Behavioral feedback
-        if 'response_time' in feedback_data:
-            categories['behavioral_feedback'].append({
-                'type': 'response_time',
-                'value': self._analyze_response_time(feedback_data['response_time']),
-                'weight': 0.6
-            })
-        
-        if 'navigation_pattern' in feedback_data:
-            categories['behavioral_feedback'].append({
-                'type': 'navigation',
-                'pattern': feedback_data['navigation_pattern'],
-                'weight': 0.5
-            })
-        
-        # Performance feedback
-        if 'quiz_score' in feedback_data:
-            categories['performance_feedback'].append({
-                'type': 'assessment',
-                'score': feedback_data['quiz_score'],
-                'weight': 0.9
-            })
-        
-        if 'concept_mastery' in feedback_data:
-            categories['performance_feedback'].append({
-                'type': 'mastery',
-                'level': feedback_data['concept_mastery'],
-                'weight': 0.8
-            })
-        
-        # Engagement feedback
-        if 'session_duration' in feedback_data:
-            categories['engagement_feedback'].append({
-                'type': 'duration',
-                'value': self._analyze_session_duration(feedback_data['session_duration']),
-                'weight': 0.6
-            })
-        
-        if 'interaction_frequency' in feedback_data:
-            categories['engagement_feedback'].append({
-                'type': 'frequency',
-                'value': feedback_data['interaction_frequency'],
-                'weight': 0.5
-            })
+        for key, category, feedback_type, field, analyzer, weight in _FEEDBACK_SIGNALS:
+            if key in feedback_data:
+                value = feedback_data[key]
+                if analyzer is not None:
+                    value = getattr(self, analyzer)(value)
+                categories[category].append({'type': feedback_type, field: value, 'weight': weight})
         
         return categories
     
@@ -507,8 +804,9 @@ class RealTimeFeedbackProcessor:
             category_weight = self.feedback_weights[category]
             
             if feedback_items:
-                category_score = np.mean([item.get('value', item.get('score', 0.5)) * item['weight'] 
-                                        for item in feedback_items])
+                # Categories hold one or two items; a plain mean avoids NumPy dispatch on tiny lists
+                category_score = sum(item.get('value', item.get('score', 0.5)) * item['weight']
+                                     for item in feedback_items) / len(feedback_items)
                 total_weighted_score += category_score * category_weight
                 total_weight += category_weight
         
@@ -569,8 +867,7 @@ class RealTimeFeedbackProcessor:
         
         # Get current user profile
         try:
-            user_profile = student_analyzer.get_student_profile(user_id)
-            current_preferences = user_profile.get('profile', {}).get('settings', {})
+            current_preferences = self._get_profile_settings(user_id)
             
             model_updates = {}
             
@@ -605,10 +902,41 @@ class RealTimeFeedbackProcessor:
             
             return model_updates
             
-        except Exception as e:
-            print(f"Error updating learning model for user {user_id}: {e}")
+        except Exception:
+            if self._should_log_error(user_id):
+                logger.exception("Error updating learning model for user %s", user_id)
             return {}
     
+    def _should_log_error(self, user_id: str) -> bool:
+        """Whether another learning model error for this user fits in the current minute's log budget"""
+        minute = int(time.monotonic() // 60)
+        with self._lock:
+            if minute != self._error_log_minute:
+                self._error_log_minute = minute
+                self._error_log_counts = {}
+            count = self._error_log_counts.get(user_id, 0) + 1
+            self._error_log_counts[user_id] = count
+        return count <= LEARNING_MODEL_ERROR_LOGS_PER_MINUTE
+    
+    def _get_profile_settings(self, user_id: str) -> Dict[str, Any]:
+        """The user's profile settings; the full profile runs several queries, so it is loaded
+        at most once per FEEDBACK_PROFILE_TTL"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._profile_settings.get(user_id)
+            if cached is not None and now - cached[0] < FEEDBACK_PROFILE_TTL:
+                self._profile_settings.move_to_end(user_id)
+                return cached[1]
+        
+        user_profile = student_analyzer.get_student_profile(user_id)
+        settings = user_profile.get('profile', {}).get('settings', {})
+        with self._lock:
+            self._profile_settings[user_id] = (now, settings)
+            self._profile_settings.move_to_end(user_id)
+            while len(self._profile_settings) > FEEDBACK_PROFILE_CACHE_SIZE:
+                self._profile_settings.popitem(last=False)
+        return settings
+    
     def _get_immediate_adjustments(self, adaptations: Dict[str, Any]) -> Dict[str, Any]:
         """Get adjustments to apply immediately to the next interaction"""
         
@@ -637,6 +965,74 @@ class RealTimeFeedbackProcessor:
         return immediate_adjustments
 
 
+class SemanticResponseCache:
+    """Raw LLM responses keyed by user-message embedding within a per-learner context bucket.
+    
+    The message is embedded rather than the templated prompt: the template boilerplate would
+    dominate the embedding and make different questions on one topic look alike. Opt-in via
+    LLM_ENABLE_SEMANTIC_RESPONSE_CACHE.
+    """
+    
+    def __init__(self, threshold: float = SEMANTIC_RESPONSE_THRESHOLD,
+                 max_buckets: int = SEMANTIC_RESPONSE_BUCKETS,
+                 max_entries: int = SEMANTIC_RESPONSE_ENTRIES_PER_BUCKET):
+        self.threshold = threshold
+        self.max_buckets = max_buckets
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # bucket -> [(normalized embedding, response)]
+        self._buckets: "OrderedDict[tuple, List[tuple]]" = OrderedDict()
+    
+    @property
+    def enabled(self) -> bool:
+        # Shares the sentence-transformers model (and its availability) with the context engine
+        return LLMConfig.ENABLE_SEMANTIC_RESPONSE_CACHE and sentence_embedder.enabled
+    
+    def embed(self, message: str) -> Optional[np.ndarray]:
+        """Encode a user message as a unit vector, or None when embeddings are unavailable"""
+        return sentence_embedder.embed(message)
+    
+    @staticmethod
+    def bucket(context: LearningContext, template_key: str) -> tuple:
+        """Context signature; the prompt carries the learner's own profile and concepts, so
+        responses are only reused for the same learner on the same topic and template, in the
+        same state"""
+        return (context.user_id, template_key, context.current_topic, context.emotional_state.value,
+                context.cognitive_load.value, context.preferred_modality.value,
+                round(context.confidence_level, 1))
+    
+    def lookup(self, bucket: tuple, vector: np.ndarray) -> Optional[str]:
+        """Return the closest cached response in the bucket, if similar enough"""
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            if not entries:
+                return None
+            self._buckets.move_to_end(bucket)
+            vectors = [cached_vector for cached_vector, _ in entries]
+            responses = [response for _, response in entries]
+        
+        # Cosine similarity is a dot product on normalized vectors
+        similarities = np.stack(vectors) @ vector
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return responses[best]
+    
+    def store(self, bucket: tuple, vector: np.ndarray, response: str):
+        """Remember a fresh LLM response for later near-duplicate prompts"""
+        with self._lock:
+            entries = self._buckets.setdefault(bucket, [])
+            entries.append((vector, response))
+            if len(entries) > self.max_entries:
+                del entries[0]
+            self._buckets.move_to_end(bucket)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+
+semantic_response_cache = SemanticResponseCache()
+
+
 class EnhancedPersonalizationEngine(LLMBaseService):
     """Enhanced personalization engine with advanced context integration"""
     
@@ -665,23 +1061,33 @@ class EnhancedPersonalizationEngine(LLMBaseService):
             )
             
             # 3. Generate AI response using personalized prompt
-            ai_response = await self._generate_contextual_response(personalized_prompt, learning_context)
+            ai_response = await self._generate_contextual_response(
+                personalized_prompt, learning_context, user_message, 'explain'
+            )
             
             # 4. Track interaction effectiveness
             interaction_data = self._build_interaction_data(
                 user_message, ai_response, learning_context, additional_context
             )
             
-            effectiveness_metrics = self.effectiveness_tracker.track_interaction_effectiveness(
+            # Tracking and feedback processing are independent and both block on cache/profile
+            # lookups, so they run side by side off the event loop. Feedback processing may load
+            # the profile through the ORM, so it runs on the request's sync thread, whose
+            # connection Django closes when the request finishes
+            loop = asyncio.get_running_loop()
+            tracking = loop.run_in_executor(
+                None, self.effectiveness_tracker.track_interaction_effectiveness,
                 user_id, session_id, interaction_data
             )
             
             # 5. Process any feedback for real-time adaptation
             if additional_context and 'feedback' in additional_context:
-                feedback_results = self.feedback_processor.process_feedback(
+                processing = sync_to_async(self.feedback_processor.process_feedback)(
                     user_id, session_id, additional_context['feedback']
                 )
+                effectiveness_metrics, feedback_results = await asyncio.gather(tracking, processing)
             else:
+                effectiveness_metrics = await tracking
                 feedback_results = None
             
             # 6. Generate adaptive recommendations for next interaction
@@ -713,17 +1119,53 @@ class EnhancedPersonalizationEngine(LLMBaseService):
                 'fallback_response': await self._generate_fallback_response(user_message)
             }
     
+    async def generate_ultra_personalized_responses_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create ultra-personalized responses for many learners concurrently
+        
+        Each request carries user_id, session_id, user_message and optionally
+        response_time and additional_context. In-flight requests are capped at
+        LLM_MAX_CONCURRENT_REQUESTS; results come back in request order.
+        """
+        
+        # Created per call: a semaphore binds to the event loop it is first awaited on
+        semaphore = asyncio.Semaphore(LLMConfig.MAX_CONCURRENT_REQUESTS)
+        
+        async def generate(request: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.create_ultra_personalized_response(
+                    request['user_id'], request['session_id'], request['user_message'],
+                    request.get('response_time', 0.0), request.get('additional_context')
+                )
+        
+        return await asyncio.gather(*(generate(request) for request in requests))
+    
     async def _generate_contextual_response(self, personalized_prompt: str, 
-                                          context: LearningContext) -> str:
+                                          context: LearningContext,
+                                          user_message: Optional[str] = None,
+                                          intent: str = 'explain') -> str:
         """Generate AI response using contextual prompt"""
         
         try:
-            if self.langchain_llm:
-                # Use LangChain for more sophisticated processing
-                response = await self._execute_langchain_response(personalized_prompt, context)
-            else:
-                # Use simple OpenAI client
-                response = self.simple_chat(personalized_prompt)
+            # Similar messages from the learner in the same context bucket reuse a cached response;
+            # only the raw LLM output is cached, post-processing below still runs on hits
+            vector = None
+            self._ensure_initialized()
+            if user_message and self.client and semantic_response_cache.enabled:
+                vector = await asyncio.get_running_loop().run_in_executor(
+                    None, semantic_response_cache.embed, user_message
+                )
+            bucket = semantic_response_cache.bucket(context, _select_template_key(intent, context))
+            response = semantic_response_cache.lookup(bucket, vector) if vector is not None else None
+            
+            if response is None:
+                if self.langchain_llm:
+                    # Use LangChain for more sophisticated processing
+                    response = await self._execute_langchain_response(personalized_prompt, context)
+                else:
+                    # Use the async OpenAI client so the event loop is not blocked on network I/O
+                    response = await self._chat_async(personalized_prompt)
+                if vector is not None:
+                    semantic_response_cache.store(bucket, vector, response)
             
             # Post-process response based on context
             processed_response = self._post_process_response(response, context)
@@ -739,7 +1181,22 @@ class EnhancedPersonalizationEngine(LLMBaseService):
         
         # This would implement more sophisticated LangChain chains
         # For now, using simple approach
-        return self.simple_chat(prompt)
+        return await self._chat_async(prompt)
+    
+    async def _chat_async(self, prompt: str) -> str:
+        """Chat completion on the shared AsyncOpenAI client"""
+        
+        self._ensure_initialized()
+        if not self.client:
+            # simple_chat returns the unavailable notice without touching the network
+            return self.simple_chat(prompt)
+        
+        response = await llm_factory.get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            stream=False
+        )
+        return response.choices[0].message.content
     
     def _post_process_response(self, response: str, context: LearningContext) -> str:
         """Post-process AI response based on learning context"""
@@ -1,8 +1,13 @@
 """
 Personalization Engine - Specialized service for handling user personalization
 """
+import copy
 import json
-from typing import List, Dict, Any, Optional
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
 
 try:
     from langchain.chains import LLMChain
@@ -11,15 +16,116 @@ try:
 except ImportError:
     LANGCHAIN_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 from ..core.base_service import LLMBaseService
 from .memory_service import memory_service
 from .student_analyzer import student_analyzer
 from apps.learning_plans.student_notes_models import StudentQuestion, TeacherNotes
 
 
+# Maximum number of sessions with cached profile+plan prompt parts per engine
+PROMPT_PREFIX_CACHE_SIZE = 1024
+
+# Background executor for teacher-note writes that must not delay replies
+_notes_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="advisor-notes"
+)
+
+
+def _run_note_task(func, *args):
+    """Run a note-recording task and release its thread's database connection"""
+    from django.db import close_old_connections
+    try:
+        func(*args)
+    finally:
+        close_old_connections()
+
+
+# Fixed tags and action items attached to advisor teacher notes
+_RECOMMEND_TAGS_PREFIX = ('学习规划', '个性化建议')
+_RECOMMEND_TAGS_SUFFIX = ('顾问推荐',)
+_RECOMMEND_ACTION_ITEMS = (
+    "按照个性化计划执行学习",
+    "定期检查学习进度",
+    "根据学习效果调整计划"
+)
+_CONVERSATION_TAGS_PREFIX = ('学习咨询', '顾问对话')
+
+# Keywords signalling that a student message needs teacher attention
+DIFFICULTY_KEYWORDS = ('困难', '难懂', '不明白', '听不懂', '跟不上', '太难', '很难')
+FRUSTRATION_KEYWORDS = ('放弃', '不想学', '没兴趣', '没时间', '压力大', '焦虑')
+PROGRESS_KEYWORDS = ('进度', '慢', '快', '跟不上', '落后')
+MOTIVATION_KEYWORDS = ('动力', '目标', '方向', '迷茫', '不知道')
+
+# A message can only contain a keyword if it contains that keyword's first character
+_ATTENTION_TRIGGER_CHARS = frozenset(
+    keyword[0]
+    for keywords in (DIFFICULTY_KEYWORDS, FRUSTRATION_KEYWORDS, PROGRESS_KEYWORDS, MOTIVATION_KEYWORDS)
+    for keyword in keywords
+)
+
+
+@dataclass(frozen=True, slots=True)
+class StudentFeatures:
+    """Immutable view of the student profile fields used for personalization"""
+    learning_style: str
+    pace: str
+    education_level: str
+    tone: str
+    attention_span: int
+    strengths: tuple
+    weaknesses: tuple
+
+
+@dataclass(slots=True)
+class MessageAnalysis:
+    """Result of screening a student message for teacher attention"""
+    needs_attention: bool = False
+    message_type: str = 'general'
+    concern: str = ''
+    observation: str = ''
+    priority: str = 'low'
+    suggested_actions: List[str] = field(default_factory=list)
+
+
+def _dumps_plan(current_plan: Any) -> str:
+    """Serialize a learning plan as indented JSON for prompt embedding"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            current_plan, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+    return json.dumps(current_plan, ensure_ascii=False, indent=2, default=str)
+
+
 class PersonalizationEngine(LLMBaseService):
     """Specialized service for handling user personalization and adaptation"""
     
+    def __init__(self):
+        super().__init__()
+        # LRU of session_id -> (profile values, plan snapshot, (prefix, instructions)) prompt parts
+        self._prompt_prefix_cache: "OrderedDict[str, Tuple[tuple, Any, Tuple[str, str]]]" = OrderedDict()
+        self._prompt_prefix_lock = threading.Lock()
+    
+    def _extract_features(self, student_profile: Dict[str, Any]) -> StudentFeatures:
+        """Extract the personalization feature view of a student profile"""
+        
+        settings = student_profile['profile']['settings']
+        pattern = student_profile['learning_pattern']
+        return StudentFeatures(
+            learning_style=settings.get('preferred_style', 'Practical'),
+            pace=settings.get('preferred_pace', 'normal'),
+            education_level=settings.get('education_level', 'undergraduate'),
+            tone=settings.get('tone', 'friendly'),
+            attention_span=pattern.get('attention_span_minutes', 30),
+            strengths=tuple(pattern.get('strengths', [])),
+            weaknesses=tuple(pattern.get('weaknesses', []))
+        )
+    
     def create_personalized_plan(
         self, 
         topic: str, 
@@ -200,9 +306,12 @@ class PersonalizationEngine(LLMBaseService):
             if session_id and memory_service:
                 context = memory_service.get_conversation_context(session_id)
             
+            # Feature view shared by the prompt and the adaptation summary
+            features = self._extract_features(student_profile)
+            
             # Build personalized chat prompt
             personalized_prompt = self._build_personalized_chat_prompt(
-                message, current_plan, student_profile, learning_insights, context
+                message, current_plan, student_profile, learning_insights, context, features, session_id
             )
             
             if not self.langchain_llm or not LANGCHAIN_AVAILABLE:
@@ -250,7 +359,7 @@ class PersonalizationEngine(LLMBaseService):
             
             # Add personalization metadata
             result['personalized'] = True
-            result['student_adaptations'] = self._generate_adaptation_summary(student_profile)
+            result['student_adaptations'] = self._generate_adaptation_summary(features)
             result['md_updated'] = md_updated
             if md_error:
                 result['md_error'] = md_error
@@ -299,9 +408,12 @@ class PersonalizationEngine(LLMBaseService):
             if session_id and memory_service:
                 context = await memory_service.get_conversation_context_async(session_id)
             
+            # Feature view shared by the prompt and the adaptation summary
+            features = self._extract_features(student_profile)
+            
             # Build personalized chat prompt
             personalized_prompt = self._build_personalized_chat_prompt(
-                message, current_plan, student_profile, learning_insights, context
+                message, current_plan, student_profile, learning_insights, context, features, session_id
             )
             
             if not self.langchain_llm or not LANGCHAIN_AVAILABLE:
@@ -326,7 +438,7 @@ class PersonalizationEngine(LLMBaseService):
             
             # Add personalization metadata
             result['personalized'] = True
-            result['student_adaptations'] = self._generate_adaptation_summary(student_profile)
+            result['student_adaptations'] = self._generate_adaptation_summary(features)
             
             # Async update memory
             if session_id and memory_service:
@@ -359,16 +471,12 @@ class PersonalizationEngine(LLMBaseService):
     ) -> str:
         """Build personalized learning plan prompt"""
         
-        # Basic information
-        settings = student_profile['profile']['settings']
-        pattern = student_profile['learning_pattern']
-        question_analysis = student_profile['question_analysis']
-        
         # Get student characteristics
-        learning_style = settings.get('preferred_style', 'Practical')
-        pace = settings.get('preferred_pace', 'normal')
-        education_level = settings.get('education_level', 'undergraduate')
-        attention_span = pattern.get('attention_span_minutes', 30)
+        features = self._extract_features(student_profile)
+        question_analysis = student_profile['question_analysis']
+        learning_style = features.learning_style
+        pace = features.pace
+        attention_span = features.attention_span
         
         # Build personalization requirements
         personalization_requirements = []
@@ -394,14 +502,14 @@ class PersonalizationEngine(LLMBaseService):
             personalization_requirements.append("可以安排长时间的深度学习会话和复杂项目")
         
         # Learning difficulty adaptation
-        weaknesses = pattern.get('weaknesses', [])
+        weaknesses = features.weaknesses
         if 'comprehension' in weaknesses:
             personalization_requirements.append("提供更多基础概念解释和循序渐进的学习路径")
         if 'attention_difficulties' in weaknesses:
             personalization_requirements.append("使用结构化的学习计划，明确的学习目标和里程碑")
         
         # Learning strengths utilization
-        strengths = pattern.get('strengths', [])
+        strengths = features.strengths
         if 'logical' in strengths:
             personalization_requirements.append("安排逻辑推理和系统性思考的学习活动")
         if 'creative' in strengths:
@@ -423,7 +531,7 @@ class PersonalizationEngine(LLMBaseService):
 学生特征分析：
 - 学习风格：{learning_style}
 - 学习节奏偏好：{pace}
-- 教育水平：{education_level}
+- 教育水平：{features.education_level}
 - 注意力持续时间：{attention_span}分钟
 - 学习优势：{', '.join(strengths) if strengths else '待发现'}
 - 需要改进的方面：{', '.join(weaknesses) if weaknesses else '暂无'}
@@ -469,6 +577,19 @@ class PersonalizationEngine(LLMBaseService):
         topic: str, 
         plan_result: List[Dict[str, Any]], 
         student_profile: Dict[str, Any]
+    ):
+        """Record advisor recommendation in the background, off the response path"""
+        _notes_executor.submit(
+            _run_note_task, self._do_record_advisor_recommendation,
+            user_id, topic, plan_result, student_profile
+        )
+
+    def _do_record_advisor_recommendation(
+        self, 
+        user_id: str, 
+        topic: str, 
+        plan_result: List[Dict[str, Any]], 
+        student_profile: Dict[str, Any]
     ):
         """Record advisor recommendation to database (as teacher notes)"""
         
@@ -514,12 +635,8 @@ class PersonalizationEngine(LLMBaseService):
                     'preferred_pace': pace,
                     'adaptations_made': adaptations
                 },
-                action_items=[
-                    "按照个性化计划执行学习",
-                    "定期检查学习进度",
-                    "根据学习效果调整计划"
-                ],
-                tags=['学习规划', '个性化建议', topic, '顾问推荐']
+                action_items=list(_RECOMMEND_ACTION_ITEMS),
+                tags=[*_RECOMMEND_TAGS_PREFIX, topic, *_RECOMMEND_TAGS_SUFFIX]
             )
             
         except Exception as e:
@@ -532,59 +649,105 @@ class PersonalizationEngine(LLMBaseService):
         current_plan: Dict[str, Any], 
         student_profile: Dict[str, Any], 
         learning_insights: Dict[str, Any],
-        context: str = ""
+        context: str = "",
+        features: Optional[StudentFeatures] = None,
+        session_id: Optional[str] = None
     ) -> str:
         """Build personalized chat prompt"""
         
-        # Get student characteristics
-        settings = student_profile['profile']['settings']
-        pattern = student_profile['learning_pattern']
-        question_analysis = student_profile['question_analysis']
-        recent_performance = student_profile.get('recent_performance', {})
+        if features is None:
+            features = self._extract_features(student_profile)
         
-        # Student characteristics summary
-        learning_style = settings.get('preferred_style', 'Practical')
-        pace = settings.get('preferred_pace', 'normal')
-        education_level = settings.get('education_level', 'undergraduate')
-        tone = settings.get('tone', 'friendly')
+        # Profile and plan sections rarely change between turns of a session,
+        # only the student message does
+        prefix, instructions = self._get_static_prompt_parts(
+            student_profile, current_plan, features, session_id
+        )
+        return prefix + self._build_dynamic_suffix(message, context) + instructions
+
+    def _get_static_prompt_parts(
+        self, 
+        student_profile: Dict[str, Any], 
+        current_plan: Dict[str, Any],
+        features: StudentFeatures,
+        session_id: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """Get the session's cached profile+plan prompt parts, rebuilding them only when inputs change"""
         
-        # Learning pattern characteristics
-        strengths = pattern.get('strengths', [])
-        weaknesses = pattern.get('weaknesses', [])
-        attention_span = pattern.get('attention_span_minutes', 30)
+        if not session_id:
+            return self._build_static_prefix(student_profile, current_plan, features)
         
-        # Recent performance
-        weekly_summary = recent_performance.get('weekly_summary', {})
-        avg_effectiveness = weekly_summary.get('avg_effectiveness', 0)
-        consistency_score = weekly_summary.get('consistency_score', 0)
+        # The profile is compared through the few values the parts show and the plan against a
+        # snapshot of the one they were built from, so a hit serializes neither
+        question_analysis = student_profile['question_analysis']
+        weekly_summary = student_profile.get('recent_performance', {}).get('weekly_summary') or {}
+        profile_values = (
+            features,
+            weekly_summary.get('avg_effectiveness', 0),
+            weekly_summary.get('consistency_score', 0),
+            question_analysis.get('resolved_rate', 0),
+            tuple(question_analysis.get('question_types', {})),
+        )
+        
+        with self._prompt_prefix_lock:
+            cached = self._prompt_prefix_cache.get(session_id)
+            if cached is not None:
+                self._prompt_prefix_cache.move_to_end(session_id)
+        if cached is not None and cached[0] == profile_values and cached[1] == current_plan:
+            return cached[2]
+        
+        parts = self._build_static_prefix(student_profile, current_plan, features)
+        snapshot = copy.deepcopy(current_plan)
+        with self._prompt_prefix_lock:
+            self._prompt_prefix_cache[session_id] = (profile_values, snapshot, parts)
+            self._prompt_prefix_cache.move_to_end(session_id)
+            if len(self._prompt_prefix_cache) > PROMPT_PREFIX_CACHE_SIZE:
+                self._prompt_prefix_cache.popitem(last=False)
+        return parts
+
+    def _build_static_prefix(
+        self, 
+        student_profile: Dict[str, Any], 
+        current_plan: Dict[str, Any],
+        features: StudentFeatures
+    ) -> Tuple[str, str]:
+        """Build the session-invariant prompt parts surrounding the student message"""
         
-        # Build context-enhanced message
-        enhanced_message = message
-        if context:
-            enhanced_message = f"对话历史：{context}\n\n当前消息：{message}"
+        # Get student characteristics
+        question_analysis = student_profile['question_analysis']
+        weekly_summary = student_profile.get('recent_performance', {}).get('weekly_summary') or {}
         
-        prompt = f"""你是一位专业的个性化教育规划顾问。请根据学生的特点和学习情况，提供个性化的建议和回复。
+        # Student characteristics used in both prompt parts
+        learning_style = features.learning_style
+        pace = features.pace
+        tone = features.tone
+        strengths = features.strengths
+        weaknesses = features.weaknesses
+        
+        prefix = f"""你是一位专业的个性化教育规划顾问。请根据学生的特点和学习情况，提供个性化的建议和回复。
 
 学生特征档案：
 - 学习风格：{learning_style}
 - 学习节奏偏好：{pace} 
-- 教育水平：{education_level}
+- 教育水平：{features.education_level}
 - 沟通语调偏好：{tone}
-- 注意力持续时间：{attention_span}分钟
+- 注意力持续时间：{features.attention_span}分钟
 - 学习优势：{', '.join(strengths) if strengths else '待发现'}
 - 需要改进的方面：{', '.join(weaknesses) if weaknesses else '暂无'}
 
 学习表现分析：
-- 最近学习效果评分：{avg_effectiveness}/5
-- 学习一致性评分：{consistency_score}
+- 最近学习效果评分：{weekly_summary.get('avg_effectiveness', 0)}/5
+- 学习一致性评分：{weekly_summary.get('consistency_score', 0)}
 - 问题解决率：{question_analysis.get('resolved_rate', 0)}%
 - 常见问题类型：{', '.join(question_analysis.get('question_types', {}).keys())}
 
 当前学习计划：
-{json.dumps(current_plan, ensure_ascii=False, indent=2)}
+{_dumps_plan(current_plan)}
 
 学生消息：
-{enhanced_message}
+"""
+        
+        instructions = f"""
 
 请根据学生的特征和学习情况，提供个性化的回复，要求：
 
@@ -604,7 +767,15 @@ class PersonalizationEngine(LLMBaseService):
   "student_insights": "对学生学习状态的观察"
 }}"""
         
-        return prompt
+        return prefix, instructions
+
+    def _build_dynamic_suffix(self, message: str, context: str = "") -> str:
+        """Build the per-turn message section of the chat prompt"""
+        
+        # Build context-enhanced message
+        if context:
+            return f"对话历史：{context}\n\n当前消息：{message}"
+        return message
 
     def _analyze_and_record_conversation(
         self, 
@@ -612,38 +783,55 @@ class PersonalizationEngine(LLMBaseService):
         message: str, 
         response: Dict[str, Any], 
         student_profile: Dict[str, Any]
+    ):
+        """Analyze and record the conversation in the background, off the response path"""
+        _notes_executor.submit(
+            _run_note_task, self._do_analyze_and_record_conversation,
+            user_id, message, response, student_profile
+        )
+
+    def _do_analyze_and_record_conversation(
+        self, 
+        user_id: str, 
+        message: str, 
+        response: Dict[str, Any], 
+        student_profile: Dict[str, Any]
     ):
         """Analyze conversation content and record important observations"""
         
         from apps.authentication.models import User
         
         try:
-            user = User.objects.get(uuid=user_id)
-            
             # Analyze message type and content
             message_analysis = self._analyze_student_message(message, student_profile)
             
             # If important patterns or content needing attention are discovered, record notes
-            if message_analysis['needs_attention']:
+            if message_analysis.needs_attention:
+                user = User.objects.get(uuid=user_id)
+                reply = response.get('reply', '')
+                message_excerpt = message[:100] + ('...' if len(message) > 100 else '')
+                reply_excerpt = reply[:100] + ('...' if len(reply) > 100 else '')
                 
                 TeacherNotes.objects.create(
                     user=user,
                     course_progress=None,
                     note_type='interaction',
-                    priority=message_analysis['priority'],
-                    title=f"学习咨询对话 - {message_analysis['message_type']}",
-                    content=f"学生咨询：{message[:100]}{'...' if len(message) > 100 else ''}。"
-                           f"AI回复要点：{response.get('reply', '')[:100]}{'...' if len(response.get('reply', '')) > 100 else ''}。"
-                           f"观察：{message_analysis['observation']}",
+                    priority=message_analysis.priority,
+                    title=f"学习咨询对话 - {message_analysis.message_type}",
+                    content="".join([
+                        "学生咨询：", message_excerpt, "。",
+                        "AI回复要点：", reply_excerpt, "。",
+                        "观察：", message_analysis.observation
+                    ]),
                     observations={
-                        'message_type': message_analysis['message_type'],
-                        'student_concern': message_analysis['concern'],
-                        'advisor_response': response.get('reply', '')[:200],
+                        'message_type': message_analysis.message_type,
+                        'student_concern': message_analysis.concern,
+                        'advisor_response': reply[:200],
                         'recommendations_given': response.get('recommendations', []),
                         'student_insights': response.get('student_insights', '')
                     },
-                    action_items=message_analysis['suggested_actions'],
-                    tags=['学习咨询', '顾问对话', message_analysis['message_type']]
+                    action_items=message_analysis.suggested_actions,
+                    tags=[*_CONVERSATION_TAGS_PREFIX, message_analysis.message_type]
                 )
                 
         except Exception as e:
@@ -654,70 +842,57 @@ class PersonalizationEngine(LLMBaseService):
         self, 
         message: str, 
         student_profile: Dict[str, Any]
-    ) -> Dict[str, Any]:
+    ) -> MessageAnalysis:
         """Analyze student message, determine if special attention is needed"""
         
-        analysis = {
-            'needs_attention': False,
-            'message_type': 'general',
-            'concern': '',
-            'observation': '',
-            'priority': 'low',
-            'suggested_actions': []
-        }
+        # Fast path: no keyword can match without one of its first characters
+        if message.isascii() or _ATTENTION_TRIGGER_CHARS.isdisjoint(message):
+            return MessageAnalysis()
         
         message_lower = message.lower()
         
         # Detect difficulty and frustration expressions
-        difficulty_keywords = ['困难', '难懂', '不明白', '听不懂', '跟不上', '太难', '很难']
-        frustration_keywords = ['放弃', '不想学', '没兴趣', '没时间', '压力大', '焦虑']
-        progress_keywords = ['进度', '慢', '快', '跟不上', '落后']
-        motivation_keywords = ['动力', '目标', '方向', '迷茫', '不知道']
-        
-        if any(keyword in message_lower for keyword in difficulty_keywords):
-            analysis.update({
-                'needs_attention': True,
-                'message_type': 'difficulty',
-                'concern': '学习困难',
-                'observation': '学生表达了学习困难，需要额外支持',
-                'priority': 'high',
-                'suggested_actions': ['提供简化的学习资源', '调整学习计划难度', '安排额外辅导']
-            })
-        elif any(keyword in message_lower for keyword in frustration_keywords):
-            analysis.update({
-                'needs_attention': True,
-                'message_type': 'frustration',
-                'concern': '学习挫折',
-                'observation': '学生表现出学习挫折感，需要心理支持和动机激励',
-                'priority': 'high',
-                'suggested_actions': ['提供鼓励和支持', '重新评估学习目标', '调整学习方法']
-            })
-        elif any(keyword in message_lower for keyword in progress_keywords):
-            analysis.update({
-                'needs_attention': True,
-                'message_type': 'progress_concern',
-                'concern': '进度担忧',
-                'observation': '学生对学习进度有担忧',
-                'priority': 'medium',
-                'suggested_actions': ['评估当前进度', '调整学习计划', '提供进度反馈']
-            })
-        elif any(keyword in message_lower for keyword in motivation_keywords):
-            analysis.update({
-                'needs_attention': True,
-                'message_type': 'motivation',
-                'concern': '动机问题',
-                'observation': '学生在学习动机或方向上需要指导',
-                'priority': 'medium',
-                'suggested_actions': ['明确学习目标', '提供动机激励', '制定短期成就']
-            })
-        
-        return analysis
-
-    def _generate_adaptation_summary(self, student_profile: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate personalization adaptation summary"""
+        if any(keyword in message_lower for keyword in DIFFICULTY_KEYWORDS):
+            return MessageAnalysis(
+                needs_attention=True,
+                message_type='difficulty',
+                concern='学习困难',
+                observation='学生表达了学习困难，需要额外支持',
+                priority='high',
+                suggested_actions=['提供简化的学习资源', '调整学习计划难度', '安排额外辅导']
+            )
+        elif any(keyword in message_lower for keyword in FRUSTRATION_KEYWORDS):
+            return MessageAnalysis(
+                needs_attention=True,
+                message_type='frustration',
+                concern='学习挫折',
+                observation='学生表现出学习挫折感，需要心理支持和动机激励',
+                priority='high',
+                suggested_actions=['提供鼓励和支持', '重新评估学习目标', '调整学习方法']
+            )
+        elif any(keyword in message_lower for keyword in PROGRESS_KEYWORDS):
+            return MessageAnalysis(
+                needs_attention=True,
+                message_type='progress_concern',
+                concern='进度担忧',
+                observation='学生对学习进度有担忧',
+                priority='medium',
+                suggested_actions=['评估当前进度', '调整学习计划', '提供进度反馈']
+            )
+        elif any(keyword in message_lower for keyword in MOTIVATION_KEYWORDS):
+            return MessageAnalysis(
+                needs_attention=True,
+                message_type='motivation',
+                concern='动机问题',
+                observation='学生在学习动机或方向上需要指导',
+                priority='medium',
+                suggested_actions=['明确学习目标', '提供动机激励', '制定短期成就']
+            )
         
-        settings = student_profile['profile']['settings']
-        pattern = student_profile['learning_pattern']
+        return MessageAnalysis()
+
+    def _generate_adaptation_summary(self, features: StudentFeatures) -> Dict[str, Any]:
+        """Generate personalization adaptation summary"""
         
         adaptations = {
             'style_adaptation': '',
@@ -728,7 +903,7 @@ class PersonalizationEngine(LLMBaseService):
         }
         
         # Learning style adaptation
-        learning_style = settings.get('preferred_style')
+        learning_style = features.learning_style
         if learning_style == 'Visual':
             adaptations['style_adaptation'] = '提供了图表和视觉化内容建议'
         elif learning_style == 'Practical':
@@ -737,7 +912,7 @@ class PersonalizationEngine(LLMBaseService):
             adaptations['style_adaptation'] = '提供了详细的理论解释和文字说明'
         
         # Pace adaptation
-        pace = settings.get('preferred_pace')
+        pace = features.pace
         if pace == 'slow':
             adaptations['pace_adaptation'] = '建议延长学习时间，增加复习环节'
         elif pace == 'fast':
@@ -746,7 +921,7 @@ class PersonalizationEngine(LLMBaseService):
             adaptations['pace_adaptation'] = '保持标准学习节奏'
         
         # Attention adaptation
-        attention_span = pattern.get('attention_span_minutes', 30)
+        attention_span = features.attention_span
         if attention_span < 20:
             adaptations['attention_adaptation'] = '建议短时间学习会话，频繁休息'
         elif attention_span > 60:
@@ -755,8 +930,7 @@ class PersonalizationEngine(LLMBaseService):
             adaptations['attention_adaptation'] = '标准时长学习会话'
         
         # Strength utilization
-        strengths = pattern.get('strengths', [])
-        for strength in strengths:
+        for strength in features.strengths:
             if strength == 'logical':
                 adaptations['strength_utilization'].append('利用逻辑思维优势进行系统性学习')
             elif strength == 'creative':
@@ -765,8 +939,7 @@ class PersonalizationEngine(LLMBaseService):
                 adaptations['strength_utilization'].append('运用分析能力深入理解概念')
         
         # Weakness support
-        weaknesses = pattern.get('weaknesses', [])
-        for weakness in weaknesses:
+        for weakness in features.weaknesses:
             if weakness == 'comprehension':
                 adaptations['weakness_support'].append('提供额外的概念解释和基础支持')
             elif weakness == 'attention_difficulties':
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+"""
+Learning-context history: the replayed history and get_context_trends match the
+full-row history kept before the Redis lists, delta rows and running trend stats
+"""
+import copy
+import os
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.testing')
+django.setup()
+
+import pytest
+
+from llm.services import dynamic_context_engine as dce
+from llm.services.advanced_context_engine import (
+    LearningContext, LearningModalityType, EmotionalState, CognitiveLoadLevel
+)
+
+
+class DictCache(dict):
+    """Cache stand-in storing copies"""
+
+    def get(self, key, default=None):
+        return copy.deepcopy(super().get(key, default))
+
+    def set(self, key, value, timeout=None):
+        self[key] = copy.deepcopy(value)
+
+    def delete(self, key):
+        self.pop(key, None)
+
+    def make_key(self, key):
+        return f":1:{key}"
+
+
+def _encode(value):
+    return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+
+class FakeRedis:
+    """The list, hash and transaction commands the context manager sends to Redis"""
+
+    def __init__(self):
+        self.lists = {}
+        self.hashes = {}
+        self.strings = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def transaction(self, func, *watches):
+        pipe = _Pipeline(self, immediate=True)
+        func(pipe)
+        return pipe.execute()
+
+    def lpush(self, key, *values):
+        items = self.lists.setdefault(key, [])
+        for value in values:
+            items.insert(0, _encode(value))
+        return len(items)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, [])[start:None if end == -1 else end + 1])
+
+    def lindex(self, key, index):
+        items = self.lists.get(key, [])
+        return items[index] if -len(items) <= index < len(items) else None
+
+    def lset(self, key, index, value):
+        self.lists[key][index] = _encode(value)
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def expire(self, key, timeout):
+        return True
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = _encode(value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.hashes.pop(key, None)
+            self.strings.pop(key, None)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        fields = self.hashes.setdefault(key, {})
+        for name, item in (mapping or {field: value}).items():
+            fields[_encode(name)] = _encode(item)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, fields):
+        stored = self.hashes.get(key, {})
+        return [stored.get(_encode(field)) for field in fields]
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(_encode(field), None)
+
+    def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[_encode(field)] = _encode(int(fields.get(_encode(field), 0)) + amount)
+
+    def hincrbyfloat(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[_encode(field)] = _encode(repr(float(fields.get(_encode(field), 0)) + amount))
+
+
+class _Pipeline:
+    """Queues commands until execute; a transaction pipe runs them right away until MULTI"""
+
+    def __init__(self, redis, immediate=False):
+        self.redis = redis
+        self.immediate = immediate
+        self.commands = []
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        if self.immediate:
+            return getattr(self.redis, name)
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def _context(rng, timestamp):
+    """A context whose scores already sit on the stored 3-decimal grid, like the old rows after a round trip"""
+    score = lambda: round(rng.random(), 3)
+    return LearningContext(
+        user_id='u', session_id='s', timestamp=timestamp,
+        current_topic=rng.choice(['algebra', 'history', 'calculus']),
+        current_difficulty=score(), current_performance=score(), response_time=3.0,
+        interaction_count=rng.randint(0, 20), session_duration=rng.choice([round(rng.random() * 60, 2), 0.0, 30.0]),
+        topics_covered=rng.sample(['a', 'b', 'c'], rng.randint(0, 3)),
+        concepts_mastered=rng.sample(['x', 'y', 'Limits'], rng.randint(0, 3)),
+        concepts_struggling=rng.sample(['p', 'Derivatives'], rng.randint(0, 2)),
+        questions_asked=1, mistakes_made=0,
+        preferred_modality=rng.choice(list(LearningModalityType)), learning_pace=rng.choice(['slow', 'medium']),
+        attention_span=30, optimal_session_length=45, peak_performance_time='morning',
+        emotional_state=rng.choice(list(EmotionalState)), motivation_level=score(),
+        confidence_level=score(), frustration_indicators=[], engagement_score=score(),
+        total_study_time=1.0, mastery_rate=score(), retention_score=score(), improvement_trend='stable',
+        learning_streaks={'d': 1}, device_type='desktop', session_time=rng.choice(['morning', 'evening']),
+        estimated_distractions=0, study_location='home', cognitive_load=rng.choice(list(CognitiveLoadLevel)),
+        working_memory_capacity=5, processing_speed='medium', metacognitive_awareness=score()
+    )
+
+
+def _window_trend(values, rising, falling):
+    if len(values) < 2:
+        return 'insufficient_data'
+    recent_avg = sum(values[-5:]) / min(5, len(values))
+    earlier_avg = sum(values[:-5]) / max(1, len(values) - 5) if len(values) > 5 else recent_avg
+    if recent_avg > earlier_avg + 0.1:
+        return rising
+    if recent_avg < earlier_avg - 0.1:
+        return falling
+    return 'stable'
+
+
+def _counts(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+def _reference_trends(history, days):
+    """get_context_trends as computed from the whole list of full rows"""
+    cutoff = datetime.now() - timedelta(days=days)
+    recent = [entry['context'] for entry in history if datetime.fromisoformat(entry['timestamp']) > cutoff]
+    if not recent:
+        return {}
+
+    performances = [context['current_performance'] for context in recent]
+    engagement = [context['engagement_score'] for context in recent]
+    difficulties = [context['current_difficulty'] for context in recent]
+    emotions = [context['emotional_state'] for context in recent]
+    modalities = [context['preferred_modality'] for context in recent]
+    durations = [context['session_duration'] for context in recent]
+
+    emotion_counts = _counts(emotions)
+    modality_counts = _counts(modalities)
+    time_counts = _counts(context['session_time'] for context in recent)
+
+    if len(difficulties) < 2:
+        difficulty_progression = {'trend': 'insufficient_data'}
+    else:
+        recent_avg = sum(difficulties[-5:]) / min(5, len(difficulties))
+        earlier_avg = sum(difficulties[:-5]) / max(1, len(difficulties) - 5) if len(difficulties) > 5 else recent_avg
+        difficulty_progression = {
+            'trend': _window_trend(difficulties, 'increasing', 'decreasing'),
+            'current_average': recent_avg,
+            'difficulty_range': (min(difficulties), max(difficulties)),
+            'progression_rate': recent_avg - earlier_avg
+        }
+
+    if len(durations) < 2:
+        consistency = 'insufficient_data'
+    else:
+        mean = statistics.mean(durations)
+        cv = statistics.stdev(durations) / mean if mean > 0 else 0
+        consistency = 'very_consistent' if cv < 0.2 else 'consistent' if cv < 0.4 else \
+            'somewhat_variable' if cv < 0.6 else 'highly_variable'
+
+    recent_emotions = emotions[-10:]
+    return {
+        'performance_trend': _window_trend(performances, 'improving', 'declining'),
+        'emotional_trend': {
+            'dominant_emotion': max(emotion_counts, key=emotion_counts.get),
+            'emotion_distribution': emotion_counts,
+            'emotional_stability': 1.0 - len(set(recent_emotions)) / len(recent_emotions)
+        },
+        'engagement_trend': _window_trend(engagement, 'increasing', 'decreasing'),
+        'difficulty_progression': difficulty_progression,
+        'modality_preferences': {
+            'preference_distribution': modality_counts,
+            'most_used': max(modality_counts, key=modality_counts.get),
+            'diversity_score': len(set(modalities)) / len(modalities)
+        },
+        'study_patterns': {
+            'preferred_study_time': max(time_counts, key=time_counts.get),
+            'time_distribution': time_counts,
+            'average_session_duration': sum(durations) / len(durations),
+            'session_consistency': consistency
+        }
+    }
+
+
+def _assert_close(actual, expected, path='trends'):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for key in expected:
+            _assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected), path
+        for index, (item, expected_item) in enumerate(zip(actual, expected)):
+            _assert_close(item, expected_item, f"{path}[{index}]")
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, abs=1e-9), path
+    else:
+        assert actual == expected, path
+
+
+@pytest.fixture(params=['cache', 'redis'])
+def manager(request, monkeypatch):
+    monkeypatch.setattr(dce, 'cache', DictCache())
+    monkeypatch.setattr(dce.sentence_embedder, 'enabled', False)
+    manager = dce.PersistentContextManager()
+    manager._redis_checked = True
+    manager._redis = FakeRedis() if request.param == 'redis' else None
+    return manager
+
+
+@pytest.mark.parametrize('stored', [1, 40, 100, 101, 230])
+def test_history_and_trends_match_full_rows(manager, stored):
+    """Replayed history and trends equal the full-row results, also once eviction starts past 100 entries"""
+    rng = random.Random(stored)
+    now = datetime.now()
+    full_rows = []
+    for i in range(stored):
+        # Every two hours, so the longer histories reach past the shorter trend windows
+        timestamp = now - timedelta(hours=2 * (stored - i), minutes=rng.randint(0, 60))
+        context = _context(rng, timestamp)
+        assert manager.store_learning_context('u', context)
+        full_rows.append({'timestamp': timestamp.isoformat(), 'context': manager._context_to_dict(context)})
+        full_rows = full_rows[-100:]
+
+        if i % 37 == 0 or i == stored - 1:
+            # 30 days covers the whole history, which the running stats answer without reading it
+            for days in (30, 7, 2):
+                _assert_close(manager.get_context_trends('u', days), _reference_trends(full_rows, days))
+
+    history = manager._load_history('context_history:u')
+    assert [(entry['timestamp'], entry['context']) for entry in history] == \
+        [(row['timestamp'], row['context']) for row in full_rows]
+    recent = manager._load_history('context_history:u', 50)
+    assert [entry['context'] for entry in recent] == [row['context'] for row in full_rows[-50:]]
+
+
+def test_redis_history_stores_delta_rows(monkeypatch):
+    """Slow-moving contexts leave older Redis rows as deltas that replay to the full contexts,
+    and evicting those rows keeps the trend stats in step"""
+    monkeypatch.setattr(dce, 'cache', DictCache())
+    monkeypatch.setattr(dce.sentence_embedder, 'enabled', False)
+    manager = dce.PersistentContextManager()
+    manager._redis_checked = True
+    manager._redis = redis = FakeRedis()
+
+    rng = random.Random(3)
+    base = _context(rng, datetime.now() - timedelta(hours=3))
+    full_rows = []
+    for i in range(120):
+        context = copy.copy(base)
+        context.timestamp = base.timestamp + timedelta(minutes=i)
+        context.interaction_count = i
+        context.current_performance = round(rng.random(), 3)
+        context.current_difficulty = round(rng.random(), 3)
+        context.session_duration = float(i)
+        manager.store_learning_context('u', context)
+        full_rows.append({'timestamp': context.timestamp.isoformat(), 'context': manager._context_to_dict(context)})
+        full_rows = full_rows[-100:]
+        if i % 10 == 0:
+            _assert_close(manager.get_context_trends('u'), _reference_trends(full_rows, 7))
+
+    rows = [dce.json_loads(raw) for raw in redis.lists[':1:context_history:u:rows']]
+    assert 'context' in rows[0] and all('delta' in row for row in rows[1:])
+    assert [entry['context'] for entry in manager._load_history('context_history:u')] == \
+        [row['context'] for row in full_rows]
+    _assert_close(manager.get_context_trends('u'), _reference_trends(full_rows, 7))
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""
+Write-behind effectiveness buffers: flushes racing appends, buffer reseeding,
+and appends to the shared Redis lists
+"""
+import copy
+import os
+import sys
+import threading
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.testing')
+django.setup()
+
+import pytest
+
+from llm.core.base_service import json_loads
+from llm.services import enhanced_personalization_engine as epe
+
+
+class DictCache(dict):
+    """Cache stand-in storing copies, with an optional hook run after each read"""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.after_read = None
+
+    def get(self, key, default=None):
+        time.sleep(self.delay)
+        value = copy.deepcopy(super().get(key, default))
+        if self.after_read is not None:
+            self.after_read(key)
+        return value
+
+    def set(self, key, value, timeout=None):
+        time.sleep(self.delay)
+        self[key] = copy.deepcopy(value)
+
+    def make_key(self, key):
+        return f":1:{key}"
+
+
+class ListRedis:
+    """The list commands the tracker sends to Redis"""
+
+    def __init__(self):
+        self.lists = {}
+        self.before_execute = None
+        self._lock = threading.Lock()
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            self.lists.setdefault(key, []).extend(values)
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            self.lists[key] = self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    def expire(self, key, timeout):
+        pass
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            return list(self.lists.get(key, [])[start:None if end == -1 else end + 1])
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        if self.redis.before_execute is not None:
+            self.redis.before_execute()
+        return [getattr(self.redis, name)(*args) for name, args in self.commands]
+
+
+def _record(score):
+    return {
+        'timestamp': '2026-01-01T00:00:00',
+        'metrics': {'engagement_indicator': 0.5, 'learning_progress': 0.5},
+        'overall_score': score
+    }
+
+
+def _tracker(redis=None):
+    tracker = epe.LearningEffectivenessTracker()
+    tracker._redis_checked = True
+    tracker._redis = redis
+    return tracker
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    fake = DictCache()
+    monkeypatch.setattr(epe, 'cache', fake)
+    monkeypatch.setattr(epe, 'EFFECTIVENESS_FLUSH_DELAY', 0.01)
+    return fake
+
+
+def test_flush_racing_appends_keeps_every_record(fake_cache):
+    """Appends landing while a flush writes are neither lost nor written twice"""
+    fake_cache.delay = 0.002
+    tracker = _tracker()
+    per_thread = 60
+
+    def worker(thread_index):
+        for i in range(per_thread):
+            tracker._store_effectiveness_data('u', 's', _record(thread_index * 1000 + i))
+            if i % 10 == 0:
+                tracker.flush()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracker.flush()
+
+    historical = tracker._decode_historical(fake_cache['learning_effectiveness:u:historical'])
+    scores = [record['overall_score'] for _, record in historical]
+    assert sorted(scores) == sorted(t * 1000 + i for t in range(6) for i in range(per_thread))
+    assert len(fake_cache['learning_effectiveness:u:s']) == 100
+
+
+def test_append_during_flush_seeds_from_the_flushing_snapshot(fake_cache):
+    """A buffer created while a flush writes starts from the records being written"""
+    tracker = _tracker()
+    tracker._store_effectiveness_data('u', 's', _record(1))
+
+    writing = threading.Event()
+    release = threading.Event()
+    original_set = fake_cache.set
+
+    def blocking_set(key, value, timeout=None):
+        writing.set()
+        release.wait(5)
+        original_set(key, value, timeout)
+
+    fake_cache.set = blocking_set
+    flusher = threading.Thread(target=tracker.flush)
+    flusher.start()
+    assert writing.wait(5)
+    tracker._store_effectiveness_data('u', 's', _record(2))
+    release.set()
+    flusher.join()
+
+    fake_cache.set = original_set
+    tracker.flush()
+    assert [r['overall_score'] for r in fake_cache['learning_effectiveness:u:s']] == [1, 2]
+
+
+def test_seed_read_before_a_flush_is_read_again(fake_cache):
+    """A seed read that a flush overtakes is discarded instead of dropping the flushed records"""
+    tracker = _tracker()
+    key = 'learning_effectiveness:u:s'
+    seed_started = threading.Event()
+    release_seed = threading.Event()
+    slow_thread = []
+
+    def hold_first_read(cache_key):
+        if cache_key == key and threading.current_thread() in slow_thread and not seed_started.is_set():
+            seed_started.set()
+            release_seed.wait(5)
+
+    fake_cache.after_read = hold_first_read
+
+    # Its seed read returns the empty session, then stalls until another thread's record has been flushed
+    slow = threading.Thread(target=tracker._store_effectiveness_data, args=('u', 's', _record(2)))
+    slow_thread.append(slow)
+    slow.start()
+    assert seed_started.wait(5)
+    tracker._store_effectiveness_data('u', 's', _record(1))
+    tracker.flush()
+    release_seed.set()
+    slow.join()
+
+    tracker.flush()
+    assert [r['overall_score'] for r in fake_cache[key]] == [1, 2]
+
+
+def test_redis_flushes_append_to_shared_lists(fake_cache):
+    """Processes sharing Redis append to the same lists instead of replacing each other's records"""
+    redis = ListRedis()
+    workers = [_tracker(redis) for _ in range(3)]
+
+    for i in range(40):
+        for index, tracker in enumerate(workers):
+            tracker._store_effectiveness_data('u', 's', _record(index * 1000 + i))
+        if i % 7 == 0:
+            workers[i % 3].flush()
+    for tracker in workers:
+        tracker.flush()
+
+    historical = redis.lists[':1:learning_effectiveness:u:historical:records']
+    assert len(historical) == 120
+    assert len({json_loads(raw)[1]['overall_score'] for raw in historical}) == 120
+    assert len(redis.lists[':1:learning_effectiveness:u:s:records']) == 100
+    # The plain keys, which may hold values from before the lists existed, are left alone
+    assert 'learning_effectiveness:u:s' not in fake_cache
+
+
+def test_redis_session_read_includes_unflushed_records(fake_cache):
+    """Session analysis sees records this process has buffered but not pushed yet"""
+    redis = ListRedis()
+    tracker = _tracker(redis)
+    tracker._store_effectiveness_data('u', 's', _record(0.25))
+    tracker.flush()
+    tracker._store_effectiveness_data('u', 's', _record(0.75))
+
+    columns = tracker._load_session_columns('learning_effectiveness:u:s')
+    assert columns['overall'].tolist() == pytest.approx([0.25, 0.75], abs=1 / epe.SCORE_LEVELS)
+    tracker.flush()
+    assert len(redis.lists[':1:learning_effectiveness:u:s:records']) == 2
+
+
+def test_redis_session_read_waits_for_a_running_flush(fake_cache):
+    """Records taken out of the buffer but not pushed yet are not missed by a concurrent read"""
+    redis = ListRedis()
+    tracker = _tracker(redis)
+    tracker._store_effectiveness_data('u', 's', _record(0.25))
+
+    pushing = threading.Event()
+    release = threading.Event()
+
+    def hold_push():
+        pushing.set()
+        release.wait(5)
+
+    redis.before_execute = hold_push
+    flusher = threading.Thread(target=tracker.flush)
+    flusher.start()
+    assert pushing.wait(5)
+    redis.before_execute = None
+
+    columns = {}
+    reader = threading.Thread(target=lambda: columns.update(tracker._load_session_columns('learning_effectiveness:u:s')))
+    reader.start()
+    reader.join(0.1)
+    release.set()
+    flusher.join()
+    reader.join()
+    assert columns['overall'].tolist() == pytest.approx([0.25], abs=1 / epe.SCORE_LEVELS)